@@ -0,0 +1,107 @@
+# server/database/batch_writer.py
+
+import atexit
+import threading
+import time
+from queue import Queue, Empty, Full
+
+from database.db import transaction
+from utils.metrics import metrics
+
+class BatchWriter:
+    """
+    Penulis INSERT asinkron di background thread.
+    Baris dimasukkan ke antrean terbatas (tanpa menunggu DB), lalu digabung dan ditulis
+    dengan satu executemany setiap `batch_size` baris atau setiap `flush_interval` detik.
+    Jika antrean penuh, baris dibuang dan dihitung di `dropped` (bukan memblokir request).
+    """
+
+    def __init__(self, name, query, batch_size=200, flush_interval=0.5, maxsize=10000):
+        self.name = name
+        self.query = query
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.failed = 0
+        self._queue = Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        """Jumlah baris yang masih mengantre."""
+        return self._queue.qsize()
+
+    def _ensure_started(self):
+        # Thread dibuat saat baris pertama masuk, bukan saat import (CLI/reloader tidak ikut menjalankan)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def put(self, row):
+        """Menambahkan satu baris (tuple parameter). Mengembalikan False jika dibuang."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except Full:
+            with self._lock:
+                self.dropped += 1
+            metrics.incr(f'{self.name}.dropped')
+            return False
+
+    def _collect(self):
+        """Mengambil baris sampai batch penuh atau batas waktu flush tercapai."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            with transaction() as tx:
+                tx.executemany(self.query, batch)
+            metrics.incr(f'{self.name}.written', len(batch))
+        except Exception as err:
+            print(f"Database Error ({self.name} batch writer): {err}")
+            with self._lock:
+                self.failed += len(batch)
+            metrics.incr(f'{self.name}.failed', len(batch))
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+        # Shutdown: kosongkan sisa antrean
+        self.flush()
+
+    def flush(self):
+        """Menulis semua baris yang masih mengantre (dipakai saat shutdown)."""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self, timeout=10):
+        """Menghentikan thread dan menunggu sisa antrean tertulis."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
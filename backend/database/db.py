@@ -1,28 +1,244 @@
 # server/database/db.py
 
+import threading
+import time
+from contextlib import contextmanager
+from queue import Queue, Empty, Full
+
 import mysql.connector
-from backend.server import Config
+from config import Config
+
+class PoolTimeoutError(mysql.connector.errors.PoolError):
+    """
+    Dilempar jika tidak ada koneksi yang bisa dipinjam dalam batas waktu.
+    Turunan mysql.connector.Error, jadi ikut tertangkap oleh penanganan error database biasa.
+    """
+    pass
+
+class ConnectionPool:
+    """
+    Pool koneksi MySQL yang terbatas dan thread-safe.
+
+    - `size` koneksi disimpan dan dipakai ulang antar request.
+    - `max_overflow` koneksi tambahan boleh dibuka saat beban puncak,
+      dan langsung ditutup ketika dikembalikan.
+    - Peminjam menunggu paling lama `timeout` detik sebelum PoolTimeoutError.
+    - Setiap koneksi di-ping saat dipinjam; koneksi mati disambung ulang,
+      dan koneksi yang lebih tua dari `recycle` detik diganti baru.
+    """
+
+    def __init__(self, size=5, max_overflow=10, timeout=5, recycle=3600, **connect_kwargs):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self._connect_kwargs = connect_kwargs
+        self._idle = Queue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size + max_overflow)
+        self._created_at = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self._connect_kwargs)
+        with self._lock:
+            self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+
+    def _is_stale(self, conn):
+        if not self.recycle:
+            return False
+        with self._lock:
+            created = self._created_at.get(id(conn), 0)
+        return time.monotonic() - created > self.recycle
+
+    def _check(self, conn):
+        """Health check saat dipinjam: ping dan sambung ulang bila perlu."""
+        if self._is_stale(conn):
+            self._discard(conn)
+            return self._connect()
+        try:
+            conn.ping(reconnect=True, attempts=2, delay=0)
+            return conn
+        except mysql.connector.Error:
+            self._discard(conn)
+            return self._connect()
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(
+                f"Tidak ada koneksi database tersedia dalam {self.timeout} detik."
+            )
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                return self._connect()
+            return self._check(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        """Mengembalikan koneksi; `discard=True` menutupnya (mis. masih ada hasil query yang belum dibaca)."""
+        if discard:
+            self._discard(conn)
+            self._slots.release()
+            return
+        try:
+            # Pastikan tidak ada transaksi (termasuk snapshot baca) menggantung
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except Full:
+            # Koneksi overflow: ditutup, bukan disimpan
+            self._discard(conn)
+        except mysql.connector.Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except Empty:
+                break
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Mengembalikan pool global, dibuat saat pertama kali dibutuhkan."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    size=Config.DB_POOL_SIZE,
+                    max_overflow=Config.DB_POOL_MAX_OVERFLOW,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    recycle=Config.DB_POOL_RECYCLE,
+                    host=Config.DB_HOST,
+                    user=Config.DB_USER,
+                    password=Config.DB_PASSWORD,
+                    database=Config.DB_NAME
+                )
+    return _pool
 
 def get_db_connection():
-    """Membuka koneksi database MySQL."""
+    """Meminjam koneksi dari pool. Wajib dikembalikan dengan release_db_connection()."""
     try:
-        conn = mysql.connector.connect(
-            host=Config.DB_HOST,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            database=Config.DB_NAME
-        )
-        return conn
+        return get_pool().acquire()
     except mysql.connector.Error as err:
         print(f"Error connecting to MySQL: {err}")
         return None
 
+def release_db_connection(conn):
+    """Mengembalikan koneksi ke pool."""
+    if conn is not None:
+        get_pool().release(conn)
+
+@contextmanager
+def pooled_connection():
+    """Context manager: pinjam koneksi dari pool dan kembalikan otomatis."""
+    conn = get_pool().acquire()
+    try:
+        yield conn
+    finally:
+        get_pool().release(conn)
+
+class UnitOfWork:
+    """
+    Satu koneksi + satu transaksi untuk beberapa statement sekaligus.
+    Dibuat lewat transaction(); jangan di-instansiasi langsung.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def query(self, query, params=None, fetchone=False):
+        """Menjalankan SELECT dan mengembalikan dict (fetchone) atau list of dict."""
+        cursor = self.conn.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params)
+            return cursor.fetchone() if fetchone else cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def execute(self, query, params=None):
+        """Menjalankan INSERT/UPDATE/DELETE. INSERT -> lastrowid, lainnya -> rowcount."""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, params)
+            return cursor.lastrowid if 'INSERT' in query.upper() else cursor.rowcount
+        finally:
+            cursor.close()
+
+    def executemany(self, query, seq_params):
+        """Menjalankan satu statement untuk banyak baris (batch). Mengembalikan rowcount."""
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany(query, seq_params)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+_current = threading.local()
+
+@contextmanager
+def transaction():
+    """
+    Unit of work: satu koneksi dari pool dan satu COMMIT untuk seluruh blok.
+    Exception di dalam blok membatalkan (ROLLBACK) semua perubahan lalu dilempar ulang.
+    Pemanggilan bertingkat di thread yang sama ikut memakai transaksi terluar.
+
+        with transaction() as tx:
+            sesi = tx.query("SELECT ...", (id_sesi,), fetchone=True)
+            tx.execute("INSERT ...", params)
+    """
+    outer = getattr(_current, 'uow', None)
+    if outer is not None:
+        yield outer
+        return
+
+    conn = get_pool().acquire()
+    uow = UnitOfWork(conn)
+    _current.uow = uow
+    try:
+        yield uow
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except mysql.connector.Error:
+            pass
+        raise
+    finally:
+        _current.uow = None
+        get_pool().release(conn)
+
 def query_db(query, params=None, fetchone=False):
-    """Fungsi pembantu untuk menjalankan query SELECT."""
+    """
+    Fungsi pembantu untuk menjalankan query SELECT.
+    Di dalam transaction() error dilempar ulang (bukan None) agar seluruh transaksi di-ROLLBACK.
+    """
+    uow = getattr(_current, 'uow', None)
+    if uow is not None:
+        # Di dalam transaction(): pakai koneksi transaksi yang sedang berjalan
+        return uow.query(query, params, fetchone)
+
     conn = get_db_connection()
     if conn is None:
         return None
-        
+
     cursor = conn.cursor(dictionary=True)
     try:
         cursor.execute(query, params)
@@ -36,14 +252,23 @@ def query_db(query, params=None, fetchone=False):
         return None
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 def execute_db(query, params=None):
-    """Fungsi pembantu untuk menjalankan query INSERT/UPDATE/DELETE."""
+    """
+    Fungsi pembantu untuk menjalankan query INSERT/UPDATE/DELETE.
+    Di dalam transaction() error dilempar ulang (bukan False) agar seluruh transaksi di-ROLLBACK.
+    """
+    uow = getattr(_current, 'uow', None)
+    if uow is not None:
+        # Di dalam transaction(): COMMIT dilakukan oleh transaksi terluar
+        lastrowid = uow.execute(query, params)
+        return lastrowid if 'INSERT' in query.upper() else True
+
     conn = get_db_connection()
     if conn is None:
         return False
-        
+
     cursor = conn.cursor()
     try:
         cursor.execute(query, params)
@@ -55,4 +280,29 @@ def execute_db(query, params=None):
         return False
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        release_db_connection(conn)
+
+def stream_query(query, params=None, batch_size=500):
+    """
+    Generator baris SELECT dengan cursor server-side (unbuffered): hasil dibaca dari MySQL per
+    `batch_size` baris, jadi memori tetap datar berapa pun jumlah barisnya (untuk export).
+    Elemen pertama adalah tuple nama kolom, berikutnya tuple nilai per baris.
+    Koneksi dipinjam khusus (bukan transaksi yang sedang berjalan) selama generator dibaca;
+    jika generator dihentikan di tengah jalan, koneksinya ditutup karena hasil belum habis dibaca.
+    """
+    conn = get_pool().acquire()
+    cursor = conn.cursor(buffered=False)
+    finished = False
+    try:
+        cursor.execute(query, params)
+        yield tuple(cursor.column_names)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        finished = True
+    finally:
+        if finished:
+            cursor.close()
+        get_pool().release(conn, discard=not finished)
@@ -0,0 +1,200 @@
+# server/database/listing.py
+
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from database.db import query_db
+from utils.cache import LRUCache
+
+# Listing generik untuk endpoint admin: projection kolom, filter, sort, dan keyset pagination.
+# Nama kolom dari klien hanya dipakai jika ada di skema tabel (information_schema), jadi
+# aman disisipkan ke SQL; nilai filter/cursor selalu lewat parameter.
+
+BLOB_TYPES = {'tinyblob', 'blob', 'mediumblob', 'longblob', 'binary', 'varbinary'}
+RESERVED_ARGS = {'fields', 'limit', 'cursor', 'sort', 'count'}
+FILTER_OPERATORS = {
+    'gt': '>',
+    'gte': '>=',
+    'lt': '<',
+    'lte': '<=',
+    'ne': '<>',
+    'like': 'LIKE',
+}
+
+# Skema tabel jarang berubah; disimpan per proses
+_schema_cache = LRUCache(maxsize=128, ttl=600)
+
+def table_schema(table):
+    """
+    Kolom tabel dari information_schema: {'columns': [nama,...], 'types': {nama: tipe}, 'pk': nama}.
+    None jika tabel tidak ditemukan.
+    """
+    schema = _schema_cache.get(table)
+    if schema is not None:
+        return schema
+    rows = query_db("""
+        SELECT column_name AS name, data_type AS type, column_key AS col_key
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s
+        ORDER BY ordinal_position
+    """, (table,))
+    if not rows:
+        return None
+    schema = {
+        'columns': [r['name'] for r in rows],
+        'types': {r['name']: r['type'].lower() for r in rows},
+        'pk': next((r['name'] for r in rows if r['col_key'] == 'PRI'), rows[0]['name']),
+    }
+    _schema_cache.set(table, schema)
+    return schema
+
+def default_columns(schema, hidden=()):
+    """Kolom default: semua kecuali BLOB (mis. face_descriptor) dan kolom tersembunyi (mis. password)."""
+    return [c for c in schema['columns'] if schema['types'][c] not in BLOB_TYPES and c not in hidden]
+
+def select_columns(schema, fields=None, hidden=()):
+    """
+    Kolom yang diminta klien (dipisah koma) atau default; ValueError jika ada yang tidak dikenal,
+    tersembunyi, atau BLOB (bytes tidak bisa dikirim sebagai JSON).
+    """
+    if not fields:
+        return default_columns(schema, hidden)
+    requested = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in schema['columns'] or f in hidden]
+    if unknown:
+        raise ValueError(f"Kolom tidak dikenal: {', '.join(unknown)}.")
+    binary = [f for f in requested if schema['types'][f] in BLOB_TYPES]
+    if binary:
+        raise ValueError(f"Kolom biner tidak bisa diminta: {', '.join(binary)}.")
+    return requested
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Tipe {type(value).__name__} tidak bisa dipakai sebagai cursor")
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=_json_default).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Cursor tidak valid.")
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError("Cursor tidak valid.")
+    return values
+
+def _parse_filters(schema, args, hidden):
+    conditions, params = [], []
+    for key, value in args.items():
+        if key in RESERVED_ARGS:
+            continue
+        column, _, op = key.partition('__')
+        if column not in schema['columns'] or column in hidden or schema['types'][column] in BLOB_TYPES:
+            raise ValueError(f"Filter tidak dikenal: {key}.")
+        if op and op not in FILTER_OPERATORS:
+            raise ValueError(f"Operator filter tidak dikenal: {op}.")
+        conditions.append(f"{column} {FILTER_OPERATORS[op] if op else '='} %s")
+        params.append(value)
+    return conditions, params
+
+def _parse_sort(schema, sort, default_sort, hidden):
+    sort = sort or default_sort or schema['pk']
+    descending = sort.startswith('-')
+    column = sort.lstrip('-')
+    # Kolom tersembunyi tidak boleh jadi sort: nilainya ikut masuk next_cursor
+    if column not in schema['columns'] or column in hidden or schema['types'][column] in BLOB_TYPES:
+        raise ValueError(f"Kolom sort tidak dikenal: {column}.")
+    return column, descending
+
+def _keyset_condition(column, pk, descending, cursor_value, cursor_pk):
+    # MySQL mengurutkan NULL paling awal (ASC) / paling akhir (DESC)
+    if column == pk:
+        return (f"{pk} < %s" if descending else f"{pk} > %s"), [cursor_pk]
+    cmp = '<' if descending else '>'
+    if cursor_value is None:
+        if descending:
+            return f"({column} IS NULL AND {pk} {cmp} %s)", [cursor_pk]
+        return f"(({column} IS NULL AND {pk} {cmp} %s) OR {column} IS NOT NULL)", [cursor_pk]
+    condition = f"({column} {cmp} %s OR ({column} = %s AND {pk} {cmp} %s)"
+    condition += f" OR {column} IS NULL)" if descending else ")"
+    return condition, [cursor_value, cursor_value, cursor_pk]
+
+def list_rows(table, args, pk=None, hidden=(), default_sort=None, page_size=50, max_page_size=500):
+    """
+    Satu halaman baris `table` sesuai query string `args`:
+      fields=a,b       projection (default: semua kolom non-BLOB)
+      <kolom>=v        filter kesamaan; <kolom>__gte/__lte/__gt/__lt/__ne/__like=v untuk rentang/pola
+      sort=kolom|-kolom  urutan (pk sebagai pemecah seri), default `default_sort` atau pk
+      limit, cursor    keyset pagination (cursor = next_cursor halaman sebelumnya)
+      count=1          sertakan total baris yang cocok dengan filter (query COUNT tambahan)
+    Mengembalikan dict {rows, next_cursor[, total]}; ValueError untuk parameter tidak valid,
+    None jika terjadi error database.
+    """
+    schema = table_schema(table)
+    if schema is None:
+        return None
+    pk = pk or schema['pk']
+    columns = select_columns(schema, args.get('fields'), hidden)
+    sort_column, descending = _parse_sort(schema, args.get('sort'), default_sort, hidden)
+    conditions, params = _parse_filters(schema, args, hidden)
+
+    try:
+        limit = min(int(args.get('limit') or page_size), max_page_size)
+    except ValueError:
+        raise ValueError("Parameter limit tidak valid.")
+    if limit < 1:
+        raise ValueError("Parameter limit tidak valid.")
+
+    total = None
+    if args.get('count') in ('1', 'true'):
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        row = query_db(f"SELECT COUNT(*) AS total FROM {table} {where}", tuple(params), fetchone=True)
+        if row is None:
+            return None
+        total = row['total']
+
+    if args.get('cursor'):
+        cursor_value, cursor_pk = decode_cursor(args['cursor'])
+        condition, cursor_params = _keyset_condition(sort_column, pk, descending, cursor_value, cursor_pk)
+        conditions.append(condition)
+        params.extend(cursor_params)
+
+    # Kolom sort & pk selalu diambil untuk membentuk cursor berikutnya
+    selected = list(dict.fromkeys([*columns, sort_column, pk]))
+    direction = 'DESC' if descending else 'ASC'
+    order = f"{sort_column} {direction}" + (f", {pk} {direction}" if sort_column != pk else "")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = query_db(
+        f"SELECT {', '.join(selected)} FROM {table} {where} ORDER BY {order} LIMIT %s",
+        (*params, limit + 1)
+    )
+    if rows is None:
+        return None
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][sort_column], rows[-1][pk]])
+
+    result = {"rows": [{c: row[c] for c in columns} for row in rows], "next_cursor": next_cursor}
+    if total is not None:
+        result["total"] = total
+    return result
+
+def get_row(table, pk_column, pk_value, fields=None, hidden=()):
+    """Satu baris berdasarkan primary key dengan projection yang sama seperti list_rows."""
+    schema = table_schema(table)
+    if schema is None:
+        return None
+    columns = select_columns(schema, fields, hidden)
+    return query_db(
+        f"SELECT {', '.join(columns)} FROM {table} WHERE {pk_column} = %s",
+        (pk_value,), fetchone=True
+    )
@@ -0,0 +1,139 @@
+# server/database/schema.py
+
+from database.db import query_db, execute_db
+
+# Perubahan skema di atas SQL dump awal, dijalankan lewat `flask upgrade-db`.
+# Setiap entri idempoten: dilewati jika objeknya (index/tabel/tipe kolom) sudah ada.
+#   name      : nama index/tabel (atau label untuk entri kolom)
+#   table     : tabel pemilik index (None untuk entri tabel baru)
+#   column    : (tabel, kolom, tipe) untuk perubahan tipe kolom; dianggap ada jika tipenya sudah sama
+#   ddl       : statement yang dijalankan
+#   conflicts : query cek data yang menghalangi (opsional)
+#   after     : fungsi yang dijalankan setelah DDL berhasil (opsional, mis. mengisi data awal)
+#   after_args: argumen untuk fungsi `after` (opsional)
+UPGRADES = [
+    {
+        'name': 'uq_absensi_nim_pertemuan',
+        'table': 'absensi',
+        'ddl': "ALTER TABLE absensi ADD UNIQUE KEY uq_absensi_nim_pertemuan (nim, id_pertemuan)",
+        'conflicts': """
+            SELECT nim, id_pertemuan, COUNT(*) AS jumlah FROM absensi
+            GROUP BY nim, id_pertemuan HAVING COUNT(*) > 1 LIMIT 20
+        """,
+    },
+    {
+        # Riwayat per mahasiswa (keyset pagination: ORDER BY waktu_absen DESC, id_absensi DESC)
+        'name': 'idx_absensi_nim_waktu',
+        'table': 'absensi',
+        'ddl': "ALTER TABLE absensi ADD INDEX idx_absensi_nim_waktu (nim, waktu_absen, id_absensi)",
+    },
+    {
+        # Rekap kehadiran per mahasiswa x kelas, diperbarui inkremental (services/rekap_service.py)
+        'name': 'rekap_kehadiran_summary',
+        'table': None,
+        'ddl': """
+            CREATE TABLE rekap_kehadiran_summary (
+                nim VARCHAR(20) NOT NULL,
+                id_kelas INT NOT NULL,
+                total_hadir INT NOT NULL DEFAULT 0,
+                total_izin INT NOT NULL DEFAULT 0,
+                total_sakit INT NOT NULL DEFAULT 0,
+                total_alpha INT NOT NULL DEFAULT 0,
+                terakhir_hadir DATETIME NULL,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (nim, id_kelas),
+                KEY idx_rekap_kelas (id_kelas)
+            )
+        """,
+        'after': 'rebuild_rekap',
+    },
+    {
+        # Descriptor wajah biner (Config.FACE_DESCRIPTOR_FORMAT = "binary") tidak muat di kolom TEXT.
+        # Descriptor JSON lama dikonversi ke biner setelah kolom diubah.
+        'name': 'mahasiswa.face_descriptor BLOB',
+        'table': None,
+        'column': ('mahasiswa', 'face_descriptor', 'blob'),
+        'ddl': "ALTER TABLE mahasiswa MODIFY face_descriptor BLOB NULL",
+        'after': 'migrate_face_descriptors',
+        'after_args': ('mahasiswa',),  # Hanya tabel yang kolomnya sudah BLOB
+    },
+    {
+        'name': 'dosen.face_descriptor BLOB',
+        'table': None,
+        'column': ('dosen', 'face_descriptor', 'blob'),
+        'ddl': "ALTER TABLE dosen MODIFY face_descriptor BLOB NULL",
+        'after': 'migrate_face_descriptors',
+        'after_args': ('dosen',),  # Hanya tabel yang kolomnya sudah BLOB
+    },
+]
+
+def _index_exists(table, index_name):
+    row = query_db("""
+        SELECT 1 AS ada FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, index_name), fetchone=True)
+    return bool(row)
+
+def _table_exists(table):
+    row = query_db("""
+        SELECT 1 AS ada FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+        LIMIT 1
+    """, (table,), fetchone=True)
+    return bool(row)
+
+def _column_has_type(table, column, data_type):
+    row = query_db("""
+        SELECT data_type AS tipe FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column), fetchone=True)
+    return bool(row) and row['tipe'].lower() == data_type
+
+def _upgrade_exists(upgrade):
+    if upgrade.get('column'):
+        return _column_has_type(*upgrade['column'])
+    if upgrade['table']:
+        return _index_exists(upgrade['table'], upgrade['name'])
+    return _table_exists(upgrade['name'])
+
+def missing_upgrades():
+    """Nama UPGRADES yang belum diterapkan (dicek saat server start, lihat app.py)."""
+    return [upgrade['name'] for upgrade in UPGRADES if not _upgrade_exists(upgrade)]
+
+def upgrade_schema(after_hooks=None):
+    """
+    Menerapkan semua UPGRADES yang belum ada.
+    `after_hooks` memetakan nama di field 'after' ke fungsi (dipasang oleh app agar modul ini
+    tidak bergantung pada services).
+    Mengembalikan list (nama, status, detail) dengan status 'ada', 'diterapkan', 'diblokir', atau 'gagal'
+    (detail berisi exception jika hook `after` gagal).
+    """
+    after_hooks = after_hooks or {}
+    hasil = []
+    for upgrade in UPGRADES:
+        name = upgrade['name']
+        if _upgrade_exists(upgrade):
+            hasil.append((name, 'ada', None))
+            continue
+
+        if upgrade.get('conflicts'):
+            conflicts = query_db(upgrade['conflicts'])
+            if conflicts:
+                # Data ganda harus dibereskan manual dulu (baris mana yang benar tidak bisa ditebak)
+                hasil.append((name, 'diblokir', conflicts))
+                continue
+
+        if not execute_db(upgrade['ddl']):
+            hasil.append((name, 'gagal', None))
+            continue
+
+        hook = after_hooks.get(upgrade.get('after'))
+        try:
+            detail = hook(*upgrade.get('after_args', ())) if hook else None
+        except Exception as err:
+            # DDL sudah diterapkan; hook bisa dijalankan ulang lewat perintah CLI-nya
+            hasil.append((name, 'gagal', err))
+            continue
+        hasil.append((name, 'diterapkan', detail))
+    return hasil
@@ -1,10 +1,13 @@
 # server/app.py - FINAL IMPLEMENTASI FASE 2
 
+import csv
+import click
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from config import Config
+import jwt
 from utils.jwt_auth import jwt_required 
-from utils.jwt_auth import generate_token 
+from utils.jwt_auth import generate_token, generate_refresh_token, decode_token
 
 # Import Semua Blueprints
 from routes.face_routes import face_bp
@@ -12,8 +15,15 @@ from routes.absensi_routes import absensi_bp
 from routes.dosen_routes import dosen_bp
 from routes.admin_routes import admin_bp
 
-# PENTING: Untuk Hashing Password di proyek nyata, ganti 'password' == password:
-from database.db import query_db 
+from services.auth_service import get_user, verify_login
+from services.password_worker import PasswordWorkerBusy
+from utils.metrics import metrics
+from services.face_service import migrate_face_descriptors
+from services.expiry_scheduler import expiry_scheduler
+from database.db import query_db
+from database.schema import upgrade_schema, missing_upgrades
+from services.rekap_service import rebuild_rekap, check_rekap
+from services.face_enrollment import enroll_faces
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -25,27 +35,45 @@ app.register_blueprint(absensi_bp)
 app.register_blueprint(dosen_bp)
 app.register_blueprint(admin_bp)
 
+# Scheduler penutupan sesi/barcode dijalankan di proses yang benar-benar melayani request
+# (bukan saat perintah CLI atau di proses induk reloader)
+@app.before_request
+def start_background_jobs():
+    expiry_scheduler.start()
+
 # --- AUTH ROUTE (IMPLEMENTASI FINAL FASE 2) ---
 @app.route('/auth/login', methods=['POST'])
 def login():
-    data = request.json
+    data = request.get_json(silent=True) or {}
     username = data.get('username')
     password = data.get('password')
 
-    user = query_db("SELECT * FROM users WHERE username = %s", (username,), fetchone=True)
+    if not username or not isinstance(password, str):
+        return jsonify({"status": "error", "message": "Username dan password wajib diisi."}), 400
 
-    if not user:
-        return jsonify({"status": "error", "message": "Username tidak ditemukan."}), 404
-        
-    # PERINGATAN: Password di SQL dump tidak di-hash. 
-    # Gunakan perbandingan plain text SEMENTARA
-    if user['password'] == password: 
+    with metrics.timer('login.total'):
+        # Record users dari cache singkat (services/auth_service.py), bukan SELECT per request
+        user = get_user(username)
+
+        if not user:
+            metrics.incr('login.unknown_user')
+            return jsonify({"status": "error", "message": "Username tidak ditemukan."}), 404
+
+        # bcrypt di pool worker terbatas; password plaintext lama di-hash saat login berhasil
+        try:
+            valid = verify_login(user, password)
+        except PasswordWorkerBusy as e:
+            return jsonify({"status": "error", "message": str(e)}), 503
+
+    if valid:
         user_id = user['nim'] if user['level'] == 'mahasiswa' else user['nip']
         token = generate_token(user_id=user_id, level=user['level'])
         
         return jsonify({
             "status": "success", 
             "token": token, 
+            "refresh_token": generate_refresh_token(user['username']),
+            "expires_in": Config.JWT_ACCESS_TTL,
             "level": user['level'], 
             "user_id": user_id,
             "nama": user['nama']
@@ -53,6 +81,36 @@ def login():
     else:
         return jsonify({"status": "error", "message": "Password salah."}), 401
 
+# Access token baru dari refresh token, tanpa bcrypt: record users diambil dari cache login
+# sehingga akun yang dihapus/diubah levelnya ikut berlaku saat refresh berikutnya.
+@app.route('/auth/refresh', methods=['POST'])
+def refresh():
+    data = request.get_json(silent=True) or {}
+    refresh_token = data.get('refresh_token')
+    if not refresh_token:
+        return jsonify({"status": "error", "message": "refresh_token wajib diisi."}), 400
+
+    try:
+        payload = decode_token(refresh_token, token_type='refresh')
+    except jwt.ExpiredSignatureError:
+        return jsonify({"status": "error", "message": "Refresh token kadaluarsa, silakan login ulang."}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"status": "error", "message": "Refresh token tidak valid."}), 401
+
+    user = get_user(payload['username'])
+    if not user:
+        return jsonify({"status": "error", "message": "Akun tidak ditemukan, silakan login ulang."}), 401
+
+    metrics.incr('login.refresh')
+    user_id = user['nim'] if user['level'] == 'mahasiswa' else user['nip']
+    return jsonify({
+        "status": "success",
+        "token": generate_token(user_id=user_id, level=user['level']),
+        "expires_in": Config.JWT_ACCESS_TTL,
+        "level": user['level'],
+        "user_id": user_id
+    }), 200
+
 @app.route('/protected', methods=['GET'])
 @jwt_required
 def protected():
@@ -61,5 +119,99 @@ def protected():
         "user": request.user_data
     })
 
+# --- CLI COMMANDS (flask <command>) ---
+@app.cli.command('migrate-face-descriptors')
+@click.option('--table', type=click.Choice(['mahasiswa', 'dosen']), default=None, help='Hanya tabel ini (default: keduanya).')
+@click.option('--batch-size', default=500, show_default=True, help='Jumlah baris per batch UPDATE.')
+def migrate_face_descriptors_command(table, batch_size):
+    """Konversi descriptor wajah JSON lama ke format biner (kolom BLOB dibuat oleh `flask upgrade-db`)."""
+    converted = migrate_face_descriptors(table, batch_size=batch_size)
+    for table, count in converted.items():
+        click.echo(f"{table}: {count} descriptor dikonversi.")
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Menerapkan perubahan skema (index, unique key, tabel rekap, kolom BLOB) yang belum ada."""
+    hooks = {'rebuild_rekap': rebuild_rekap, 'migrate_face_descriptors': migrate_face_descriptors}
+    for nama, status, detail in upgrade_schema(after_hooks=hooks):
+        click.echo(f"{nama}: {status}")
+        if status == 'diblokir':
+            click.echo("  Data ganda harus dibereskan dulu, contoh:")
+            for row in detail:
+                click.echo(f"  {row}")
+        elif status == 'gagal' and detail:
+            click.echo(f"  {detail}")
+
+@app.cli.command('rebuild-rekap')
+@click.option('--kelas', 'id_kelas', type=int, default=None, help='Hanya kelas ini (default: semua).')
+def rebuild_rekap_command(id_kelas):
+    """Menghitung ulang tabel rekap_kehadiran_summary dari tabel absensi."""
+    jumlah = rebuild_rekap(id_kelas)
+    click.echo(f"{jumlah} baris rekap ditulis.")
+
+@app.cli.command('check-rekap')
+@click.option('--kelas', 'id_kelas', type=int, default=None, help='Hanya kelas ini (default: semua).')
+@click.option('--fix', is_flag=True, help='Jalankan rebuild jika ditemukan selisih.')
+def check_rekap_command(id_kelas, fix):
+    """Membandingkan rekap_kehadiran_summary dengan agregat tabel absensi."""
+    selisih = check_rekap(id_kelas)
+    if selisih is None:
+        raise SystemExit("Gagal membaca rekap/absensi dari database.")
+    if not selisih:
+        click.echo("Rekap konsisten.")
+        return
+    for row in selisih[:50]:
+        click.echo(f"{row['nim']} (kelas {row['id_kelas']}): tersimpan={row['tersimpan']} seharusnya={row['seharusnya']}")
+    click.echo(f"{len(selisih)} selisih ditemukan.")
+    if fix:
+        click.echo(f"{rebuild_rekap(id_kelas)} baris rekap ditulis ulang.")
+    else:
+        raise SystemExit(1)
+
+@app.cli.command('enroll-faces')
+@click.argument('path', type=click.Path(exists=True))
+@click.option('--type', 'user_type', type=click.Choice(['mahasiswa', 'dosen']), default='mahasiswa', show_default=True)
+@click.option('--batch-size', default=100, show_default=True, help='Jumlah descriptor per batch UPDATE.')
+@click.option('--workers', type=int, default=None, help='Proses encoding paralel (default: FACE_WORKERS).')
+@click.option('--overwrite', is_flag=True, help='Daftarkan ulang juga yang sudah terdaftar.')
+@click.option('--report', type=click.Path(dir_okay=False, writable=True), default='enroll_gagal.csv',
+              show_default=True, help='File CSV daftar foto yang gagal.')
+def enroll_faces_command(path, user_type, batch_size, workers, overwrite, report):
+    """Pendaftaran wajah massal dari zip/direktori foto bernama NIM/NIP (contoh: 2201001.jpg)."""
+    def progress(selesai, total):
+        click.echo(f"{selesai}/{total} foto diproses.")
+
+    hasil = enroll_faces(path, user_type, batch_size=batch_size, workers=workers,
+                         overwrite=overwrite, progress=progress)
+    click.echo(f"{hasil['terdaftar']} terdaftar, {hasil['dilewati']} dilewati (sudah terdaftar), "
+               f"{len(hasil['gagal'])} gagal dari {hasil['total']} foto.")
+    if hasil['gagal']:
+        with open(report, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['file', 'id', 'alasan'])
+            writer.writeheader()
+            writer.writerows(hasil['gagal'])
+        click.echo(f"Daftar yang gagal ditulis ke {report}.")
+
+# Jalur absensi bergantung pada perubahan skema `flask upgrade-db` (unique key absensi ganda,
+# tabel rekap_kehadiran_summary, kolom BLOB descriptor). Server menolak start jika belum lengkap,
+# bukan gagal per request. Dicek hanya di jalur start (bukan saat modul di-import: gunicorn,
+# test, atau proses worker spawn yang meng-import ulang __main__); deployment WSGI menjalankan
+# `flask check-schema` sebelum start.
+def check_schema():
+    if not query_db("SELECT 1 AS ok", fetchone=True):
+        raise SystemExit("Tidak bisa terhubung ke database untuk memeriksa skema.")
+    missing = missing_upgrades()
+    if missing:
+        raise SystemExit(
+            f"Skema database belum lengkap ({', '.join(missing)}). Jalankan `flask upgrade-db` dulu."
+        )
+
+@app.cli.command('check-schema')
+def check_schema_command():
+    """Gagal (exit != 0) jika database tidak terjangkau atau `flask upgrade-db` belum dijalankan."""
+    check_schema()
+    click.echo("Skema lengkap.")
+
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    check_schema()
+    app.run(host="0.0.0.0", port=5000, debug=True)
@@ -4,12 +4,102 @@ class Config:
     DB_PASSWORD = ""  
     DB_NAME = "absensi"
 
+    # --- Connection Pool Configuration ---
+    DB_POOL_SIZE = 5           # Koneksi yang disimpan dan dipakai ulang
+    DB_POOL_MAX_OVERFLOW = 10  # Koneksi tambahan sementara saat beban puncak
+    DB_POOL_TIMEOUT = 5        # Detik menunggu koneksi sebelum gagal
+    DB_POOL_RECYCLE = 3600     # Detik sebelum koneksi lama diganti baru
+
     # --- Flask & JWT Configuration ---
     SECRET_KEY = "123456789"  # Ganti dengan kunci rahasia yang kuat!
-    JWT_SECRET_KEY = SECRET_KEY 
+    JWT_SECRET_KEY = SECRET_KEY
+    # Masa berlaku access token. Turunkan (mis. 15 * 60) setelah semua klien memakai /auth/refresh.
+    JWT_ACCESS_TTL = 24 * 3600
+    JWT_REFRESH_TTL = 7 * 24 * 3600   # Masa berlaku refresh token
+    TOKEN_CACHE_SIZE = 10000          # Payload token terverifikasi yang disimpan di memori
+    TOKEN_CACHE_TTL = 300             # Detik maksimum satu entri (tidak pernah melewati exp token)
+
+    # --- Upload Configuration ---
+    MAX_IMAGE_UPLOAD_BYTES = 8 * 1024 * 1024   # Batas ukuran satu gambar (biner)
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024      # Batas body request Flask (termasuk JSON Base64)
     
     # --- Face Recognition Configuration ---
     FACE_RECOGNITION_TOLERANCE = 0.6  # Batas ambang untuk jarak Euclidean (0.6 umumnya baik)
+    FACE_CACHE_SIZE = 5000            # Jumlah maksimum descriptor (per NIM) di cache memori
+    FACE_CACHE_TTL = 3600             # Detik sebelum descriptor di cache dimuat ulang dari DB
+    FACE_CACHE_DTYPE = "float64"      # "float64" atau "float32" (hemat memori separuhnya)
+    FACE_CLASS_INDEX_GRACE = 600      # Detik matriks kelas tetap disimpan setelah sesi seharusnya berakhir
+    # Format penyimpanan kolom face_descriptor: "binary" (BLOB, lihat utils/face_codec.py) atau "json".
+    # "binary" butuh kolom BLOB: jalankan `flask upgrade-db` sekali (ALTER + konversi data JSON lama).
+    FACE_DESCRIPTOR_FORMAT = "binary"
+    FACE_DESCRIPTOR_DTYPE = "float32" # "float32" (512 byte) atau "float64" (1024 byte)
+
+    # --- Face Worker Pool (encoding wajah di proses terpisah) ---
+    FACE_WORKERS = 2        # Jumlah proses worker (idealnya <= jumlah core CPU)
+    FACE_QUEUE_SIZE = 8     # Job yang boleh mengantre di luar yang sedang berjalan
+    FACE_QUEUE_WAIT = 2     # Detik menunggu slot antrean sebelum ditolak (HTTP 503)
+    FACE_JOB_TIMEOUT = 15   # Detik maksimum menunggu hasil satu job
+
+    # --- Face Pre-processing & Detection ---
+    FACE_MAX_IMAGE_EDGE = 800      # Sisi terpanjang gambar setelah resize (0 = tanpa resize)
+    FACE_DETECTOR_MODEL = "hog"    # "hog" (CPU, cepat) atau "cnn" (akurat, butuh GPU/dlib CUDA)
+    FACE_DETECTOR_UPSAMPLE = 1     # Upsample saat deteksi; naikkan untuk wajah kecil/jauh
+    FACE_NUM_JITTERS = 1           # Re-sampling saat encoding; lebih tinggi = lebih akurat tapi lambat
+    FACE_LANDMARK_MODEL = "small"  # "small" (5 titik, cepat) atau "large" (68 titik)
+    FACE_GROUP_MAX_IMAGE_EDGE = 1600   # Frame kamera kelas (banyak wajah kecil) butuh resolusi lebih tinggi
+    FACE_GROUP_DETECTOR_UPSAMPLE = 2
+
+    # --- Active Session Registry ---
+    SESI_REGISTRY_REFRESH = 30    # Detik antar muat ulang penuh registry sesi aktif dari DB
+    EXPIRY_SWEEP_INTERVAL = 300   # Detik antar sapuan penuh sesi/barcode yang lewat tenggat
+
+    # --- Rotating QR Code (stateless, lihat utils/rotating_code.py) ---
+    QR_ROTATING_STEP = 15         # Detik masa berlaku satu kode
+    QR_ROTATING_WINDOW = 1        # Langkah sebelum/sesudah yang masih diterima (toleransi jam)
+    QR_ROTATING_CODE_LENGTH = 10  # Panjang token base32
+    BARCODE_CACHE_TTL = 30        # Detik maksimum hasil lookup barcode tersimpan di-cache
+
+    # --- Idempotency (header Idempotency-Key pada /absensi/submit) ---
+    IDEMPOTENCY_TTL = 600         # Detik hasil submit disimpan untuk request ulang dengan kunci sama
+    SUDAH_ABSEN_CACHE_SIZE = 50000   # Pasangan (nim, id_pertemuan) tercatat yang diingat di memori
+    SUDAH_ABSEN_CACHE_TTL = 6 * 3600 # Detik; cukup untuk satu hari perkuliahan
+
+    # --- Riwayat Absensi (keyset pagination) ---
+    HISTORY_PAGE_SIZE = 50        # Baris per halaman jika klien mengirim cursor tanpa limit
+    HISTORY_MAX_PAGE_SIZE = 200   # Batas atas limit dari klien
+
+    # --- Admin CRUD Listing ---
+    ADMIN_PAGE_SIZE = 50          # Baris per halaman GET /admin/<resource>
+    ADMIN_MAX_PAGE_SIZE = 500
+
+    # --- Password Hashing & Import Massal (/admin/import/<mahasiswa|dosen>) ---
+    BCRYPT_ROUNDS = 12            # Cost bcrypt (tiap +1 menggandakan waktu hash)
+    PASSWORD_WORKERS = 2          # Proses worker bcrypt (idealnya <= jumlah core CPU)
+    IMPORT_MAX_ROWS = 5000        # Baris maksimum per file import
+    IMPORT_CHUNK_SIZE = 500       # Baris per transaksi executemany
+
+    # --- Login (/auth/login) ---
+    LOGIN_CACHE_SIZE = 10000      # Record users (per username) yang disimpan di memori
+    LOGIN_CACHE_TTL = 60          # Detik sebelum record users dimuat ulang dari DB
+    LOGIN_WORKERS = 2             # Proses worker verifikasi bcrypt
+    LOGIN_QUEUE_SIZE = 32         # Verifikasi yang boleh mengantre di luar yang sedang berjalan
+    LOGIN_QUEUE_WAIT = 2          # Detik menunggu slot antrean sebelum ditolak (HTTP 503)
+    LOGIN_JOB_TIMEOUT = 5         # Detik maksimum menunggu hasil satu verifikasi
+
+    # --- Realtime Kehadiran (SSE) ---
+    SSE_HEARTBEAT = 15            # Detik antar komentar keepalive saat tidak ada event
+    SSE_MAX_DURATION = 4 * 3600   # Detik maksimum satu koneksi stream (klien menyambung ulang)
+    SSE_QUEUE_SIZE = 1000         # Event tertahan per koneksi sebelum roster dikirim ulang
+
+    # --- Offline Sync (/absensi/submit/batch) ---
+    SYNC_BATCH_MAX_ITEMS = 20     # Item maksimum per request batch
+    SYNC_MAX_AGE = 24 * 3600      # Detik maksimum umur captured_at sebuah item
+    SYNC_CLOCK_SKEW = 120         # Detik toleransi captured_at di depan jam server
+
+    # --- Face Scan Log Writer (asinkron, batch) ---
+    SCAN_LOG_BATCH_SIZE = 200     # Baris per executemany
+    SCAN_LOG_FLUSH_MS = 500       # Interval flush maksimum (milidetik)
+    SCAN_LOG_QUEUE_SIZE = 10000   # Kapasitas antrean; kelebihan dibuang & dihitung
 
     # --- Geolocation Configuration ---
     EARTH_RADIUS_KM = 6371 # Radius bumi untuk perhitungan Haversine
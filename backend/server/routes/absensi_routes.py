@@ -1,20 +1,20 @@
 # server/routes/absensi_routes.py
 
 from flask import Blueprint, request, jsonify
-from utils.jwt_auth import jwt_required
-from services.absensi_service import submit_absensi
+from utils.jwt_auth import jwt_required, role_required
+from services.absensi_service import absensi_service, DB_ERROR_MESSAGE
 from services.sesi_service import get_sesi_aktif_mahasiswa, verify_barcode_absensi
-from database.db import query_db
+from services.face_worker import FaceWorkerError
+from services.face_service import parse_face_box
+from utils.upload import read_image_request, UploadTooLarge, InvalidImage
+from utils.signing import derive_sync_key
 
 absensi_bp = Blueprint('absensi', __name__, url_prefix='/absensi')
 
 # absensi
 @absensi_bp.route('/sesi/aktif', methods=['GET'])
-@jwt_required
+@role_required('mahasiswa')
 def sesi_aktif():
-    if request.user_data.get('level') != 'mahasiswa':
-        return jsonify({"status": "error", "message": "Akses ditolak."}), 403
-    
     nim = request.user_data.get('user_id')
     sesi_aktif = get_sesi_aktif_mahasiswa(nim)
     
@@ -25,11 +25,8 @@ def sesi_aktif():
 
 # verify-barcode endpoint
 @absensi_bp.route('/verify-barcode', methods=['POST'])
-@jwt_required
+@role_required('mahasiswa')
 def verify_barcode():
-    if request.user_data.get('level') != 'mahasiswa':
-        return jsonify({"status": "error", "message": "Akses ditolak."}), 403
-
     data = request.json
     nim = request.user_data.get('user_id')
     kode_barcode = data.get('kode_barcode')
@@ -45,37 +42,85 @@ def verify_barcode():
         return jsonify({"status": "error", "message": message}), 400
 
 @absensi_bp.route('/submit', methods=['POST'])
-@jwt_required # Mahasiswa harus login
+@role_required('mahasiswa') # Hanya mahasiswa yang sudah login
 def absensi_submit():
-    # Pastikan ini adalah user mahasiswa
-    if request.user_data.get('level') != 'mahasiswa':
-        return jsonify({"status": "error", "message": "Akses ditolak."}), 403
-    
-    data = request.json
+    # JSON (image_base64), multipart/form-data (file `image`), atau body biner
+    try:
+        data, image = read_image_request(request)
+    except UploadTooLarge as e:
+        return jsonify({"status": "error", "message": str(e)}), 413
+    except InvalidImage as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
     nim = request.user_data.get('user_id') # Ambil NIM dari token JWT
     id_sesi = data.get('id_sesi')
     metode = data.get('metode')
     lokasi_lat = data.get('lokasi_lat')
     lokasi_long = data.get('lokasi_long')
-    image_base64 = data.get('image_base64') # Hanya diperlukan jika metode='face_recognition'
+    # image hanya diperlukan jika metode='face_recognition'
+    verification_code = data.get('verification_code') # Hanya diperlukan jika metode='qr_code'
+    # Opsional: kunci unik per percobaan submit dari aplikasi, agar retry tidak dicatat/diverifikasi ulang
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
 
     if not all([id_sesi, metode, lokasi_lat, lokasi_long]):
         return jsonify({"status": "error", "message": "Data absensi tidak lengkap."}), 400
 
-    success, message = submit_absensi(nim, id_sesi, metode, lokasi_lat, lokasi_long, image_base64)
+    try:
+        face_box = parse_face_box(data.get('face_box')) # Opsional: lewati deteksi wajah di server
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        success, message = absensi_service.submit_absensi(nim, id_sesi, metode, lokasi_lat, lokasi_long, image, verification_code, face_box, idempotency_key)
+    except FaceWorkerError as e:
+        # Worker wajah penuh/timeout: transaksi dibatalkan, klien boleh mencoba lagi
+        return jsonify({"status": "error", "message": str(e)}), 503
 
     if success:
         return jsonify({"status": "success", "message": message}), 201
     else:
         return jsonify({"status": "error", "message": message}), 400
 
+# Kunci penandatanganan item absensi offline (diambil saat online, disimpan di aplikasi)
+@absensi_bp.route('/sync-key', methods=['GET'])
+@role_required('mahasiswa')
+def sync_key():
+    nim = request.user_data.get('user_id')
+    return jsonify({"status": "success", "sync_key": derive_sync_key(nim)}), 200
+
+# Sinkronisasi antrean absensi offline: {"items": [{id_sesi, metode, lokasi_lat, lokasi_long,
+# captured_at, verification_code?, image_base64?, face_box?, client_id?, signature}, ...]}
+@absensi_bp.route('/submit/batch', methods=['POST'])
+@role_required('mahasiswa')
+def absensi_submit_batch():
+    data = request.get_json(silent=True) or {}
+    nim = request.user_data.get('user_id')
+
+    hasil, message = absensi_service.submit_absensi_batch(nim, data.get('items'))
+
+    if hasil is None:
+        # Error database: 503 agar antrean offline mengirim ulang batch yang sama nanti
+        code = 503 if message == DB_ERROR_MESSAGE else 400
+        return jsonify({"status": "error", "message": message}), code
+
+    return jsonify({"status": "success", "hasil": hasil, "message": message}), 200
+
 # Endpoint History
+# Query string: limit, cursor (next_cursor halaman sebelumnya), fields (dipisah koma), dari, sampai (YYYY-MM-DD)
 @absensi_bp.route('/history/<nim>', methods=['GET'])
 @jwt_required
 def absensi_history(nim):
-    # Logika query untuk mendapatkan riwayat absensi mahasiswa
-    # Anda bisa menggunakan JOIN atau view jika diperlukan
-    history = query_db("SELECT * FROM absensi WHERE nim = %s ORDER BY waktu_absen DESC", (nim,))
-    
-    return jsonify({"status": "success", "history": history}), 200
+    fields = request.args.get('fields')
+    result, message = absensi_service.get_absensi_history(
+        nim,
+        fields=[f.strip() for f in fields.split(',') if f.strip()] if fields else None,
+        limit=request.args.get('limit'),
+        cursor=request.args.get('cursor'),
+        dari=request.args.get('dari'),
+        sampai=request.args.get('sampai')
+    )
+
+    if result is None:
+        return jsonify({"status": "error", "message": message}), 400
 
+    return jsonify({"status": "success", **result}), 200
@@ -1,25 +1,30 @@
 # server/routes/admin_routes.py
 
+import csv
+import io
 from flask import Blueprint, request, jsonify
-from utils.jwt_auth import jwt_required
-from database.db import query_db, execute_db
-from functools import wraps
+from utils.jwt_auth import role_required
+from datetime import datetime, timedelta
+from database.db import execute_db, stream_query
+from database.listing import list_rows, get_row
+from config import Config
+from services.face_service import invalidate_face_descriptor, face_scan_log_writer
+from services.sesi_registry import kelas_mahasiswa_cache
+from utils.metrics import metrics
+from utils.export import export_response
+from services.admin_service import admin_service
+from services.auth_service import invalidate_user
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 # Decorator Khusus Admin
-def admin_required(f):
-    @jwt_required
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        # request.user_data disuntikkan oleh jwt_required
-        if request.user_data.get('level') != 'admin':
-            return jsonify({'message': 'Akses ditolak. Hanya untuk Admin'}), 403
-        return f(*args, **kwargs)
-    return decorated
+admin_required = role_required('admin', message='Akses ditolak. Hanya untuk Admin')
 
 # Fungsi Template CRUD (Create, Read All, Update, Delete)
-def create_crud_endpoint(blueprint, resource_name, table_name, pk_column):
+# on_change(pk_value) dipanggil setelah UPDATE/DELETE berhasil (misal: invalidasi cache)
+# hidden_columns: kolom yang tidak pernah dikirim ke klien (misal: password)
+# GET list mendukung fields, filter, sort, limit/cursor, dan count (lihat database/listing.py)
+def create_crud_endpoint(blueprint, resource_name, table_name, pk_column, on_change=None, hidden_columns=()):
     
     # READ ALL (GET) / CREATE (POST)
     @blueprint.route(f'/{resource_name}', methods=['GET', 'POST'])
@@ -27,9 +32,18 @@ def create_crud_endpoint(blueprint, resource_name, table_name, pk_column):
     def read_all_or_create():
         
         if request.method == 'GET':
-            # READ ALL Logic (Existing)
-            data = query_db(f"SELECT * FROM {table_name}")
-            return jsonify({"status": "success", f"{resource_name}": data}), 200
+            # READ ALL: per halaman, tanpa kolom BLOB kecuali diminta lewat `fields`
+            try:
+                page = list_rows(
+                    table_name, request.args, pk=pk_column, hidden=hidden_columns,
+                    page_size=Config.ADMIN_PAGE_SIZE, max_page_size=Config.ADMIN_MAX_PAGE_SIZE
+                )
+            except ValueError as e:
+                return jsonify({"status": "error", "message": str(e)}), 400
+            if page is None:
+                return jsonify({"status": "error", "message": "Gagal mengambil data."}), 500
+            rows = page.pop('rows')
+            return jsonify({"status": "success", f"{resource_name}": rows, **page}), 200
         
         elif request.method == 'POST':
             # CREATE Logic (New)
@@ -65,8 +79,11 @@ def create_crud_endpoint(blueprint, resource_name, table_name, pk_column):
     def crud_one(pk_value):
         
         if request.method == 'GET':
-            # READ ONE Logic (Existing)
-            data = query_db(f"SELECT * FROM {table_name} WHERE {pk_column} = %s", (pk_value,), fetchone=True)
+            # READ ONE Logic (projection sama dengan READ ALL)
+            try:
+                data = get_row(table_name, pk_column, pk_value, request.args.get('fields'), hidden_columns)
+            except ValueError as e:
+                return jsonify({"status": "error", "message": str(e)}), 400
             if data:
                 return jsonify({"status": "success", f"{resource_name}": data}), 200
             return jsonify({"status": "error", "message": f"{resource_name} tidak ditemukan."}), 404
@@ -76,6 +93,8 @@ def create_crud_endpoint(blueprint, resource_name, table_name, pk_column):
             try:
                 success = execute_db(f"DELETE FROM {table_name} WHERE {pk_column} = %s", (pk_value,))
                 if success:
+                    if on_change:
+                        on_change(pk_value)
                     return jsonify({"status": "success", "message": f"{resource_name} berhasil dihapus."}), 200
                 return jsonify({"status": "error", "message": f"{resource_name} tidak ditemukan atau gagal menghapus."}), 404
             except Exception as e:
@@ -95,6 +114,8 @@ def create_crud_endpoint(blueprint, resource_name, table_name, pk_column):
                 success = execute_db(update_query, tuple(params))
                 
                 if success:
+                    if on_change:
+                        on_change(pk_value)
                     return jsonify({"status": "success", "message": f"{resource_name} berhasil diperbarui."}), 200
                 return jsonify({"status": "error", "message": f"{resource_name} tidak ditemukan atau gagal memperbarui."}), 404
             except Exception as e:
@@ -106,13 +127,21 @@ def create_crud_endpoint(blueprint, resource_name, table_name, pk_column):
 # =======================================================================================
 
 # Kelola Akun (Hati-hati dalam menggunakan ini, sebaiknya diatur via Dosen/Mahasiswa)
-create_crud_endpoint(admin_bp, 'users', 'users', 'id_user')
+# Perubahan akun langsung membuang cache login (services/auth_service.py)
+create_crud_endpoint(admin_bp, 'users', 'users', 'id_user', on_change=lambda _: invalidate_user(),
+                     hidden_columns=('password',))
 
-# Kelola Dosen (PK: nip)
-create_crud_endpoint(admin_bp, 'dosen', 'dosen', 'nip')
+# Kelola Dosen (PK: nip). face_descriptor tidak pernah dikirim, apa pun tipe kolomnya (TEXT/BLOB)
+create_crud_endpoint(admin_bp, 'dosen', 'dosen', 'nip', hidden_columns=('face_descriptor',))
 
 # Kelola Mahasiswa (PK: nim)
-create_crud_endpoint(admin_bp, 'mahasiswa', 'mahasiswa', 'nim')
+def _mahasiswa_changed(nim):
+    # Buang data turunan yang di-cache per mahasiswa
+    invalidate_face_descriptor(nim)
+    kelas_mahasiswa_cache.pop(nim)
+
+create_crud_endpoint(admin_bp, 'mahasiswa', 'mahasiswa', 'nim', on_change=_mahasiswa_changed,
+                     hidden_columns=('face_descriptor',))
 
 # Kelola Kelas (PK: id_kelas)
 create_crud_endpoint(admin_bp, 'kelas', 'kelas', 'id_kelas')
@@ -128,5 +157,94 @@ create_crud_endpoint(admin_bp, 'pertemuan', 'pertemuan', 'id_pertemuan')
 @admin_bp.route('/logs/face-scan', methods=['GET'])
 @admin_required
 def log_face_scan():
-    logs = query_db("SELECT * FROM face_scan_log ORDER BY created_at DESC")
-    return jsonify({"status": "success", "logs": logs}), 200
\ No newline at end of file
+    # Terbaru dulu secara default; filter/sort/pagination sama dengan endpoint CRUD
+    try:
+        page = list_rows(
+            'face_scan_log', request.args, default_sort='-created_at',
+            page_size=Config.ADMIN_PAGE_SIZE, max_page_size=Config.ADMIN_MAX_PAGE_SIZE
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if page is None:
+        return jsonify({"status": "error", "message": "Gagal mengambil log."}), 500
+    logs = page.pop('rows')
+    return jsonify({"status": "success", "logs": logs, **page}), 200
+
+# Export log face scan (stream CSV/XLSX): ?format=csv|xlsx&dari=YYYY-MM-DD&sampai=YYYY-MM-DD
+@admin_bp.route('/logs/face-scan/export', methods=['GET'])
+@admin_required
+def export_face_scan_log():
+    conditions, params = [], []
+    try:
+        if request.args.get('dari'):
+            conditions.append("created_at >= %s")
+            params.append(datetime.strptime(request.args['dari'], '%Y-%m-%d'))
+        if request.args.get('sampai'):
+            conditions.append("created_at < %s")
+            params.append(datetime.strptime(request.args['sampai'], '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Format tanggal harus YYYY-MM-DD."}), 400
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = stream_query(f"SELECT * FROM face_scan_log {where} ORDER BY created_at", tuple(params))
+    try:
+        return export_response(rows, request.args.get('format', 'csv'), "face_scan_log", sheet_name='Face Scan')
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+def _read_import_rows(req):
+    """
+    Baris import dari request: file CSV (multipart field `file`), body text/csv,
+    atau JSON berupa list objek / {"rows": [...]}. Header CSV = nama kolom.
+    """
+    mimetype = req.mimetype or ''
+    if mimetype == 'multipart/form-data':
+        upload = req.files.get('file')
+        if upload is None:
+            raise ValueError("File CSV wajib diunggah pada field 'file'.")
+        raw = upload.read()
+    elif mimetype in ('text/csv', 'text/plain'):
+        raw = req.get_data()
+    else:
+        data = req.get_json(silent=True)
+        rows = data.get('rows') if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            raise ValueError("Payload JSON harus berupa list baris atau {\"rows\": [...]}.")
+        return rows
+
+    try:
+        text = raw.decode('utf-8-sig')  # BOM dari Excel ikut dibuang
+    except UnicodeDecodeError:
+        raise ValueError("File CSV harus ber-encoding UTF-8.")
+    reader = csv.DictReader(io.StringIO(text))
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    return list(reader)
+
+# Import massal akun: POST /admin/import/mahasiswa atau /admin/import/dosen (CSV atau JSON)
+# Baris yang gagal dilaporkan per baris; baris lain tetap disimpan.
+@admin_bp.route('/import/<jenis>', methods=['POST'])
+@admin_required
+def import_akun(jenis):
+    try:
+        rows = _read_import_rows(request)
+        hasil = admin_service.bulk_import(jenis, rows)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    message = f"{hasil['berhasil']} dari {hasil['total']} baris berhasil diimpor."
+    return jsonify({"status": "success", "message": message, **hasil}), 200
+
+# Endpoint Khusus: Metrik latensi in-process (misal durasi tiap tahap pengenalan wajah)
+@admin_bp.route('/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    snapshot = metrics.snapshot()
+    snapshot['face_scan_log'] = {
+        "antrean": face_scan_log_writer.pending,
+        "dibuang": face_scan_log_writer.dropped,
+        "gagal": face_scan_log_writer.failed,
+    }
+    return jsonify({"status": "success", "metrics": snapshot}), 200
\ No newline at end of file
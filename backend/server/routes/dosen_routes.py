@@ -1,18 +1,22 @@
 # server/routes/dosen_routes.py
 
-from flask import Blueprint, request, jsonify
-from utils.jwt_auth import jwt_required
-from services.sesi_service import open_sesi, generate_barcode, get_rekap_kehadiran, get_sesi_kehadiran_realtime
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from utils.jwt_auth import role_required
+from services.sesi_service import open_sesi, generate_barcode, get_rotating_code, get_rekap_kehadiran, get_sesi_kehadiran_realtime, stream_sesi_kehadiran
+from services.rekap_service import stream_rekap_kelas
+from services.absensi_service import absensi_service
+from services.kehadiran_events import stream_kehadiran
+from services.sesi_registry import sesi_registry
+from services.face_worker import FaceWorkerError
+from utils.upload import read_image_request, UploadTooLarge, InvalidImage
+from utils.export import export_response
 from functools import wraps # Diperlukan untuk decorator
 
 dosen_bp = Blueprint('dosen', __name__, url_prefix='/dosen')
 
 @dosen_bp.route('/sesi/open', methods=['POST'])
-@jwt_required
+@role_required('dosen', message="Akses ditolak. Hanya untuk Dosen.")
 def sesi_open():
-    if request.user_data.get('level') != 'dosen':
-        return jsonify({"status": "error", "message": "Akses ditolak. Hanya untuk Dosen."}), 403
-        
     data = request.json
     nip_dosen = request.user_data.get('user_id') # Ambil NIP dari token JWT
     
@@ -34,11 +38,8 @@ def sesi_open():
         return jsonify({"status": "error", "message": message}), 400
 
 @dosen_bp.route('/barcode/generate', methods=['POST'])
-@jwt_required
+@role_required('dosen', message="Akses ditolak. Hanya untuk Dosen.")
 def barcode_generate():
-    if request.user_data.get('level') != 'dosen':
-        return jsonify({"status": "error", "message": "Akses ditolak. Hanya untuk Dosen."}), 403
-    
     data = request.json
     nip_dosen = request.user_data.get('user_id') 
     id_sesi = data.get('id_sesi')
@@ -51,22 +52,88 @@ def barcode_generate():
     else:
         return jsonify({"status": "error", "message": message}), 400
 
+# Kode QR berputar (stateless): layar dosen meminta ulang setiap `berlaku_detik`
+@dosen_bp.route('/sesi/<int:id_sesi>/qr', methods=['GET'])
+@role_required('dosen', message="Akses ditolak. Hanya untuk Dosen.")
+def sesi_rotating_qr(id_sesi):
+    nip_dosen = request.user_data.get('user_id')
+    qr, message = get_rotating_code(id_sesi, nip_dosen)
+
+    if qr:
+        return jsonify({"status": "success", **qr, "message": message}), 200
+    else:
+        return jsonify({"status": "error", "message": message}), 400
+
 @dosen_bp.route('/rekap/<int:id_kelas>', methods=['GET'])
-@jwt_required
+@role_required('dosen', 'admin')
 def rekap_kehadiran(id_kelas):
-    if request.user_data.get('level') not in ('dosen', 'admin'):
-        return jsonify({"status": "error", "message": "Akses ditolak."}), 403
-        
     rekap = get_rekap_kehadiran(id_kelas)
     
     return jsonify({"status": "success", "rekap": rekap}), 200
 
+# Export rekap (CSV, atau XLSX jika xlsxwriter terpasang): ?format=csv|xlsx
+@dosen_bp.route('/rekap/<int:id_kelas>/export', methods=['GET'])
+@role_required('dosen', 'admin')
+def rekap_kehadiran_export(id_kelas):
+    try:
+        return export_response(stream_rekap_kelas(id_kelas), request.args.get('format', 'csv'),
+                               f"rekap_kelas_{id_kelas}", sheet_name='Rekap')
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
 @dosen_bp.route('/sesi/<int:id_sesi>/kehadiran', methods=['GET'])
-@jwt_required
+@role_required('dosen', 'admin')
 def sesi_kehadiran_realtime(id_sesi):
-    if request.user_data.get('level') not in ('dosen', 'admin'):
-        return jsonify({"status": "error", "message": "Akses ditolak."}), 403
-        
     kehadiran = get_sesi_kehadiran_realtime(id_sesi)
     
-    return jsonify({"status": "success", "kehadiran": kehadiran}), 200
\ No newline at end of file
+    return jsonify({"status": "success", "kehadiran": kehadiran}), 200
+
+@dosen_bp.route('/sesi/<int:id_sesi>/kehadiran/export', methods=['GET'])
+@role_required('dosen', 'admin')
+def sesi_kehadiran_export(id_sesi):
+    try:
+        return export_response(stream_sesi_kehadiran(id_sesi), request.args.get('format', 'csv'),
+                               f"kehadiran_sesi_{id_sesi}", sheet_name='Kehadiran')
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+# Realtime tanpa polling: roster sekali, lalu hanya delta absensi (Server-Sent Events)
+@dosen_bp.route('/sesi/<int:id_sesi>/kehadiran/stream', methods=['GET'])
+@role_required('dosen', 'admin')
+def sesi_kehadiran_stream(id_sesi):
+    events = stream_kehadiran(
+        id_sesi,
+        lambda: get_sesi_kehadiran_realtime(id_sesi),
+        active=sesi_registry.get(id_sesi) is not None
+    )
+    return Response(stream_with_context(events), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no', # Jangan di-buffer oleh reverse proxy (nginx)
+    })
+
+# Check-in kelompok: satu frame kamera kelas berisi banyak wajah mahasiswa
+@dosen_bp.route('/sesi/<int:id_sesi>/kiosk', methods=['POST'])
+@role_required('dosen', message="Akses ditolak. Hanya untuk Dosen.")
+def sesi_kiosk(id_sesi):
+    # JSON (image_base64), multipart/form-data (file `image`), atau body biner
+    try:
+        _, image = read_image_request(request)
+    except UploadTooLarge as e:
+        return jsonify({"status": "error", "message": str(e)}), 413
+    except InvalidImage as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    nip_dosen = request.user_data.get('user_id')
+
+    if not image:
+        return jsonify({"status": "error", "message": "Input tidak lengkap."}), 400
+
+    try:
+        hasil, message = absensi_service.submit_absensi_group(id_sesi, nip_dosen, image)
+    except FaceWorkerError as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+
+    if hasil is None:
+        return jsonify({"status": "error", "message": message}), 400
+
+    return jsonify({"status": "success", "hasil": hasil, "message": message}), 201
\ No newline at end of file
@@ -1,21 +1,39 @@
 # server/routes/face_routes.py
 
 from flask import Blueprint, request, jsonify
-from services.face_service import register_face, verify_face
+from utils.jwt_auth import role_required
+from services.face_service import register_face, verify_face, identify_face, parse_face_box
+from services.face_worker import FaceWorkerError
+from services.sesi_registry import sesi_registry
+from utils.upload import read_image_request, UploadTooLarge, InvalidImage
 
 face_bp = Blueprint('face', __name__, url_prefix='/face')
 
 @face_bp.route('/register', methods=['POST'])
 def register():
-    data = request.json
+    # JSON (image), multipart/form-data (file `image`), atau body biner
+    try:
+        data, image = read_image_request(request)
+    except UploadTooLarge as e:
+        return jsonify({"status": "error", "message": str(e)}), 413
+    except InvalidImage as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
     user_id = data.get('user_id')
     user_type = data.get('user_type')
-    image_base64 = data.get('image_base64')
 
-    if not all([user_id, user_type, image_base64]):
+    if not all([user_id, user_type, image]):
         return jsonify({"status": "error", "message": "Input tidak lengkap."}), 400
 
-    success, message = register_face(user_id, user_type, image_base64)
+    try:
+        face_box = parse_face_box(data.get('face_box'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        success, message = register_face(user_id, user_type, image, face_box)
+    except FaceWorkerError as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
 
     if success:
         return jsonify({"status": "success", "message": message}), 201
@@ -24,14 +42,28 @@ def register():
 
 @face_bp.route('/verify', methods=['POST'])
 def verify():
-    data = request.json
+    # JSON (image), multipart/form-data (file `image`), atau body biner
+    try:
+        data, image = read_image_request(request)
+    except UploadTooLarge as e:
+        return jsonify({"status": "error", "message": str(e)}), 413
+    except InvalidImage as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
     nim = data.get('nim')
-    image_base64 = data.get('image_base64')
 
-    if not all([nim, image_base64]):
+    if not all([nim, image]):
         return jsonify({"status": "error", "message": "Input tidak lengkap."}), 400
 
-    match, confidence_score, message = verify_face(nim, image_base64)
+    try:
+        face_box = parse_face_box(data.get('face_box'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        match, confidence_score, message = verify_face(nim, image, face_box)
+    except FaceWorkerError as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
     
     # Catatan: Log ke face_scan_log harus ditambahkan di sini atau di logic absensi submit
 
@@ -40,4 +72,53 @@ def verify():
         "match": match,
         "confidence_score": confidence_score,
         "message": message
+    }), 200
+
+# Identifikasi 1:N untuk kiosk: cari mahasiswa kelas sesi ini yang paling mirip
+@face_bp.route('/identify', methods=['POST'])
+@role_required('dosen', 'admin')
+def identify():
+    # JSON (image), multipart/form-data (file `image`), atau body biner
+    try:
+        data, image = read_image_request(request)
+    except UploadTooLarge as e:
+        return jsonify({"status": "error", "message": str(e)}), 413
+    except InvalidImage as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    id_sesi = data.get('id_sesi')
+
+    if not all([id_sesi, image]):
+        return jsonify({"status": "error", "message": "Input tidak lengkap."}), 400
+
+    try:
+        id_sesi = int(id_sesi)
+        top_k = int(data.get('top_k') or 3)
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "id_sesi dan top_k harus berupa angka."}), 400
+
+    # Dosen hanya boleh mengidentifikasi di sesinya sendiri (sama seperti kiosk di dosen_routes)
+    if request.user_data.get('level') != 'admin':
+        sesi_data = sesi_registry.get(id_sesi, include_expired=True)
+        if not sesi_data or str(sesi_data['nip_dosen']) != str(request.user_data.get('user_id')):
+            return jsonify({"status": "error", "message": "Sesi tidak ditemukan, sudah ditutup, atau bukan milik dosen ini."}), 403
+
+    try:
+        face_box = parse_face_box(data.get('face_box'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        candidates, message = identify_face(id_sesi, image, top_k, face_box)
+    except FaceWorkerError as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+
+    if candidates is None:
+        return jsonify({"status": "error", "message": message}), 400
+
+    return jsonify({
+        "status": "success",
+        "match": candidates[0]['match'],
+        "candidates": candidates,
+        "message": message
     }), 200
\ No newline at end of file
@@ -1,13 +1,49 @@
 # server/services/absensi_service.py
 
-from database.db import query_db, execute_db # Menggunakan fungsi utility DB
+import base64
+import mysql.connector
+from mysql.connector import errorcode
+from config import Config
+from database.db import query_db, transaction # Menggunakan fungsi utility DB
 from utils.geolocation import calculate_distance
-from services.face_service import verify_face # Asumsi fungsi ini ada
+from services.face_service import verify_face, verify_faces, match_group_frame, log_face_scan, image_to_bytes, parse_face_box
+from services.sesi_registry import sesi_registry, get_kelas_mahasiswa
+from services.sesi_service import verify_rotating_code, lookup_barcode
+from utils.rotating_code import is_rotating_code
+from utils.idempotency import IdempotencyCache
+from utils.cache import LRUCache
+from utils.signing import verify_item_signature
+from services.rekap_service import record_absensi, refresh_rekap
+from services.kehadiran_events import publish_kehadiran
 from datetime import datetime, timedelta
 # Import untuk model User dan bcrypt jika logic login ditaruh di sini (Seperti yang kita bahas sebelumnya)
 # from utils.auth_model import User 
 # import bcrypt
 
+# Pesan error database; route memetakannya ke HTTP 5xx (bukan 400) agar klien mencoba lagi
+DB_ERROR_MESSAGE = "Terjadi kesalahan database saat mencatat absensi."
+
+# Metode yang diterima dari antrean offline (/absensi/submit/batch)
+SYNC_METODE = ('face_recognition', 'qr_code')
+
+# Hasil submit per (nim, Idempotency-Key); error database tidak disimpan agar bisa dicoba lagi
+submit_results = IdempotencyCache(ttl=Config.IDEMPOTENCY_TTL)
+
+# (nim, id_pertemuan) yang sudah tercatat: tap ulang setelah absen berhasil ditolak sebelum
+# verifikasi wajah, tanpa memakai slot worker wajah
+sudah_absen_cache = LRUCache(maxsize=Config.SUDAH_ABSEN_CACHE_SIZE, ttl=Config.SUDAH_ABSEN_CACHE_TTL)
+
+def _sudah_absen(nim, id_pertemuan, probe_db):
+    """True jika absensi sudah tercatat (cache, lalu probe unique key jika `probe_db`)."""
+    if sudah_absen_cache.get((nim, id_pertemuan)):
+        return True
+    if not probe_db:
+        return False
+    row = query_db("SELECT 1 AS ada FROM absensi WHERE nim = %s AND id_pertemuan = %s LIMIT 1", (nim, id_pertemuan), fetchone=True)
+    if row:
+        sudah_absen_cache.set((nim, id_pertemuan), True)
+    return bool(row)
+
 class AbsensiService:
     # Asumsi: Tidak perlu self.conn jika menggunakan query_db/execute_db global
 
@@ -16,36 +52,34 @@ class AbsensiService:
 
     # --- Logika Absensi ---
 
-    def submit_absensi(self, nim, id_sesi, metode, lokasi_lat, lokasi_long, image_base64=None, verification_code=None):
-        """Mencatat absensi mahasiswa dengan validasi waktu, lokasi, dan metode (Wajah/QR)."""
-        
-        # 1. Ambil Data Sesi Aktif
-        sesi_data = query_db("""
-            SELECT s.id_sesi, s.id_pertemuan, s.lokasi_lat, s.lokasi_long, s.radius_meter, s.waktu_buka, s.durasi_menit
-            FROM sesi_absensi s
-            WHERE s.id_sesi = %s AND s.status_sesi = 'aktif'
-        """, (id_sesi,), fetchone=True)
+    def submit_absensi(self, nim, id_sesi, metode, lokasi_lat, lokasi_long, image=None, verification_code=None, face_box=None, idempotency_key=None):
+        """
+        Mencatat absensi mahasiswa dengan validasi waktu, lokasi, dan metode (Wajah/QR).
+        `image` berupa bytes gambar atau string Base64.
+        `idempotency_key` (opsional, dari klien): request ulang dengan kunci yang sama
+        mengembalikan hasil pertama tanpa verifikasi wajah ulang.
+        """
+        key = (nim, idempotency_key) if idempotency_key else None
+        return submit_results.run(
+            key,
+            lambda: self._submit_absensi(nim, id_sesi, metode, lokasi_lat, lokasi_long, image, verification_code, face_box),
+            cache_if=lambda result: result[1] != DB_ERROR_MESSAGE
+        )
+
+    def _submit_absensi(self, nim, id_sesi, metode, lokasi_lat, lokasi_long, image, verification_code, face_box):
+        # 1. Ambil Data Sesi Aktif (registry in-memory, tanpa query DB)
+        sesi_data = sesi_registry.get(id_sesi, include_expired=True)
 
         if not sesi_data:
             return False, "Sesi absensi tidak ditemukan atau sudah ditutup."
 
         # 2. Cek apakah sudah kadaluarsa
-        waktu_tutup_seharusnya = sesi_data['waktu_buka'] + timedelta(minutes=sesi_data['durasi_menit'])
-        if datetime.now() > waktu_tutup_seharusnya:
-            # PENTING: Set status_sesi='selesai' secara otomatis agar tidak perlu lagi dicek
-            # Ini mencegah mahasiswa absen setelah waktu berakhir
-            execute_db("UPDATE sesi_absensi SET status_sesi = 'selesai' WHERE id_sesi = %s", (id_sesi,))
+        # status_sesi='selesai' di-set tepat waktu oleh services/expiry_scheduler.py,
+        # jalur request ini cukup menolak tanpa UPDATE.
+        if datetime.now() > sesi_data['waktu_tutup_seharusnya']:
             return False, "Sesi absensi sudah berakhir."
 
-        # 3. Cek apakah Mahasiswa sudah absen di pertemuan ini
-        sudah_absen = query_db("""
-            SELECT id_absensi FROM absensi WHERE nim = %s AND id_pertemuan = %s
-        """, (nim, sesi_data['id_pertemuan']), fetchone=True)
-        
-        if sudah_absen:
-            return False, "Anda sudah melakukan absensi untuk pertemuan ini."
-
-        # 4. Validasi GPS (Haversine)
+        # 3. Validasi GPS (Haversine) - sebelum meminjam koneksi DB
         dosen_lat = float(sesi_data['lokasi_lat'])
         dosen_long = float(sesi_data['lokasi_long'])
         
@@ -59,77 +93,475 @@ class AbsensiService:
         if jarak_meter > radius:
             return False, f"Anda berada di luar radius lokasi absensi ({round(jarak_meter)}m). Radius maksimal {radius}m."
 
-        # 5. Validasi Metode (Face Recognition / QR Code)
-        confidence_score = 0.0
-        
+        # 4. Tap ulang setelah absen berhasil: tolak sebelum verifikasi. Probe DB (index unique key)
+        # hanya untuk metode wajah, yang jauh lebih mahal daripada satu SELECT
+        if _sudah_absen(nim, sesi_data['id_pertemuan'], probe_db=metode == 'face_recognition'):
+            return False, "Anda sudah melakukan absensi untuk pertemuan ini."
+
+        # 5. Validasi Metode (Face Recognition / QR Code) - tanpa memegang koneksi DB
+        confidence_score, error_message = self._verify_metode(sesi_data, nim, metode, lokasi_lat, lokasi_long, image, verification_code, face_box)
+        if error_message:
+            return False, error_message
+
+        # 6. Insert ke tabel absensi. Absen ganda ditolak oleh unique key (nim, id_pertemuan),
+        # bukan SELECT terpisah, sehingga double-tap yang bersamaan pun tidak tercatat dua kali.
+        # waktu_absen diisi dari sini (detik penuh, presisi kolom DATETIME) agar sama dengan rekap
+        waktu_absen = datetime.now().replace(microsecond=0)
+        query = """
+            INSERT INTO absensi (nim, id_pertemuan, id_sesi, status, waktu_absen, metode, confidence_score, lokasi_lat, lokasi_long)
+            VALUES (%s, %s, %s, 'hadir', %s, %s, %s, %s, %s)
+        """
+        params = (nim, sesi_data['id_pertemuan'], id_sesi, waktu_absen, metode, confidence_score, lokasi_lat, lokasi_long)
+        try:
+            with transaction() as tx:
+                tx.execute(query, params)
+                record_absensi(tx, [(nim, sesi_data['id_kelas'], 'hadir', waktu_absen)])
+        except mysql.connector.IntegrityError as err:
+            if err.errno == errorcode.ER_DUP_ENTRY:
+                sudah_absen_cache.set((nim, sesi_data['id_pertemuan']), True)
+                return False, "Anda sudah melakukan absensi untuk pertemuan ini."
+            print(f"Database Error: {err}")
+            return False, DB_ERROR_MESSAGE
+        except mysql.connector.Error as err:
+            print(f"Database Error: {err}")
+            return False, DB_ERROR_MESSAGE
+
+        sudah_absen_cache.set((nim, sesi_data['id_pertemuan']), True)
+        publish_kehadiran(id_sesi, [{
+            "nim": nim, "status": 'hadir', "waktu_absen": waktu_absen,
+            "metode": metode, "confidence_score": confidence_score,
+        }])
+        return True, "Absensi berhasil dicatat."
+
+    def _verify_metode(self, sesi_data, nim, metode, lokasi_lat, lokasi_long, image, verification_code, face_box):
+        """Mengembalikan (confidence_score, pesan_error); pesan_error None jika lolos."""
         if metode == 'face_recognition':
-            if not image_base64:
-                 return False, "Diperlukan data gambar wajah untuk verifikasi."
+            if not image:
+                 return 0.0, "Diperlukan data gambar wajah untuk verifikasi."
                  
-            match, confidence_score, face_message = verify_face(nim, image_base64)
+            match, confidence_score, face_message = verify_face(nim, image, face_box)
             
-            # Log aktivitas scan wajah
-            log_query = "INSERT INTO face_scan_log (user_type, user_id, action, confidence_score, lokasi_lat, lokasi_long) VALUES (%s, %s, %s, %s, %s, %s)"
+            # Log aktivitas scan wajah (asinkron, di luar transaksi absensi)
             action_log = 'verify' if match else 'failed'
-            execute_db(log_query, ('mahasiswa', nim, action_log, confidence_score, lokasi_lat, lokasi_long))
+            log_face_scan('mahasiswa', nim, action_log, confidence_score, lokasi_lat, lokasi_long)
             
             if not match:
-                return False, f"Verifikasi wajah gagal. {face_message}"
+                return confidence_score, f"Verifikasi wajah gagal. {face_message}"
+            return confidence_score, None
         
         elif metode == 'qr_code':
             # --- PENTING: Logika Validasi QR Code ---
             if not verification_code:
-                return False, "Diperlukan kode QR untuk verifikasi."
+                return 0.0, "Diperlukan kode QR untuk verifikasi."
             
-            # Cek status kode QR di tabel `barcode` atau `sesi_absensi`
-            # Asumsi: `verification_code` adalah `kode_barcode` dari tabel `barcode`
-            barcode_valid = query_db("""
-                SELECT id_barcode FROM barcode 
-                WHERE kode_barcode = %s AND id_sesi = %s AND status = 'aktif' AND waktu_kadaluarsa > NOW()
-            """, (verification_code, id_sesi), fetchone=True)
+            if is_rotating_code(verification_code):
+                # Kode QR berputar: diverifikasi dengan HMAC di memori, tanpa query
+                barcode_valid = verify_rotating_code(sesi_data, verification_code)
+            else:
+                # Kode barcode tersimpan (tabel `barcode`), lookup di-cache per kode
+                barcode_data = lookup_barcode(verification_code)
+                barcode_valid = (
+                    barcode_data is not None
+                    and barcode_data['id_sesi'] == sesi_data['id_sesi']
+                    and datetime.now() <= barcode_data['waktu_kadaluarsa']
+                )
             
             if not barcode_valid:
-                return False, "Kode QR tidak valid atau sudah kadaluarsa."
+                return 0.0, "Kode QR tidak valid atau sudah kadaluarsa."
             
             # Set confidence_score menjadi 1.0 (100%) untuk absensi QR yang sukses
-            confidence_score = 1.0 
+            return 1.0, None
         
         # NOTE: Jika metode adalah 'manual', tidak ada validasi tambahan selain lokasi/waktu.
+        return 0.0, None
 
-        # 6. Insert ke tabel absensi
-        query = """
-            INSERT INTO absensi (nim, id_pertemuan, id_sesi, status, metode, confidence_score, lokasi_lat, lokasi_long)
-            VALUES (%s, %s, %s, 'hadir', %s, %s, %s, %s)
+
+    def submit_absensi_group(self, id_sesi, nip_dosen, image):
         """
-        params = (nim, sesi_data['id_pertemuan'], id_sesi, metode, confidence_score, lokasi_lat, lokasi_long)
-        
-        if execute_db(query, params):
-            return True, "Absensi berhasil dicatat."
-        else:
-            return False, "Terjadi kesalahan database saat mencatat absensi."
+        Check-in kelompok dari satu frame kamera kelas (dioperasikan dosen).
+        Semua wajah yang cocok dicatat sekaligus dengan satu executemany ke `absensi`;
+        log `face_scan_log` ditulis berkelompok oleh batch writer.
+        Mengembalikan (hasil, pesan); hasil None jika gagal.
+        """
+        sesi_data = sesi_registry.get(id_sesi)
+        if not sesi_data or str(sesi_data['nip_dosen']) != str(nip_dosen):
+            return None, "Sesi tidak ditemukan, sudah ditutup, atau bukan milik dosen ini."
 
+        # Encoding frame berat, jadi dilakukan sebelum meminjam koneksi transaksi
+        matches, jumlah_wajah, message = match_group_frame(id_sesi, image)
+        if matches is None:
+            return None, message
 
-    def get_absensi_history(self, nim):
-        """Mengambil riwayat absensi lengkap seorang mahasiswa."""
-        
-        # Memanfaatkan view v_rekap_kehadiran untuk mendapatkan status total
-        # atau query gabungan untuk mendapatkan detail per absensi
-        query = """
-            SELECT 
-                a.id_absensi, a.waktu_absen, a.status, a.metode, a.confidence_score, a.keterangan,
-                p.pertemuan_ke, p.tanggal, p.topik,
-                k.nama_kelas,
-                mk.nama_matakuliah, mk.kode_mk
-            FROM absensi a
-            JOIN pertemuan p ON a.id_pertemuan = p.id_pertemuan
-            JOIN kelas k ON p.id_kelas = k.id_kelas
-            JOIN matakuliah mk ON k.id_matakuliah = mk.id_matakuliah
-            WHERE a.nim = %s
-            ORDER BY p.tanggal DESC, p.pertemuan_ke DESC
+        try:
+            with transaction() as tx:
+                sudah_absen = set()
+                if matches:
+                    placeholders = ', '.join(['%s'] * len(matches))
+                    rows = tx.query(
+                        f"SELECT nim FROM absensi WHERE id_pertemuan = %s AND nim IN ({placeholders})",
+                        (sesi_data['id_pertemuan'], *[m['nim'] for m in matches])
+                    )
+                    sudah_absen = {row['nim'] for row in rows}
+
+                baru = [m for m in matches if m['nim'] not in sudah_absen]
+                lat, long = sesi_data['lokasi_lat'], sesi_data['lokasi_long']
+                if baru:
+                    waktu_absen = datetime.now().replace(microsecond=0)
+                    # ON DUPLICATE KEY: mahasiswa yang absen sendiri di sela SELECT di atas tidak menggagalkan batch
+                    inserted = tx.executemany("""
+                        INSERT INTO absensi (nim, id_pertemuan, id_sesi, status, waktu_absen, metode, confidence_score, lokasi_lat, lokasi_long)
+                        VALUES (%s, %s, %s, 'hadir', %s, 'face_recognition', %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE id_absensi = id_absensi
+                    """, [(m['nim'], sesi_data['id_pertemuan'], id_sesi, waktu_absen, m['confidence_score'], lat, long) for m in baru])
+                    _record_rekap(tx, inserted, [(m['nim'], sesi_data['id_kelas'], 'hadir', waktu_absen) for m in baru])
+        except mysql.connector.Error as err:
+            print(f"Database Error: {err}")
+            return None, DB_ERROR_MESSAGE
+
+        if baru:
+            publish_kehadiran(id_sesi, [{
+                "nim": m['nim'], "status": 'hadir', "waktu_absen": waktu_absen,
+                "metode": 'face_recognition', "confidence_score": m['confidence_score'],
+            } for m in baru])
+
+        # Log scan wajah digabung oleh batch writer menjadi satu executemany
+        for m in matches:
+            log_face_scan('mahasiswa', m['nim'], 'verify', m['confidence_score'], lat, long)
+
+        return {
+            "jumlah_wajah": jumlah_wajah,
+            "tercatat": baru,
+            "sudah_absen": sorted(sudah_absen),
+            "tidak_dikenali": jumlah_wajah - len(matches),
+        }, f"{len(baru)} mahasiswa berhasil dicatat hadir."
+
+    # --- Sinkronisasi Offline ---
+
+    def submit_absensi_batch(self, nim, items):
+        """
+        Sinkronisasi absensi yang diambil saat offline (antrean aplikasi Flutter).
+        Setiap item ditandatangani (utils/signing.py) dan divalidasi terhadap jendela sesi
+        pada waktu `captured_at`, bukan waktu upload. Wajah semua item diverifikasi paralel
+        di worker pool; item yang lolos ditulis dengan satu executemany.
+        Mengembalikan (hasil_per_item, pesan); hasil None jika seluruh batch gagal.
+        Status item: 'diterima', 'sudah_absen', 'ditolak', atau 'coba_lagi' (worker wajah sibuk).
+        """
+        if not isinstance(items, list) or not items:
+            return None, "Daftar item absensi kosong."
+        if len(items) > Config.SYNC_BATCH_MAX_ITEMS:
+            return None, f"Maksimal {Config.SYNC_BATCH_MAX_ITEMS} item per batch."
+
+        results = [None] * len(items)
+        def reject(i, message, status='ditolak'):
+            results[i] = {"status": status, "message": message}
+
+        # 1. Validasi per item tanpa DB: field, tanda tangan, dan waktu pengambilan
+        now = datetime.now()
+        pending = []
+        for i, item in enumerate(items):
+            if not isinstance(item, dict) or not all(item.get(k) for k in ('id_sesi', 'metode', 'lokasi_lat', 'lokasi_long', 'captured_at')):
+                reject(i, "Data absensi tidak lengkap.")
+                continue
+            # Item offline hanya sah dengan bukti (wajah atau kode QR): captured_at dan GPS
+            # berasal dari klien, dan kunci tanda tangan dipegang mahasiswa sendiri
+            if item['metode'] not in SYNC_METODE:
+                reject(i, "Metode absensi offline harus face_recognition atau qr_code.")
+                continue
+            image_bytes = image_to_bytes(item['image_base64']) if item.get('image_base64') else None
+            if not verify_item_signature(nim, item, image_bytes):
+                reject(i, "Tanda tangan item tidak valid.")
+                continue
+            captured_at = _parse_captured_at(item['captured_at'])
+            if captured_at is None:
+                reject(i, "Format captured_at tidak valid.")
+                continue
+            if captured_at > now + timedelta(seconds=Config.SYNC_CLOCK_SKEW) or \
+                    captured_at < now - timedelta(seconds=Config.SYNC_MAX_AGE):
+                reject(i, "Waktu pengambilan absensi di luar batas sinkronisasi.")
+                continue
+            try:
+                face_box = parse_face_box(item.get('face_box'))
+            except ValueError as e:
+                reject(i, str(e))
+                continue
+            try:
+                id_sesi = int(item['id_sesi'])
+                lat, long = float(item['lokasi_lat']), float(item['lokasi_long'])
+            except (TypeError, ValueError):
+                reject(i, "Data absensi tidak valid.")
+                continue
+            pending.append({
+                "i": i, "id_sesi": id_sesi, "metode": item['metode'], "lat": lat, "long": long,
+                "captured_at": captured_at, "code": item.get('verification_code'),
+                "image": image_bytes, "face_box": face_box,
+            })
+
+        # 2. Data sesi (termasuk yang sudah ditutup) dan absensi yang sudah ada: satu query masing-masing
+        sesi_map = _load_sesi_windows({p['id_sesi'] for p in pending})
+        stored_codes = _load_barcodes({p['code'] for p in pending if p['code'] and not is_rotating_code(p['code'])})
+        if sesi_map is None or stored_codes is None:
+            return None, DB_ERROR_MESSAGE
+        id_kelas = get_kelas_mahasiswa(nim)
+
+        candidates = []
+        for p in pending:
+            sesi = sesi_map.get(p['id_sesi'])
+            if not sesi or sesi['id_kelas'] != id_kelas:
+                reject(p['i'], "Sesi absensi tidak ditemukan atau bukan untuk kelas Anda.")
+                continue
+            if not sesi['waktu_buka'] <= p['captured_at'] <= sesi['waktu_tutup_seharusnya']:
+                reject(p['i'], "Absensi diambil di luar waktu sesi.")
+                continue
+            jarak_meter = calculate_distance(p['lat'], p['long'], float(sesi['lokasi_lat']), float(sesi['lokasi_long']))
+            if jarak_meter > sesi['radius_meter']:
+                reject(p['i'], f"Anda berada di luar radius lokasi absensi ({round(jarak_meter)}m). Radius maksimal {sesi['radius_meter']}m.")
+                continue
+            p['sesi'] = sesi
+            candidates.append(p)
+
+        if candidates:
+            placeholders = ', '.join(['%s'] * len(candidates))
+            rows = query_db(
+                f"SELECT id_pertemuan FROM absensi WHERE nim = %s AND id_pertemuan IN ({placeholders})",
+                (nim, *[p['sesi']['id_pertemuan'] for p in candidates])
+            )
+            if rows is None:
+                return None, DB_ERROR_MESSAGE
+            sudah_absen = {row['id_pertemuan'] for row in rows}
+            for p in candidates:
+                if p['sesi']['id_pertemuan'] in sudah_absen:
+                    reject(p['i'], "Anda sudah melakukan absensi untuk pertemuan ini.", 'sudah_absen')
+            candidates = [p for p in candidates if p['sesi']['id_pertemuan'] not in sudah_absen]
+
+        # 3. Validasi metode; wajah semua item diverifikasi sekaligus (paralel di worker pool)
+        face_items = [p for p in candidates if p['metode'] == 'face_recognition']
+        face_results = verify_faces(nim, [(p['image'], p['face_box']) for p in face_items]) if face_items else []
+        for p, (match, confidence_score, face_message) in zip(face_items, face_results):
+            p['confidence_score'] = confidence_score
+            if match is None:
+                reject(p['i'], face_message, 'coba_lagi')
+                continue
+            log_face_scan('mahasiswa', nim, 'verify' if match else 'failed', confidence_score, p['lat'], p['long'])
+            if not match:
+                reject(p['i'], f"Verifikasi wajah gagal. {face_message}")
+
+        for p in candidates:
+            if p['metode'] == 'qr_code':
+                if not p['code']:
+                    reject(p['i'], "Diperlukan kode QR untuk verifikasi.")
+                    continue
+                if is_rotating_code(p['code']):
+                    valid = verify_rotating_code(p['sesi'], p['code'], at=p['captured_at'])
+                else:
+                    barcode = stored_codes.get(p['code'])
+                    valid = barcode is not None and barcode['id_sesi'] == p['id_sesi'] and p['captured_at'] <= barcode['waktu_kadaluarsa']
+                if not valid:
+                    reject(p['i'], "Kode QR tidak valid atau sudah kadaluarsa.")
+                    continue
+                p['confidence_score'] = 1.0
+
+        # 4. Satu item per pertemuan dari yang lolos verifikasi (retry dalam antrean untuk pertemuan
+        #    yang sama tidak terhalang item sebelumnya yang gagal); semua ditulis dengan satu executemany
+        accepted, seen_pertemuan = [], set()
+        for p in candidates:
+            if results[p['i']] is not None:
+                continue
+            if p['sesi']['id_pertemuan'] in seen_pertemuan:
+                reject(p['i'], "Anda sudah melakukan absensi untuk pertemuan ini.", 'sudah_absen')
+                continue
+            seen_pertemuan.add(p['sesi']['id_pertemuan'])
+            accepted.append(p)
+        if accepted:
+            try:
+                with transaction() as tx:
+                    inserted = tx.executemany("""
+                        INSERT INTO absensi (nim, id_pertemuan, id_sesi, status, waktu_absen, metode, confidence_score, lokasi_lat, lokasi_long)
+                        VALUES (%s, %s, %s, 'hadir', %s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE id_absensi = id_absensi
+                    """, [
+                        (nim, p['sesi']['id_pertemuan'], p['id_sesi'], p['captured_at'], p['metode'], p['confidence_score'], p['lat'], p['long'])
+                        for p in accepted
+                    ])
+                    _record_rekap(tx, inserted, [(nim, p['sesi']['id_kelas'], 'hadir', p['captured_at']) for p in accepted])
+            except mysql.connector.Error as err:
+                print(f"Database Error: {err}")
+                return None, DB_ERROR_MESSAGE
+            per_sesi = {}
+            for p in accepted:
+                results[p['i']] = {"status": "diterima", "message": "Absensi berhasil dicatat."}
+                per_sesi.setdefault(p['id_sesi'], []).append({
+                    "nim": nim, "status": 'hadir', "waktu_absen": p['captured_at'],
+                    "metode": p['metode'], "confidence_score": p['confidence_score'],
+                })
+            for id_sesi, records in per_sesi.items():
+                publish_kehadiran(id_sesi, records)
+
+        for i, item in enumerate(items):
+            if isinstance(item, dict) and 'client_id' in item:
+                results[i]["client_id"] = item['client_id']
+        return results, f"{len(accepted)} dari {len(items)} absensi berhasil disinkronkan."
+
+    def get_absensi_history(self, nim, fields=None, limit=None, cursor=None, dari=None, sampai=None):
+        """
+        Riwayat absensi seorang mahasiswa, terbaru dulu. Per halaman (keyset pagination) jika
+        `limit` atau `cursor` dikirim; tanpa keduanya seluruh riwayat dikembalikan.
+        - `fields`: kolom yang diminta (lihat HISTORY_FIELDS); JOIN ke pertemuan/kelas/matakuliah
+          hanya dilakukan jika kolomnya diminta.
+        - `cursor`: nilai `next_cursor` dari halaman sebelumnya; posisi dicari lewat index
+          (nim, waktu_absen, id_absensi), jadi biaya per halaman tetap walau riwayat bertambah.
+        - `dari`/`sampai`: rentang tanggal (YYYY-MM-DD, inklusif).
+        Mengembalikan ({history, next_cursor}, pesan); hasil None jika parameter tidak valid.
         """
-        history = query_db(query, (nim,), fetchone=False)
-        return history
+        fields = fields or DEFAULT_HISTORY_FIELDS
+        unknown = [f for f in fields if f not in HISTORY_FIELDS]
+        if unknown:
+            return None, f"Kolom tidak dikenal: {', '.join(unknown)}."
+
+        # Tanpa limit & cursor: seluruh riwayat dalam satu respons (perilaku lama, dipakai klien mobile)
+        paginate = bool(limit or cursor)
+        if paginate:
+            try:
+                limit = min(int(limit or Config.HISTORY_PAGE_SIZE), Config.HISTORY_MAX_PAGE_SIZE)
+            except (TypeError, ValueError):
+                return None, "Parameter limit tidak valid."
+            if limit < 1:
+                return None, "Parameter limit tidak valid."
+
+        conditions, params = ["a.nim = %s"], [nim]
+        try:
+            if dari:
+                conditions.append("a.waktu_absen >= %s")
+                params.append(datetime.strptime(dari, '%Y-%m-%d'))
+            if sampai:
+                conditions.append("a.waktu_absen < %s")
+                params.append(datetime.strptime(sampai, '%Y-%m-%d') + timedelta(days=1))
+        except ValueError:
+            return None, "Format tanggal harus YYYY-MM-DD."
+        if cursor:
+            position = decode_history_cursor(cursor)
+            if position is None:
+                return None, "Cursor tidak valid."
+            # Bentuk OR (bukan row constructor) agar range scan pada index dipakai di semua versi MySQL
+            conditions.append("(a.waktu_absen < %s OR (a.waktu_absen = %s AND a.id_absensi < %s))")
+            params.extend([position[0], position[0], position[1]])
+
+        # waktu_absen & id_absensi selalu diambil untuk membentuk cursor berikutnya
+        selected = list(dict.fromkeys(['waktu_absen', 'id_absensi', *fields]))
+        joins = {join for f in selected for join in HISTORY_FIELDS[f][1]}
+        join_sql = ''.join(_HISTORY_JOINS[j] for j in ('pertemuan', 'kelas', 'matakuliah') if j in joins)
+
+        rows = query_db(f"""
+            SELECT {', '.join(f"{HISTORY_FIELDS[f][0]} AS {f}" for f in selected)}
+            FROM absensi a{join_sql}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY a.waktu_absen DESC, a.id_absensi DESC
+            {'LIMIT %s' if paginate else ''}
+        """, (*params, limit + 1) if paginate else tuple(params))
+        if rows is None:
+            return None, "Terjadi kesalahan database saat mengambil riwayat."
+
+        next_cursor = None
+        if paginate and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_history_cursor(rows[-1]['waktu_absen'], rows[-1]['id_absensi'])
+
+        history = [{f: row[f] for f in fields} for row in rows]
+        return {"history": history, "next_cursor": next_cursor}, "Riwayat absensi berhasil diambil."
+
+
+# Kolom riwayat yang boleh diminta: nama -> (ekspresi SQL, tabel JOIN yang dibutuhkan)
+HISTORY_FIELDS = {
+    'id_absensi': ('a.id_absensi', ()),
+    'nim': ('a.nim', ()),
+    'id_pertemuan': ('a.id_pertemuan', ()),
+    'id_sesi': ('a.id_sesi', ()),
+    'status': ('a.status', ()),
+    'waktu_absen': ('a.waktu_absen', ()),
+    'metode': ('a.metode', ()),
+    'confidence_score': ('a.confidence_score', ()),
+    'lokasi_lat': ('a.lokasi_lat', ()),
+    'lokasi_long': ('a.lokasi_long', ()),
+    'keterangan': ('a.keterangan', ()),
+    'pertemuan_ke': ('p.pertemuan_ke', ('pertemuan',)),
+    'tanggal': ('p.tanggal', ('pertemuan',)),
+    'topik': ('p.topik', ('pertemuan',)),
+    'nama_kelas': ('k.nama_kelas', ('pertemuan', 'kelas')),
+    'nama_matakuliah': ('mk.nama_matakuliah', ('pertemuan', 'kelas', 'matakuliah')),
+    'kode_mk': ('mk.kode_mk', ('pertemuan', 'kelas', 'matakuliah')),
+}
+
+# Kolom default = yang dibaca model AbsensiLog di aplikasi Flutter
+DEFAULT_HISTORY_FIELDS = ['id_absensi', 'nim', 'id_pertemuan', 'status', 'waktu_absen', 'metode', 'confidence_score']
+
+_HISTORY_JOINS = {
+    'pertemuan': "\n            JOIN pertemuan p ON a.id_pertemuan = p.id_pertemuan",
+    'kelas': "\n            JOIN kelas k ON p.id_kelas = k.id_kelas",
+    'matakuliah': "\n            JOIN matakuliah mk ON k.id_matakuliah = mk.id_matakuliah",
+}
+
+def encode_history_cursor(waktu_absen, id_absensi):
+    raw = f"{waktu_absen.isoformat()}|{id_absensi}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_history_cursor(cursor):
+    """Cursor -> (waktu_absen, id_absensi), atau None jika rusak."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        waktu, id_absensi = raw.split('|')
+        return datetime.fromisoformat(waktu), int(id_absensi)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def _record_rekap(tx, inserted, rows):
+    # Affected rows ON DUPLICATE KEY no-op = 0; jika ada baris yang ternyata sudah ada
+    # (absen bersamaan di luar batch ini), rekap nim tersebut dihitung ulang dari absensi.
+    if inserted == len(rows):
+        record_absensi(tx, rows)
+    else:
+        refresh_rekap(tx, [(nim, id_kelas) for nim, id_kelas, _, _ in rows])
+
+def _parse_captured_at(value):
+    """captured_at dari klien: epoch detik atau ISO 8601; dikembalikan sebagai waktu lokal naive (seperti kolom DB)."""
+    try:
+        if isinstance(value, (int, float)):
+            parsed = datetime.fromtimestamp(value)
+        else:
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    parsed = parsed.astimezone().replace(tzinfo=None) if parsed.tzinfo else parsed
+    return parsed.replace(microsecond=0)
+
+def _load_sesi_windows(id_sesi_set):
+    """Jendela waktu + lokasi beberapa sesi (aktif maupun sudah ditutup) dalam satu query."""
+    if not id_sesi_set:
+        return {}
+    placeholders = ', '.join(['%s'] * len(id_sesi_set))
+    rows = query_db(f"""
+        SELECT s.id_sesi, s.id_pertemuan, s.waktu_buka, s.durasi_menit, s.lokasi_lat, s.lokasi_long,
+               s.radius_meter, p.id_kelas
+        FROM sesi_absensi s
+        JOIN pertemuan p ON s.id_pertemuan = p.id_pertemuan
+        WHERE s.id_sesi IN ({placeholders})
+    """, tuple(id_sesi_set))
+    if rows is None:
+        return None
+    for row in rows:
+        row['waktu_tutup_seharusnya'] = row['waktu_buka'] + timedelta(minutes=row['durasi_menit'])
+    return {row['id_sesi']: row for row in rows}
 
+def _load_barcodes(kode_set):
+    """Barcode tersimpan (status apa pun, karena bisa sudah kadaluarsa saat disinkronkan)."""
+    if not kode_set:
+        return {}
+    placeholders = ', '.join(['%s'] * len(kode_set))
+    rows = query_db(
+        f"SELECT kode_barcode, id_sesi, waktu_kadaluarsa FROM barcode WHERE kode_barcode IN ({placeholders})",
+        tuple(kode_set)
+    )
+    if rows is None:
+        return None
+    return {row['kode_barcode']: row for row in rows}
 
 # Inisialisasi service untuk digunakan di routes
 absensi_service = AbsensiService()
\ No newline at end of file
@@ -1,90 +1,110 @@
 # backend/services/admin_service.py
 
-from database.db import get_db_connection
+import mysql.connector
+from config import Config
+from database.db import query_db, transaction
 from utils.auth_model import User # Asumsi model User terdefinisi
-import bcrypt
+from services.face_service import invalidate_face_descriptor
+from services.sesi_registry import kelas_mahasiswa_cache
+from services.password_worker import hash_password, hash_passwords
+from services.auth_service import invalidate_user
+
+# Spesifikasi import massal per jenis akun (lihat AdminService.bulk_import)
+#   pk       : kolom kunci di tabel orang sekaligus kolom penghubung di tabel users
+#   required : kolom wajib diisi; optional: kolom boleh kosong (disimpan NULL)
+IMPORT_SPECS = {
+    'mahasiswa': {
+        'table': 'mahasiswa',
+        'pk': 'nim',
+        'required': ('nim', 'nama', 'angkatan', 'username', 'password'),
+        'optional': ('email', 'id_kelas'),
+        'insert': "INSERT INTO mahasiswa (nim, nama, email, angkatan, id_kelas, face_registered) VALUES (%s, %s, %s, %s, %s, 0)",
+        'columns': ('nim', 'nama', 'email', 'angkatan', 'id_kelas'),
+    },
+    'dosen': {
+        'table': 'dosen',
+        'pk': 'nip',
+        'required': ('nip', 'nama', 'username', 'password'),
+        'optional': ('email', 'no_hp'),
+        'insert': "INSERT INTO dosen (nip, nama, email, no_hp) VALUES (%s, %s, %s, %s)",
+        'columns': ('nip', 'nama', 'email', 'no_hp'),
+    },
+}
 
 class AdminService:
-    def __init__(self):
-        self.conn = get_db_connection()
+    # Setiap method memakai satu unit of work (database/db.py: transaction()):
+    # koneksi dipinjam dari pool, satu COMMIT, dan ROLLBACK otomatis jika gagal.
 
     # --- Utilitas ---
     def _hash_password(self, password):
-        """Mengenkripsi password menggunakan bcrypt."""
-        # Asumsi: Password harus di-encode ke bytes sebelum hashing
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        """Mengenkripsi password menggunakan bcrypt (cost dari Config.BCRYPT_ROUNDS)."""
+        return hash_password(password)
+
+    def _existing_values(self, table, column, values):
+        """Nilai `column` di `table` yang sudah ada, dicek per potongan IN (...)."""
+        found = set()
+        values = list(values)
+        for start in range(0, len(values), Config.IMPORT_CHUNK_SIZE):
+            part = values[start:start + Config.IMPORT_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(part))
+            rows = query_db(f"SELECT {column} AS nilai FROM {table} WHERE {column} IN ({placeholders})", tuple(part))
+            if rows is None:
+                raise RuntimeError("Gagal memeriksa data yang sudah terdaftar.")
+            found.update(str(r['nilai']) for r in rows)
+        return found
 
     # --- CRUD Matakuliah ---
     def get_all_matakuliah(self):
-        cursor = self.conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM matakuliah")
-        matakuliah = cursor.fetchall()
-        cursor.close()
-        return matakuliah
+        with transaction() as tx:
+            return tx.query("SELECT * FROM matakuliah")
 
     def create_matakuliah(self, kode_mk, nama_matakuliah, sks, nip_dosen=None):
-        cursor = self.conn.cursor()
         query = "INSERT INTO matakuliah (kode_mk, nama_matakuliah, sks, nip_dosen) VALUES (%s, %s, %s, %s)"
-        cursor.execute(query, (kode_mk, nama_matakuliah, sks, nip_dosen))
-        self.conn.commit()
-        cursor.close()
+        with transaction() as tx:
+            tx.execute(query, (kode_mk, nama_matakuliah, sks, nip_dosen))
         return "Matakuliah berhasil ditambahkan"
 
     def update_matakuliah(self, id_matakuliah, kode_mk, nama_matakuliah, sks, nip_dosen=None):
-        cursor = self.conn.cursor()
         query = "UPDATE matakuliah SET kode_mk=%s, nama_matakuliah=%s, sks=%s, nip_dosen=%s WHERE id_matakuliah=%s"
-        cursor.execute(query, (kode_mk, nama_matakuliah, sks, nip_dosen, id_matakuliah))
-        self.conn.commit()
-        cursor.close()
+        with transaction() as tx:
+            tx.execute(query, (kode_mk, nama_matakuliah, sks, nip_dosen, id_matakuliah))
         return "Matakuliah berhasil diperbarui"
 
     def delete_matakuliah(self, id_matakuliah):
-        cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM matakuliah WHERE id_matakuliah = %s", (id_matakuliah,))
-        self.conn.commit()
-        cursor.close()
+        with transaction() as tx:
+            tx.execute("DELETE FROM matakuliah WHERE id_matakuliah = %s", (id_matakuliah,))
         return "Matakuliah berhasil dihapus"
 
     # --- CRUD Dosen ---
 
     def get_all_dosen(self):
-        cursor = self.conn.cursor(dictionary=True)
         # Join dengan users untuk mendapatkan username/level
         query = """
             SELECT d.*, u.username 
             FROM dosen d 
             LEFT JOIN users u ON d.nip = u.nip AND u.level = 'dosen'
         """
-        cursor.execute(query)
-        dosen_list = cursor.fetchall()
-        cursor.close()
-        return dosen_list
+        with transaction() as tx:
+            return tx.query(query)
 
     def create_dosen(self, nip, nama, email, no_hp, username, password):
+        # Hash dihitung sebelum transaksi dibuka agar lock tidak ditahan selama bcrypt berjalan
+        # Asumsi: Password di-hash sebelum disimpan (menggunakan bcrypt)
+        hashed_password = self._hash_password(password)
+
         # Transaksi untuk Dosen dan User
-        try:
-            cursor = self.conn.cursor()
-            
+        with transaction() as tx:
             # 1. Tambah ke tabel dosen
-            cursor.execute("INSERT INTO dosen (nip, nama, email, no_hp) VALUES (%s, %s, %s, %s)",
-                           (nip, nama, email, no_hp))
-            
+            tx.execute("INSERT INTO dosen (nip, nama, email, no_hp) VALUES (%s, %s, %s, %s)",
+                       (nip, nama, email, no_hp))
+
             # 2. Tambah ke tabel users
-            # Asumsi: Password di-hash sebelum disimpan (menggunakan bcrypt)
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-            cursor.execute("INSERT INTO users (username, password, nama, level, nip) VALUES (%s, %s, %s, 'dosen', %s)",
-                        (username, hashed_password, nama, nip))
-            
-            self.conn.commit()
-            cursor.close()
-            return "Dosen dan Akun berhasil ditambahkan"
-        except Exception as e:
-            self.conn.rollback()
-            raise e
+            tx.execute("INSERT INTO users (username, password, nama, level, nip) VALUES (%s, %s, %s, 'dosen', %s)",
+                       (username, hashed_password, nama, nip))
+        return "Dosen dan Akun berhasil ditambahkan"
 
     # -- CRUD Mahasiswa ---
     def get_all_mahasiswa(self):
-        cursor = self.conn.cursor(dictionary=True)
         query = """
             SELECT m.*, u.username, k.nama_kelas
             FROM mahasiswa m
@@ -92,70 +112,55 @@ class AdminService:
             LEFT JOIN kelas k ON m.id_kelas = k.id_kelas
             ORDER BY m.nim
         """
-        cursor.execute(query)
-        mahasiswa_list = cursor.fetchall()
-        cursor.close()
-        return mahasiswa_list
+        with transaction() as tx:
+            return tx.query(query)
 
     def create_mahasiswa(self, nim, nama, email, angkatan, id_kelas, username, password):
         if not all([nim, nama, username, password, angkatan]): raise ValueError("Data wajib diisi.")
-        try:
-            cursor = self.conn.cursor()
-            
+        hashed_password = self._hash_password(password)
+
+        with transaction() as tx:
             # 1. Tambah ke tabel mahasiswa
-            cursor.execute("INSERT INTO mahasiswa (nim, nama, email, angkatan, id_kelas, face_registered) VALUES (%s, %s, %s, %s, %s, 0)",
-                           (nim, nama, email, angkatan, id_kelas))
-            
+            tx.execute("INSERT INTO mahasiswa (nim, nama, email, angkatan, id_kelas, face_registered) VALUES (%s, %s, %s, %s, %s, 0)",
+                       (nim, nama, email, angkatan, id_kelas))
+
             # 2. Tambah ke tabel users
-            hashed_password = self._hash_password(password)
-            cursor.execute("INSERT INTO users (username, password, nama, level, nim) VALUES (%s, %s, %s, 'mahasiswa', %s)",
-                           (username, hashed_password, nama, nim))
-            
-            self.conn.commit()
-            cursor.close()
-            return "Mahasiswa dan Akun berhasil ditambahkan"
-        except Exception as e:
-            self.conn.rollback()
-            raise e
+            tx.execute("INSERT INTO users (username, password, nama, level, nim) VALUES (%s, %s, %s, 'mahasiswa', %s)",
+                       (username, hashed_password, nama, nim))
+        return "Mahasiswa dan Akun berhasil ditambahkan"
 
     def update_mahasiswa(self, nim, data):
-        try:
-            cursor = self.conn.cursor()
-            
+        hashed_password = self._hash_password(data['password']) if 'password' in data else None
+
+        with transaction() as tx:
             # 1. Update data mahasiswa
             mhs_data = {k: v for k, v in data.items() if k in ['nama', 'email', 'angkatan', 'id_kelas', 'face_registered']}
             if mhs_data:
                 set_mhs = ', '.join([f"{key} = %s" for key in mhs_data.keys()])
                 params_mhs = list(mhs_data.values()) + [nim]
-                cursor.execute(f"UPDATE mahasiswa SET {set_mhs} WHERE nim = %s", tuple(params_mhs))
+                tx.execute(f"UPDATE mahasiswa SET {set_mhs} WHERE nim = %s", tuple(params_mhs))
 
             # 2. Update password/username di tabel users
-            if 'password' in data:
-                hashed_password = self._hash_password(data['password'])
-                cursor.execute("UPDATE users SET password = %s WHERE nim = %s AND level = 'mahasiswa'", (hashed_password, nim))
-            
+            if hashed_password:
+                tx.execute("UPDATE users SET password = %s WHERE nim = %s AND level = 'mahasiswa'", (hashed_password, nim))
+
             if 'username' in data:
-                 cursor.execute("UPDATE users SET username = %s WHERE nim = %s AND level = 'mahasiswa'", (data['username'], nim))
-            
-            self.conn.commit()
-            cursor.close()
-            return "Data Mahasiswa berhasil diperbarui"
-        except Exception as e:
-            self.conn.rollback()
-            raise e
+                tx.execute("UPDATE users SET username = %s WHERE nim = %s AND level = 'mahasiswa'", (data['username'], nim))
+        invalidate_face_descriptor(nim)
+        kelas_mahasiswa_cache.pop(nim)
+        if hashed_password or 'username' in data:
+            invalidate_user() # Username lama tidak diketahui di sini
+        return "Data Mahasiswa berhasil diperbarui"
 
     def delete_mahasiswa(self, nim):
-        try:
-            cursor = self.conn.cursor()
+        with transaction() as tx:
             # Hapus dari users dan mahasiswa
-            cursor.execute("DELETE FROM users WHERE nim = %s AND level = 'mahasiswa'", (nim,))
-            cursor.execute("DELETE FROM mahasiswa WHERE nim = %s", (nim,))
-            self.conn.commit()
-            cursor.close()
-            return "Mahasiswa berhasil dihapus"
-        except Exception as e:
-            self.conn.rollback()
-            raise e
+            tx.execute("DELETE FROM users WHERE nim = %s AND level = 'mahasiswa'", (nim,))
+            tx.execute("DELETE FROM mahasiswa WHERE nim = %s", (nim,))
+        invalidate_face_descriptor(nim)
+        kelas_mahasiswa_cache.pop(nim)
+        invalidate_user()
+        return "Mahasiswa berhasil dihapus"
 
 
     # -----------------------------------------------------------------------------------
@@ -163,50 +168,180 @@ class AdminService:
     # -----------------------------------------------------------------------------------
 
     def get_all_kelas(self):
-        cursor = self.conn.cursor(dictionary=True)
         query = """
             SELECT k.*, mk.kode_mk, mk.nama_matakuliah, mk.nip_dosen
             FROM kelas k
             JOIN matakuliah mk ON k.id_matakuliah = mk.id_matakuliah
             ORDER BY k.nama_kelas
         """
-        cursor.execute(query)
-        kelas_list = cursor.fetchall()
-        cursor.close()
-        return kelas_list
+        with transaction() as tx:
+            return tx.query(query)
 
     def create_kelas(self, nama_kelas, ruangan, hari, jam_mulai, jam_selesai, id_matakuliah):
-        cursor = self.conn.cursor()
         query = "INSERT INTO kelas (nama_kelas, ruangan, hari, jam_mulai, jam_selesai, id_matakuliah) VALUES (%s, %s, %s, %s, %s, %s)"
-        cursor.execute(query, (nama_kelas, ruangan, hari, jam_mulai, jam_selesai, id_matakuliah))
-        self.conn.commit()
-        cursor.close()
+        with transaction() as tx:
+            tx.execute(query, (nama_kelas, ruangan, hari, jam_mulai, jam_selesai, id_matakuliah))
         return "Kelas baru berhasil ditambahkan"
 
     def update_kelas(self, id_kelas, nama_kelas, ruangan, hari, jam_mulai, jam_selesai, id_matakuliah):
-        cursor = self.conn.cursor()
         query = """
             UPDATE kelas 
             SET nama_kelas=%s, ruangan=%s, hari=%s, jam_mulai=%s, jam_selesai=%s, id_matakuliah=%s 
             WHERE id_kelas=%s
         """
-        cursor.execute(query, (nama_kelas, ruangan, hari, jam_mulai, jam_selesai, id_matakuliah, id_kelas))
-        self.conn.commit()
-        cursor.close()
+        with transaction() as tx:
+            tx.execute(query, (nama_kelas, ruangan, hari, jam_mulai, jam_selesai, id_matakuliah, id_kelas))
         return "Kelas berhasil diperbarui"
 
     def delete_kelas(self, id_kelas):
         # Note: Relasi FK di 'mahasiswa' adalah ON DELETE SET NULL, jadi mahasiswa tetap ada.
         # Relasi FK di 'pertemuan' adalah ON DELETE CASCADE, jadi semua pertemuan kelas ini akan terhapus.
+        with transaction() as tx:
+            tx.execute("DELETE FROM kelas WHERE id_kelas = %s", (id_kelas,))
+        return "Kelas berhasil dihapus. Pertemuan terkait juga terhapus."
+
+    # -----------------------------------------------------------------------------------
+    # --- Import Massal Mahasiswa/Dosen ---
+    # -----------------------------------------------------------------------------------
+
+    def _validate_import(self, spec, rows):
+        """
+        Validasi seluruh baris sebelum ada yang ditulis.
+        Mengembalikan (valid, errors): valid berisi (nomor_baris, data) dan errors berisi
+        {baris, id, errors}. Nomor baris dimulai dari 1 (baris data, tanpa header CSV).
+        """
+        pk = spec['pk']
+        fields = spec['required'] + spec['optional']
+        candidates, errors = [], []
+        seen_pk, seen_username = set(), set()
+
+        for nomor, raw in enumerate(rows, 1):
+            if not isinstance(raw, dict):
+                errors.append({"baris": nomor, "id": None, "errors": ["Format baris tidak valid."]})
+                continue
+            data = {f: str(raw[f]).strip() if raw.get(f) is not None else '' for f in fields}
+            masalah = [f"Kolom {f} wajib diisi." for f in spec['required'] if not data[f]]
+
+            if data.get('angkatan'):
+                try:
+                    data['angkatan'] = int(data['angkatan'])
+                except ValueError:
+                    masalah.append("Angkatan harus berupa angka.")
+            if data.get('id_kelas'):
+                try:
+                    data['id_kelas'] = int(data['id_kelas'])
+                except ValueError:
+                    masalah.append("id_kelas harus berupa angka.")
+            if data.get('email') and '@' not in data['email']:
+                masalah.append("Format email tidak valid.")
+
+            # Duplikat di dalam file yang sama: baris pertama yang menang
+            if data[pk] and data[pk] in seen_pk:
+                masalah.append(f"{pk.upper()} {data[pk]} muncul lebih dari sekali di file.")
+            if data['username'] and data['username'] in seen_username:
+                masalah.append(f"Username {data['username']} muncul lebih dari sekali di file.")
+            seen_pk.add(data[pk])
+            seen_username.add(data['username'])
+
+            if masalah:
+                errors.append({"baris": nomor, "id": data[pk] or None, "errors": masalah})
+            else:
+                candidates.append((nomor, {f: (data[f] if data[f] != '' else None) for f in fields}))
+
+        # Bentrok dengan data yang sudah ada di database (dicek sekaligus, bukan per baris)
+        existing_pk = self._existing_values(spec['table'], pk, [d[pk] for _, d in candidates])
+        existing_username = self._existing_values('users', 'username', [d['username'] for _, d in candidates])
+        kelas_ids = {d['id_kelas'] for _, d in candidates if d.get('id_kelas') is not None}
+        existing_kelas = self._existing_values('kelas', 'id_kelas', kelas_ids) if kelas_ids else set()
+
+        valid = []
+        for nomor, data in candidates:
+            masalah = []
+            if data[pk] in existing_pk:
+                masalah.append(f"{pk.upper()} {data[pk]} sudah terdaftar.")
+            if data['username'] in existing_username:
+                masalah.append(f"Username {data['username']} sudah dipakai.")
+            if data.get('id_kelas') is not None and str(data['id_kelas']) not in existing_kelas:
+                masalah.append(f"Kelas {data['id_kelas']} tidak ditemukan.")
+            if masalah:
+                errors.append({"baris": nomor, "id": data[pk], "errors": masalah})
+            else:
+                valid.append((nomor, data))
+        return valid, errors
+
+    def _insert_import_chunk(self, spec, jenis, chunk):
+        """
+        Menulis satu potongan (nomor_baris, data, hash) dalam satu transaksi executemany.
+        Jika potongan ditolak karena data ganda (mis. didaftarkan bersamaan lewat jalur lain),
+        potongan diulang per baris agar hanya baris yang bentrok yang gagal.
+        Mengembalikan (jumlah_berhasil, errors).
+        """
+        person_params = [tuple(data[c] for c in spec['columns']) for _, data, _ in chunk]
+        user_params = [(data['username'], hashed, data['nama'], jenis, data[spec['pk']]) for _, data, hashed in chunk]
+        user_insert = f"INSERT INTO users (username, password, nama, level, {spec['pk']}) VALUES (%s, %s, %s, %s, %s)"
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("DELETE FROM kelas WHERE id_kelas = %s", (id_kelas,))
-            self.conn.commit()
-            cursor.close()
-            return "Kelas berhasil dihapus. Pertemuan terkait juga terhapus."
-        except Exception as e:
-            self.conn.rollback()
-            raise e
+            with transaction() as tx:
+                tx.executemany(spec['insert'], person_params)
+                tx.executemany(user_insert, user_params)
+            return len(chunk), []
+        except mysql.connector.IntegrityError:
+            pass
+        except mysql.connector.Error as err:
+            print(f"Database Error: {err}")
+            return 0, [{"baris": nomor, "id": data[spec['pk']], "errors": ["Gagal menyimpan ke database."]}
+                       for nomor, data, _ in chunk]
+
+        berhasil, errors = 0, []
+        for (nomor, data, _), person, user in zip(chunk, person_params, user_params):
+            try:
+                with transaction() as tx:
+                    tx.execute(spec['insert'], person)
+                    tx.execute(user_insert, user)
+                berhasil += 1
+            except mysql.connector.IntegrityError:
+                errors.append({"baris": nomor, "id": data[spec['pk']],
+                               "errors": [f"{spec['pk'].upper()} atau username sudah terdaftar."]})
+            except mysql.connector.Error as err:
+                print(f"Database Error: {err}")
+                errors.append({"baris": nomor, "id": data[spec['pk']], "errors": ["Gagal menyimpan ke database."]})
+        return berhasil, errors
+
+    def bulk_import(self, jenis, rows):
+        """
+        Import massal akun `jenis` ('mahasiswa' atau 'dosen') dari list dict (hasil CSV/JSON).
+        1. Semua baris divalidasi dulu (kolom wajib, format, duplikat di file maupun di database);
+        2. password baris yang valid di-hash paralel di process pool (services/password_worker.py);
+        3. baris ditulis per Config.IMPORT_CHUNK_SIZE dengan executemany, satu transaksi per potongan.
+        Baris yang gagal dilaporkan tanpa membatalkan baris lain.
+        Mengembalikan {total, berhasil, gagal: [{baris, id, errors}]}; ValueError jika permintaan tidak valid.
+        """
+        spec = IMPORT_SPECS.get(jenis)
+        if spec is None:
+            raise ValueError(f"Jenis import harus salah satu dari: {', '.join(IMPORT_SPECS)}.")
+        if not rows:
+            raise ValueError("Data import kosong.")
+        if len(rows) > Config.IMPORT_MAX_ROWS:
+            raise ValueError(f"Maksimum {Config.IMPORT_MAX_ROWS} baris per import.")
+
+        valid, errors = self._validate_import(spec, rows)
+        hashes = hash_passwords([data['password'] for _, data in valid])
+
+        berhasil = 0
+        size = Config.IMPORT_CHUNK_SIZE
+        for start in range(0, len(valid), size):
+            chunk = [(nomor, data, hashed) for (nomor, data), hashed
+                     in zip(valid[start:start + size], hashes[start:start + size])]
+            jumlah, chunk_errors = self._insert_import_chunk(spec, jenis, chunk)
+            berhasil += jumlah
+            errors.extend(chunk_errors)
+
+        if jenis == 'mahasiswa':
+            # NIM yang sebelumnya tidak ditemukan mungkin sudah tercatat di cache kelas
+            for _, data in valid:
+                kelas_mahasiswa_cache.pop(data['nim'])
+
+        errors.sort(key=lambda e: e['baris'])
+        return {"total": len(rows), "berhasil": berhasil, "gagal": errors}
 
 # Inisialisasi service untuk digunakan di routes
 admin_service = AdminService()
\ No newline at end of file
@@ -0,0 +1,84 @@
+# server/services/auth_service.py
+
+import hmac
+import time
+
+from config import Config
+from database.db import query_db, execute_db
+from utils.cache import LRUCache
+from utils.metrics import metrics
+from services.password_worker import (
+    check_password, hash_password_for_login, is_bcrypt_hash, PasswordWorkerBusy
+)
+
+# Jalur login: record users di-cache singkat per username (lonjakan login pagi tidak perlu
+# SELECT per request) dan bcrypt dijalankan di pool worker terbatas (services/password_worker.py).
+# Password lama yang masih plaintext di-hash otomatis saat login pertama berhasil.
+
+USER_COLUMNS = "id_user, username, password, nama, level, nim, nip"
+
+user_cache = LRUCache(maxsize=Config.LOGIN_CACHE_SIZE, ttl=Config.LOGIN_CACHE_TTL)
+
+def get_user(username):
+    """Record users untuk `username` (cache, fallback ke DB); None jika tidak ada."""
+    user = user_cache.get(username)
+    if user is not None:
+        metrics.incr('login.cache_hit')
+        return user
+    metrics.incr('login.cache_miss')
+    user = query_db(f"SELECT {USER_COLUMNS} FROM users WHERE username = %s", (username,), fetchone=True)
+    if user:
+        user_cache.set(username, user)
+    return user
+
+def invalidate_user(username=None):
+    """Buang record users dari cache (semua jika username tidak diketahui, mis. setelah edit admin)."""
+    if username is None:
+        user_cache.clear()
+    else:
+        user_cache.pop(username)
+
+def _upgrade_plaintext(user, password):
+    """
+    Mengganti password plaintext dengan hash bcrypt. Gagal/antrean penuh tidak menggagalkan login;
+    upgrade dicoba lagi pada login berikutnya. UPDATE bersyarat agar perubahan password
+    yang terjadi bersamaan tidak tertimpa.
+    """
+    try:
+        hashed = hash_password_for_login(password)
+    except PasswordWorkerBusy:
+        return
+    if execute_db(
+        "UPDATE users SET password = %s WHERE id_user = %s AND password = %s",
+        (hashed, user['id_user'], user['password'])
+    ):
+        user_cache.set(user['username'], {**user, 'password': hashed})
+        metrics.incr('login.password_upgraded')
+
+def verify_login(user, password):
+    """
+    True jika `password` cocok dengan record `user`.
+    Hash bcrypt diverifikasi di login_pool (PasswordWorkerBusy diteruskan ke route -> HTTP 503);
+    baris lama yang masih plaintext dibandingkan constant-time lalu di-upgrade ke hash.
+    Password kosong (dikirim atau tersimpan NULL/'') selalu ditolak.
+    """
+    stored = user['password'] or ''
+    if not password or not stored:
+        metrics.incr('login.failed')
+        return False
+    start = time.perf_counter()
+    try:
+        if is_bcrypt_hash(stored):
+            valid = check_password(password, stored)
+        else:
+            valid = hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8'))
+            if valid:
+                _upgrade_plaintext(user, password)
+    except PasswordWorkerBusy:
+        metrics.incr('login.rejected')
+        raise
+    finally:
+        metrics.observe('login.verify', time.perf_counter() - start)
+
+    metrics.incr('login.success' if valid else 'login.failed')
+    return valid
@@ -0,0 +1,151 @@
+# server/services/expiry_scheduler.py
+
+import heapq
+import threading
+import time
+from datetime import datetime
+
+from database.db import query_db, transaction
+from config import Config
+from services.sesi_registry import sesi_registry
+from services.face_service import evict_class_index
+from services.kehadiran_events import publish_sesi_closed
+
+SESI = 'sesi'
+BARCODE = 'barcode'
+
+class ExpiryScheduler:
+    """
+    Menutup sesi (status_sesi='selesai') dan barcode (status='kadaluarsa') tepat pada tenggatnya
+    dari background thread, sehingga jalur request cukup membaca tanpa UPDATE mendadak.
+
+    Tenggat disimpan dalam heap (tenggat terdekat di atas). Semua item yang jatuh tempo
+    bersamaan ditutup dengan satu UPDATE ... WHERE id IN (...) per jenis.
+    Sapuan penuh berkala (Config.EXPIRY_SWEEP_INTERVAL) menangkap item yang dijadwalkan
+    oleh proses server lain atau terlewat saat server mati.
+    """
+
+    def __init__(self, sweep_interval=300):
+        self.sweep_interval = sweep_interval
+        self._heap = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = False
+        self._next_sweep = 0
+
+    def start(self):
+        """Menjalankan thread scheduler (idempoten)."""
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='expiry-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+
+    def schedule(self, kind, item_id, deadline):
+        """Menjadwalkan penutupan item pada `deadline` (datetime lokal, sama seperti kolom DB)."""
+        with self._cond:
+            heapq.heappush(self._heap, (deadline, kind, item_id))
+            # Bangunkan thread agar menghitung ulang waktu tunggu (tenggat baru bisa lebih awal)
+            self._cond.notify()
+
+    def _pop_due(self):
+        now = datetime.now()
+        due = {SESI: [], BARCODE: []}
+        while self._heap and self._heap[0][0] <= now:
+            _, kind, item_id = heapq.heappop(self._heap)
+            due[kind].append(item_id)
+        return due
+
+    def _wait_timeout(self):
+        timeout = max(0.0, self._next_sweep - time.monotonic())
+        if self._heap:
+            until_next = (self._heap[0][0] - datetime.now()).total_seconds()
+            timeout = min(timeout, max(0.0, until_next))
+        return timeout
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stop:
+                    return
+                self._cond.wait(self._wait_timeout())
+                if self._stop:
+                    return
+                due = self._pop_due()
+                sweep = time.monotonic() >= self._next_sweep
+
+            try:
+                if sweep:
+                    self.sweep()
+                    self._next_sweep = time.monotonic() + self.sweep_interval
+                self._expire(due[SESI], due[BARCODE])
+            except Exception as err:
+                print(f"Expiry scheduler error: {err}")
+                self._next_sweep = time.monotonic() + self.sweep_interval
+
+    def _expire(self, sesi_ids, barcode_ids):
+        if not sesi_ids and not barcode_ids:
+            return
+        with transaction() as tx:
+            if sesi_ids:
+                placeholders = ', '.join(['%s'] * len(sesi_ids))
+                tx.execute(
+                    f"UPDATE sesi_absensi SET status_sesi = 'selesai' WHERE status_sesi = 'aktif' AND id_sesi IN ({placeholders})",
+                    tuple(sesi_ids)
+                )
+            if barcode_ids:
+                placeholders = ', '.join(['%s'] * len(barcode_ids))
+                tx.execute(
+                    f"UPDATE barcode SET status = 'kadaluarsa' WHERE status = 'aktif' AND id_barcode IN ({placeholders})",
+                    tuple(barcode_ids)
+                )
+        for id_sesi in sesi_ids:
+            on_sesi_closed(id_sesi)
+
+    def sweep(self):
+        """
+        Menutup semua item yang sudah lewat tenggat (batch) lalu menjadwalkan ulang
+        item aktif yang tenggatnya masih di depan.
+        """
+        overdue_sesi = query_db("""
+            SELECT id_sesi FROM sesi_absensi
+            WHERE status_sesi = 'aktif' AND waktu_buka + INTERVAL durasi_menit MINUTE <= NOW()
+        """) or []
+        overdue_barcode = query_db("""
+            SELECT id_barcode FROM barcode WHERE status = 'aktif' AND waktu_kadaluarsa <= NOW()
+        """) or []
+        self._expire([r['id_sesi'] for r in overdue_sesi], [r['id_barcode'] for r in overdue_barcode])
+
+        upcoming_sesi = query_db("""
+            SELECT id_sesi, waktu_buka + INTERVAL durasi_menit MINUTE AS deadline
+            FROM sesi_absensi WHERE status_sesi = 'aktif'
+        """) or []
+        upcoming_barcode = query_db("""
+            SELECT id_barcode, waktu_kadaluarsa AS deadline FROM barcode WHERE status = 'aktif'
+        """) or []
+        with self._cond:
+            # Gabung dengan jadwal yang sudah ada; satu entri per item (tenggat paling awal)
+            entries = {}
+            for deadline, kind, item_id in self._heap + \
+                    [(r['deadline'], SESI, r['id_sesi']) for r in upcoming_sesi] + \
+                    [(r['deadline'], BARCODE, r['id_barcode']) for r in upcoming_barcode]:
+                key = (kind, item_id)
+                if key not in entries or deadline < entries[key]:
+                    entries[key] = deadline
+            self._heap = [(deadline, kind, item_id) for (kind, item_id), deadline in entries.items()]
+            heapq.heapify(self._heap)
+
+def on_sesi_closed(id_sesi):
+    """Membersihkan state in-memory milik sesi yang baru ditutup."""
+    sesi_registry.remove(id_sesi)
+    evict_class_index(id_sesi)
+    publish_sesi_closed(id_sesi)
+
+expiry_scheduler = ExpiryScheduler(sweep_interval=Config.EXPIRY_SWEEP_INTERVAL)
@@ -0,0 +1,194 @@
+# server/services/face_enrollment.py
+
+import os
+import zipfile
+import zlib
+from collections import deque
+from contextlib import contextmanager
+
+from config import Config
+from database.db import query_db, transaction
+from services.face_service import serialize_descriptor, invalidate_face_descriptor
+from services.face_worker import FaceWorkerPool, FaceWorkerError, _encode_job, encode_options
+
+# Pendaftaran wajah massal dari arsip foto (mis. foto KTM awal semester), lewat `flask enroll-faces`.
+# Nama file (tanpa ekstensi) = NIM/NIP, contoh: 2201001.jpg. Job yang terputus cukup dijalankan
+# ulang: baris yang sudah face_registered = 1 dilewati, jadi hanya sisanya yang diproses.
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
+ENROLL_TABLES = {'mahasiswa': 'nim', 'dosen': 'nip'}
+
+def _photo_id(name):
+    stem, ext = os.path.splitext(os.path.basename(name))
+    return (stem.strip(), ext.lower())
+
+@contextmanager
+def open_photos(path):
+    """
+    Daftar foto dari file .zip atau direktori (rekursif): list (user_id, nama_file, loader)
+    dengan loader() mengembalikan bytes gambar. Isi file baru dibaca saat akan di-encode,
+    jadi arsip zip tetap terbuka selama blok `with` dan ditutup setelahnya.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            photos = []
+            for info in archive.infolist():
+                user_id, ext = _photo_id(info.filename)
+                if info.is_dir() or ext not in IMAGE_EXTENSIONS or info.filename.startswith('__MACOSX/'):
+                    continue
+                photos.append((user_id, info.filename, lambda info=info: archive.read(info)))
+            yield photos
+    elif os.path.isdir(path):
+        photos = []
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                user_id, ext = _photo_id(name)
+                if ext not in IMAGE_EXTENSIONS:
+                    continue
+                full_path = os.path.join(root, name)
+                photos.append((user_id, full_path, lambda p=full_path: _read_file(p)))
+        yield photos
+    else:
+        raise ValueError(f"{path} bukan file zip atau direktori.")
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _registration_status(table, pk_col, ids, chunk_size=500):
+    """{id: face_registered} untuk id yang ada di tabel (dicek per potongan IN)."""
+    status = {}
+    ids = list(ids)
+    for start in range(0, len(ids), chunk_size):
+        part = ids[start:start + chunk_size]
+        placeholders = ', '.join(['%s'] * len(part))
+        rows = query_db(
+            f"SELECT {pk_col} AS pk, face_registered FROM {table} WHERE {pk_col} IN ({placeholders})",
+            tuple(part)
+        )
+        if rows is None:
+            raise RuntimeError("Gagal membaca data pengguna dari database.")
+        status.update({str(r['pk']): bool(r['face_registered']) for r in rows})
+    return status
+
+def _encode_result(result):
+    """Descriptor jika foto berisi tepat satu wajah, atau (None, alasan)."""
+    if isinstance(result, FaceWorkerError):
+        return None, str(result)
+    encodings = result['encodings']
+    if encodings is None:
+        return None, "Format gambar tidak valid."
+    if not encodings:
+        return None, "Tidak ada wajah terdeteksi."
+    if len(encodings) > 1:
+        return None, f"Terdeteksi {len(encodings)} wajah (foto harus berisi satu wajah)."
+    return encodings[0], None
+
+def _write_descriptors(table, pk_col, updates):
+    with transaction() as tx:
+        tx.executemany(
+            f"UPDATE {table} SET face_descriptor = %s, face_registered = 1, foto_wajah = 'registered' WHERE {pk_col} = %s",
+            updates
+        )
+    if table == 'mahasiswa':
+        for _, nim in updates:
+            invalidate_face_descriptor(nim)
+
+def enroll_faces(path, user_type, batch_size=100, workers=None, overwrite=False, progress=None):
+    """
+    Mendaftarkan wajah dari semua foto di `path` (zip/direktori) untuk `user_type` ('mahasiswa'/'dosen').
+    - Foto di-encode paralel di `workers` proses (default Config.FACE_WORKERS), dengan
+      paling banyak 2 x workers foto dibaca ke memori pada satu waktu;
+    - descriptor ditulis per `batch_size` foto dengan satu UPDATE executemany per transaksi;
+    - yang sudah terdaftar dilewati kecuali `overwrite=True` (sekaligus mekanisme resume).
+    `progress(selesai, total)` dipanggil setiap batch ditulis.
+    Mengembalikan {total, terdaftar, dilewati, gagal: [{file, id, alasan}]}.
+    """
+    pk_col = ENROLL_TABLES.get(user_type)
+    if pk_col is None:
+        raise ValueError("Tipe pengguna tidak valid.")
+    table = user_type
+    workers = workers or Config.FACE_WORKERS
+
+    with open_photos(path) as photos:
+        gagal, dilewati = [], 0
+
+        # Satu foto per pengguna: nama ganda (mis. 123.jpg dan 123.png) tidak ditebak mana yang benar
+        per_id = {}
+        for photo in photos:
+            per_id.setdefault(photo[0], []).append(photo)
+        status = _registration_status(table, pk_col, per_id.keys())
+
+        queue = []
+        for user_id, group in per_id.items():
+            if len(group) > 1:
+                gagal.extend({"file": name, "id": user_id, "alasan": "Lebih dari satu foto untuk ID yang sama."}
+                             for _, name, _ in group)
+            elif user_id not in status:
+                gagal.append({"file": group[0][1], "id": user_id, "alasan": f"{pk_col.upper()} tidak terdaftar."})
+            elif status[user_id] and not overwrite:
+                dilewati += 1
+            else:
+                queue.append(group[0])
+
+        pool = FaceWorkerPool(
+            workers=workers, max_pending=workers,
+            queue_wait=Config.FACE_JOB_TIMEOUT, job_timeout=Config.FACE_JOB_TIMEOUT
+        )
+        options = encode_options()
+        pending = deque()
+        updates = []
+        terdaftar = selesai = 0
+
+        def collect():
+            nonlocal terdaftar, selesai
+            user_id, name, future = pending.popleft()
+            try:
+                result = future if isinstance(future, FaceWorkerError) else pool.result(future)
+            except FaceWorkerError as err:
+                result = err
+            descriptor, alasan = _encode_result(result)
+            if descriptor is None:
+                gagal.append({"file": name, "id": user_id, "alasan": alasan})
+            else:
+                updates.append((serialize_descriptor(descriptor), user_id))
+            selesai += 1
+            if len(updates) >= batch_size:
+                _write_descriptors(table, pk_col, updates)
+                terdaftar += len(updates)
+                updates.clear()
+                if progress:
+                    progress(selesai, len(queue))
+
+        try:
+            for user_id, name, loader in queue:
+                # Jendela geser: job baru dikirim begitu slot worker tersedia, urutan hasil tetap
+                if len(pending) >= workers * 2:
+                    collect()
+                try:
+                    image_bytes = loader()
+                except (OSError, zipfile.BadZipFile, zlib.error) as err:
+                    # Entri zip rusak (CRC/kompresi) cukup dicatat gagal; file lain tetap diproses
+                    gagal.append({"file": name, "id": user_id, "alasan": f"Gagal membaca file: {err}"})
+                    selesai += 1
+                    continue
+                if len(image_bytes) > Config.MAX_IMAGE_UPLOAD_BYTES:
+                    gagal.append({"file": name, "id": user_id, "alasan": "Ukuran gambar melebihi batas."})
+                    selesai += 1
+                    continue
+                try:
+                    future = pool.submit(_encode_job, image_bytes, options)
+                except FaceWorkerError as err:
+                    future = err
+                pending.append((user_id, name, future))
+            while pending:
+                collect()
+            if updates:
+                _write_descriptors(table, pk_col, updates)
+                terdaftar += len(updates)
+            if progress:
+                progress(selesai, len(queue))
+        finally:
+            pool.shutdown()
+
+        return {"total": len(photos), "terdaftar": terdaftar, "dilewati": dilewati, "gagal": gagal}
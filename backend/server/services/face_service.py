@@ -1,40 +1,270 @@
 # server/services/face_service.py
 
-import face_recognition
 import numpy as np
 import base64
-from io import BytesIO
-from PIL import Image
 import json
-from database.db import execute_db, query_db
+import threading
+import time
+from datetime import datetime
+from database.db import execute_db, query_db, transaction
+from database.batch_writer import BatchWriter
 from config import Config
+from utils.cache import LRUCache
+from utils.face_codec import encode_descriptor, decode_descriptor, is_binary_descriptor
+from services.face_worker import encode_faces, encode_faces_many, FaceWorkerError
 
-def base64_to_image(base64_string):
-    """Mengkonversi Base64 string ke objek gambar."""
-    try:
-        image_data = base64.b64decode(base64_string)
-        return Image.open(BytesIO(image_data))
-    except:
+# Cache descriptor wajah yang sudah di-decode (numpy array), key = NIM.
+# Verifikasi berulang tidak perlu SELECT + json.loads lagi selama entri masih hidup.
+descriptor_cache = LRUCache(maxsize=Config.FACE_CACHE_SIZE, ttl=Config.FACE_CACHE_TTL)
+
+def _decode_descriptor(raw):
+    # Biner: zero-copy dari buffer kolom; JSON lama: di-parse. astype tidak menyalin jika dtype sama.
+    descriptor = decode_descriptor(raw).astype(Config.FACE_CACHE_DTYPE, copy=False)
+    descriptor.setflags(write=False) # Dibagi antar thread, jangan diubah di tempat
+    return descriptor
+
+def serialize_descriptor(descriptor):
+    """Mengubah descriptor menjadi nilai kolom face_descriptor sesuai Config.FACE_DESCRIPTOR_FORMAT."""
+    if Config.FACE_DESCRIPTOR_FORMAT == 'binary':
+        return encode_descriptor(descriptor, Config.FACE_DESCRIPTOR_DTYPE)
+    return json.dumps(np.asarray(descriptor).tolist())
+
+def get_known_descriptor(nim):
+    """Mengambil descriptor wajah mahasiswa dari cache, atau dari DB jika belum ada."""
+    descriptor = descriptor_cache.get(nim)
+    if descriptor is not None:
+        return descriptor
+
+    db_data = query_db("SELECT face_descriptor FROM mahasiswa WHERE nim = %s AND face_registered = 1", (nim,), fetchone=True)
+    if not db_data or not db_data.get('face_descriptor'):
         return None
 
-def register_face(user_id, user_type, image_base64):
-    """Mendeteksi wajah, menghasilkan descriptor, dan menyimpannya ke DB."""
-    img = base64_to_image(image_base64)
-    if not img:
-        return False, "Format gambar tidak valid."
+    descriptor = _decode_descriptor(db_data['face_descriptor'])
+    descriptor_cache.set(nim, descriptor)
+    return descriptor
 
-    # Konversi ke array numpy (RGB)
-    rgb_frame = np.array(img.convert('RGB'))
+# Log scan wajah ditulis di background (batch executemany), bukan di jalur request
+face_scan_log_writer = BatchWriter(
+    'face_scan_log',
+    "INSERT INTO face_scan_log (user_type, user_id, action, confidence_score, lokasi_lat, lokasi_long, created_at) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+    batch_size=Config.SCAN_LOG_BATCH_SIZE,
+    flush_interval=Config.SCAN_LOG_FLUSH_MS / 1000,
+    maxsize=Config.SCAN_LOG_QUEUE_SIZE
+)
 
-    # Dapatkan face encodings
-    encodings = face_recognition.face_encodings(rgb_frame)
+def log_face_scan(user_type, user_id, action, confidence_score, lokasi_lat=None, lokasi_long=None):
+    """Mencatat aktivitas scan wajah ke face_scan_log secara asinkron (waktu dicatat saat ini)."""
+    return face_scan_log_writer.put((user_type, user_id, action, confidence_score, lokasi_lat, lokasi_long, datetime.now()))
 
+def invalidate_face_descriptor(nim, id_kelas=None):
+    """
+    Hapus descriptor dari cache (dipanggil saat wajah/data mahasiswa berubah).
+    Matriks kelas yang memuat mahasiswa ini, dan matriks kelasnya saat ini (`id_kelas`, dibaca
+    dari DB jika tidak diberikan), dibangun ulang saat dipakai berikutnya; jadi mahasiswa yang
+    baru mendaftarkan wajah atau baru dipindah ke kelas itu langsung ikut dikenali.
+    """
+    descriptor_cache.pop(nim)
+    with _class_index_lock:
+        if not _class_indexes:
+            return
+    if id_kelas is None:
+        row = query_db("SELECT id_kelas FROM mahasiswa WHERE nim = %s", (nim,), fetchone=True)
+        id_kelas = row['id_kelas'] if row else None
+    with _class_index_lock:
+        stale = [k for k, idx in _class_indexes.items()
+                 if nim in idx.positions or (id_kelas is not None and idx.id_kelas == id_kelas)]
+        for id_sesi in stale:
+            del _class_indexes[id_sesi]
+
+# --- Identifikasi 1:N (kiosk) ---
+
+class ClassIndex:
+    """
+    Descriptor seluruh mahasiswa terdaftar di kelas suatu sesi, disusun sebagai satu
+    matriks numpy contiguous (N x 128) agar jarak ke probe dihitung sekali secara vektor.
+    """
+
+    def __init__(self, id_sesi, id_kelas, nims, matrix, expires_at):
+        self.id_sesi = id_sesi
+        self.id_kelas = id_kelas
+        self.nims = nims
+        self.positions = {nim: i for i, nim in enumerate(nims)}
+        self.matrix = matrix
+        self.expires_at = expires_at
+
+    def distances(self, probe):
+        """Jarak Euclidean probe (128,) ke setiap baris matriks -> array (N,)."""
+        return np.linalg.norm(self.matrix - probe, axis=1)
+
+_class_indexes = {}
+_class_index_lock = threading.Lock()
+
+def build_class_index(id_sesi):
+    """
+    Memuat descriptor seluruh mahasiswa kelas pada sesi ini dalam satu query,
+    menyusun matriksnya, dan sekaligus mengisi descriptor_cache (1:1).
+    """
+    id_sesi = int(id_sesi) # Key dict selalu int, baik dari JSON maupun form/query string
+    rows = query_db("""
+        SELECT m.nim, m.face_descriptor, p.id_kelas,
+               TIMESTAMPDIFF(SECOND, NOW(), s.waktu_buka + INTERVAL s.durasi_menit MINUTE) AS sisa_detik
+        FROM sesi_absensi s
+        JOIN pertemuan p ON s.id_pertemuan = p.id_pertemuan
+        JOIN mahasiswa m ON m.id_kelas = p.id_kelas
+        WHERE s.id_sesi = %s AND s.status_sesi = 'aktif'
+          AND m.face_registered = 1 AND m.face_descriptor IS NOT NULL
+        ORDER BY m.nim
+    """, (id_sesi,))
+    if not rows:
+        return None
+
+    nims = []
+    descriptors = []
+    for row in rows:
+        descriptor = _decode_descriptor(row['face_descriptor'])
+        descriptor_cache.set(row['nim'], descriptor)
+        nims.append(row['nim'])
+        descriptors.append(descriptor)
+
+    matrix = np.ascontiguousarray(np.vstack(descriptors), dtype=np.float32)
+    matrix.setflags(write=False)
+    # Tetap dibuang sendiri setelah sesi seharusnya berakhir, walau penutupan sesi tidak teramati
+    ttl = max(int(rows[0]['sisa_detik'] or 0), 0) + Config.FACE_CLASS_INDEX_GRACE
+    index = ClassIndex(id_sesi, rows[0]['id_kelas'], nims, matrix, time.monotonic() + ttl)
+
+    with _class_index_lock:
+        _class_indexes[id_sesi] = index
+    return index
+
+def get_class_index(id_sesi):
+    """Mengambil matriks kelas untuk sesi; dibangun saat pertama dipakai jika belum ada."""
+    id_sesi = int(id_sesi)
+    with _class_index_lock:
+        index = _class_indexes.get(id_sesi)
+        if index is not None and time.monotonic() >= index.expires_at:
+            del _class_indexes[id_sesi]
+            index = None
+    return index or build_class_index(id_sesi)
+
+def evict_class_index(id_sesi):
+    """Membuang matriks kelas saat sesi ditutup."""
+    with _class_index_lock:
+        _class_indexes.pop(int(id_sesi), None)
+
+def match_group_frame(id_sesi, image):
+    """
+    Mode kiosk/kamera kelas: deteksi dan encode SEMUA wajah dalam satu frame, lalu cocokkan
+    sekaligus terhadap matriks kelas (matriks jarak wajah x mahasiswa dalam satu operasi).
+    Setiap wajah dan setiap mahasiswa dipasangkan paling banyak sekali (greedy, jarak terkecil dulu).
+    Mengembalikan (matches, jumlah_wajah, pesan); matches None jika gagal.
+    """
+    index = get_class_index(id_sesi)
+    if index is None:
+        return None, 0, "Sesi tidak aktif atau belum ada wajah mahasiswa yang terdaftar di kelas ini."
+
+    image_bytes = image_to_bytes(image)
+    if not image_bytes:
+        return None, 0, "Format gambar input tidak valid."
+
+    encodings = encode_faces(image_bytes, group=True)
+    if encodings is None:
+        return None, 0, "Format gambar input tidak valid."
     if not encodings:
-        return False, "Tidak ada wajah terdeteksi dalam gambar."
+        return None, 0, "Tidak ada wajah terdeteksi dalam gambar input."
 
-    # Ambil encoding pertama
-    face_descriptor = encodings[0].tolist() # Konversi numpy array ke list agar bisa disimpan sebagai JSON/TEXT
+    probes = np.asarray(encodings, dtype=np.float32)
+    # (F, 1, 128) - (1, N, 128) -> matriks jarak (F, N)
+    distances = np.linalg.norm(probes[:, None, :] - index.matrix[None, :, :], axis=2)
+
+    faces, students = np.nonzero(distances <= Config.FACE_RECOGNITION_TOLERANCE)
+    order = np.argsort(distances[faces, students])
+    used_faces, used_students, matches = set(), set(), []
+    for i in order:
+        face, student = int(faces[i]), int(students[i])
+        if face in used_faces or student in used_students:
+            continue
+        used_faces.add(face)
+        used_students.add(student)
+        matches.append({
+            "nim": index.nims[student],
+            "distance": round(float(distances[face, student]), 4),
+            "confidence_score": _confidence(distances[face, student]),
+        })
+
+    return matches, len(encodings), f"{len(matches)} dari {len(encodings)} wajah dikenali."
+
+def _confidence(distance):
+    return round(max(0.0, 1.0 - float(distance)), 2)
+
+def identify_face(id_sesi, image, top_k=3, face_box=None):
+    """
+    Identifikasi 1:N: mencocokkan satu wajah terhadap semua mahasiswa kelas sesi ini.
+    Mengembalikan (kandidat, pesan); kandidat terurut dari jarak terkecil, paling banyak top_k.
+    """
+    index = get_class_index(id_sesi)
+    if index is None:
+        return None, "Sesi tidak aktif atau belum ada wajah mahasiswa yang terdaftar di kelas ini."
+
+    image_bytes = image_to_bytes(image)
+    if not image_bytes:
+        return None, "Format gambar input tidak valid."
 
+    encodings = encode_faces(image_bytes, face_box)
+    if encodings is None:
+        return None, "Format gambar input tidak valid."
+    if not encodings:
+        return None, "Tidak ada wajah terdeteksi dalam gambar input."
+
+    distances = index.distances(encodings[0])
+    k = max(1, min(top_k, len(index.nims)))
+    # argpartition O(N) untuk k terdekat, lalu urutkan k tersebut saja
+    nearest = np.argpartition(distances, k - 1)[:k]
+    nearest = nearest[np.argsort(distances[nearest])]
+
+    candidates = [
+        {
+            "nim": index.nims[i],
+            "distance": round(float(distances[i]), 4),
+            "confidence_score": _confidence(distances[i]),
+            "match": bool(distances[i] <= Config.FACE_RECOGNITION_TOLERANCE),
+        }
+        for i in nearest
+    ]
+    return candidates, "Identifikasi selesai."
+
+def image_to_bytes(image):
+    """
+    Menormalkan input gambar menjadi bytes (decode gambar dilakukan di worker).
+    `image` berupa bytes dari upload biner, atau string Base64 dari payload JSON lama.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    try:
+        return base64.b64decode(image)
+    except Exception:
+        return None
+
+def parse_face_box(value):
+    """
+    Validasi bounding box wajah opsional dari klien: [top, right, bottom, left] (piksel,
+    koordinat gambar asli setelah orientasi EXIF). Mengembalikan tuple atau None.
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',') # Dari form/query string: "top,right,bottom,left"
+    if isinstance(value, dict):
+        value = [value.get(k) for k in ('top', 'right', 'bottom', 'left')]
+    try:
+        top, right, bottom, left = (int(v) for v in value)
+    except (TypeError, ValueError):
+        raise ValueError("face_box harus berisi [top, right, bottom, left].")
+    if bottom <= top or right <= left:
+        raise ValueError("face_box tidak valid.")
+    return (top, right, bottom, left)
+
+def register_face(user_id, user_type, image, face_box=None):
+    """Mendeteksi wajah, menghasilkan descriptor, dan menyimpannya ke DB."""
     # Tentukan tabel dan kolom primary key
     if user_type == 'dosen':
         table = 'dosen'
@@ -45,47 +275,60 @@ def register_face(user_id, user_type, image_base64):
     else:
         return False, "Tipe pengguna tidak valid."
 
+    image_bytes = image_to_bytes(image)
+    if not image_bytes:
+        return False, "Format gambar tidak valid."
+
+    # Dapatkan face encodings (di worker process; FaceWorkerError diteruskan ke route)
+    encodings = encode_faces(image_bytes, face_box)
+
+    if encodings is None:
+        return False, "Format gambar tidak valid."
+    if not encodings:
+        return False, "Tidak ada wajah terdeteksi dalam gambar."
+
+    # Ambil encoding pertama
+    face_descriptor = encodings[0]
+
     # Simpan descriptor ke database dan set face_registered = 1
     query = f"""
         UPDATE {table} 
         SET face_descriptor = %s, face_registered = 1, foto_wajah = 'registered' 
         WHERE {pk_col} = %s
     """
-    success = execute_db(query, (json.dumps(face_descriptor), user_id))
+    success = execute_db(query, (serialize_descriptor(face_descriptor), user_id))
 
     if success:
+        if user_type == 'mahasiswa':
+            invalidate_face_descriptor(user_id)
         return True, "Wajah berhasil didaftarkan."
     else:
         return False, "Gagal menyimpan ke database."
 
-def verify_face(nim, image_base64):
+def verify_face(nim, image, face_box=None):
     """Membandingkan wajah yang di-scan dengan descriptor yang tersimpan."""
-    # 1. Ambil descriptor tersimpan
-    db_data = query_db("SELECT face_descriptor FROM mahasiswa WHERE nim = %s AND face_registered = 1", (nim,), fetchone=True)
-    if not db_data or not db_data.get('face_descriptor'):
+    # 1. Ambil descriptor tersimpan (cache, fallback ke DB)
+    known_descriptor = get_known_descriptor(nim)
+    if known_descriptor is None:
         return False, 0.0, "Wajah belum terdaftar di database."
 
-    known_descriptor = np.array(json.loads(db_data['face_descriptor']))
-
-    # 2. Proses gambar input
-    img = base64_to_image(image_base64)
-    if not img:
+    # 2. Proses gambar input (decode + encoding di worker process)
+    image_bytes = image_to_bytes(image)
+    if not image_bytes:
         return False, 0.0, "Format gambar input tidak valid."
-    
-    rgb_frame = np.array(img.convert('RGB'))
-    unknown_encodings = face_recognition.face_encodings(rgb_frame)
 
+    unknown_encodings = encode_faces(image_bytes, face_box)
+
+    if unknown_encodings is None:
+        return False, 0.0, "Format gambar input tidak valid."
     if not unknown_encodings:
         return False, 0.0, "Tidak ada wajah terdeteksi dalam gambar input."
 
-    unknown_descriptor = unknown_encodings[0]
+    return _compare_descriptor(known_descriptor, unknown_encodings[0])
 
-    # 3. Bandingkan wajah (Hitung Jarak)
-    # face_recognition.compare_faces mengembalikan array boolean
-    # face_recognition.face_distance mengembalikan array jarak Euclidean
-    
-    distances = face_recognition.face_distance([known_descriptor], unknown_descriptor)
-    distance = distances[0] # Jarak Euclidean
+def _compare_descriptor(known_descriptor, unknown_descriptor):
+    # 3. Bandingkan wajah (Hitung Jarak Euclidean, sama dengan face_recognition.face_distance)
+    distance = float(np.linalg.norm(known_descriptor - unknown_descriptor))
 
     # 4. Tentukan hasil
     if distance <= Config.FACE_RECOGNITION_TOLERANCE:
@@ -94,4 +337,74 @@ def verify_face(nim, image_base64):
         return True, confidence_score, "Wajah cocok."
     else:
         confidence_score = round(max(0.0, 1.0 - distance), 2)
-        return False, confidence_score, "Wajah tidak cocok."
\ No newline at end of file
+        return False, confidence_score, "Wajah tidak cocok."
+
+def verify_faces(nim, items):
+    """
+    Verifikasi banyak gambar milik satu mahasiswa sekaligus (sinkronisasi offline).
+    `items` berisi (image, face_box); semua gambar di-encode paralel di worker pool.
+    Mengembalikan list (match, confidence_score, pesan); match None berarti worker
+    sibuk/gagal dan item boleh dikirim ulang.
+    """
+    known_descriptor = get_known_descriptor(nim)
+    if known_descriptor is None:
+        return [(False, 0.0, "Wajah belum terdaftar di database.")] * len(items)
+
+    results = [None] * len(items)
+    jobs, positions = [], []
+    for i, (image, face_box) in enumerate(items):
+        image_bytes = image_to_bytes(image) if image else None
+        if not image_bytes:
+            results[i] = (False, 0.0, "Format gambar input tidak valid.")
+            continue
+        jobs.append((image_bytes, face_box))
+        positions.append(i)
+
+    for i, encodings in zip(positions, encode_faces_many(jobs)):
+        if isinstance(encodings, FaceWorkerError):
+            results[i] = (None, 0.0, str(encodings))
+        elif encodings is None:
+            results[i] = (False, 0.0, "Format gambar input tidak valid.")
+        elif not encodings:
+            results[i] = (False, 0.0, "Tidak ada wajah terdeteksi dalam gambar input.")
+        else:
+            results[i] = _compare_descriptor(known_descriptor, encodings[0])
+    return results
+
+FACE_TABLES = {'mahasiswa': 'nim', 'dosen': 'nip'}
+
+def migrate_face_descriptors(table=None, batch_size=500):
+    """
+    Mengonversi descriptor JSON lama di tabel `table` (default: mahasiswa & dosen) ke format biner.
+    Kolom face_descriptor tabel itu harus sudah BLOB (lihat database/schema.py).
+    Diproses per batch (keyset pada primary key) dengan satu UPDATE executemany per batch.
+    Mengembalikan dict {tabel: jumlah baris yang dikonversi}.
+    """
+    tables = [table] if table else list(FACE_TABLES)
+    converted = {}
+    for table in tables:
+        pk_col = FACE_TABLES[table]
+        converted[table] = 0
+        last_pk = ''
+        while True:
+            with transaction() as tx:
+                rows = tx.query(f"""
+                    SELECT {pk_col} AS pk, face_descriptor FROM {table}
+                    WHERE {pk_col} > %s AND face_descriptor IS NOT NULL
+                    ORDER BY {pk_col} LIMIT %s
+                """, (last_pk, batch_size))
+                if not rows:
+                    break
+                last_pk = rows[-1]['pk']
+
+                updates = [
+                    (encode_descriptor(decode_descriptor(row['face_descriptor']), Config.FACE_DESCRIPTOR_DTYPE), row['pk'])
+                    for row in rows
+                    if not is_binary_descriptor(row['face_descriptor'])
+                ]
+                if updates:
+                    tx.executemany(f"UPDATE {table} SET face_descriptor = %s WHERE {pk_col} = %s", updates)
+                converted[table] += len(updates)
+
+    descriptor_cache.clear()
+    return converted
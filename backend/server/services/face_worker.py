@@ -0,0 +1,195 @@
+# server/services/face_worker.py
+
+import atexit
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageOps
+from config import Config
+from utils.metrics import metrics
+from utils.process_pool import BoundedProcessPool
+
+# Encoding wajah (deteksi HOG + jaringan dlib) murni CPU-bound dan memegang GIL,
+# jadi dijalankan di proses terpisah, bukan di thread request Flask.
+# Modul ini sengaja ringan (tanpa Flask/DB) karena di-import ulang oleh setiap worker.
+
+class FaceWorkerError(Exception):
+    """Dasar error pool worker wajah; route memetakannya ke HTTP 503."""
+    pass
+
+class FaceWorkerBusy(FaceWorkerError):
+    """Antrean job penuh (backpressure)."""
+    pass
+
+class FaceWorkerTimeout(FaceWorkerError):
+    """Job tidak selesai dalam Config.FACE_JOB_TIMEOUT detik."""
+    pass
+
+# --- Sisi worker (berjalan di proses anak) ---
+
+_face_recognition = None
+
+def _init_worker():
+    """Dipanggil sekali per proses worker: import face_recognition memuat model dlib."""
+    global _face_recognition
+    import face_recognition
+    _face_recognition = face_recognition
+
+# Tag EXIF Orientation yang menukar lebar dan tinggi (rotasi 90/270 derajat)
+_SWAPPED_ORIENTATIONS = (5, 6, 7, 8)
+
+def preprocess_image(image_bytes, max_edge):
+    """
+    Decode gambar menjadi array RGB yang siap di-encode:
+    1. JPEG di-decode langsung pada resolusi lebih kecil (draft mode), format lain dengan reduce();
+    2. orientasi diperbaiki sesuai tag EXIF;
+    3. sisi terpanjang diperkecil menjadi paling besar `max_edge` piksel.
+    Mengembalikan (rgb_frame, skala) dengan skala = lebar akhir / lebar asli (setelah orientasi).
+    """
+    img = Image.open(BytesIO(image_bytes))
+    orientation = img.getexif().get(0x0112, 1)
+    width, height = img.size
+    if orientation in _SWAPPED_ORIENTATIONS:
+        width, height = height, width
+
+    if max_edge and max(img.size) > max_edge:
+        if img.format == 'JPEG':
+            img.draft('RGB', (max_edge, max_edge))
+        else:
+            factor = max(img.size) // max_edge
+            if factor > 1:
+                img = img.reduce(factor)
+
+    img = ImageOps.exif_transpose(img)
+    if max_edge:
+        img.thumbnail((max_edge, max_edge))
+
+    rgb_frame = np.asarray(img.convert('RGB'))
+    return rgb_frame, rgb_frame.shape[1] / width
+
+def _scale_box(face_box, scale, shape):
+    """Menskalakan bounding box klien (top, right, bottom, left) ke ukuran gambar hasil resize."""
+    top, right, bottom, left = (int(round(v * scale)) for v in face_box)
+    h, w = shape[:2]
+    return (max(0, top), min(w, right), min(h, bottom), max(0, left))
+
+def _encode_job(image_bytes, options):
+    """
+    Pre-processing + deteksi + encoding semua wajah pada gambar.
+    Mengembalikan {'encodings': list | None, 'timings': {tahap: detik}};
+    encodings None berarti gambar tidak valid.
+    """
+    timings = {}
+    start = time.perf_counter()
+    try:
+        rgb_frame, scale = preprocess_image(image_bytes, options['max_edge'])
+    except Exception:
+        return {'encodings': None, 'timings': timings}
+    timings['preprocess'] = time.perf_counter() - start
+
+    # Lewati deteksi jika klien sudah mengirim lokasi wajah
+    start = time.perf_counter()
+    if options.get('face_box'):
+        locations = [_scale_box(options['face_box'], scale, rgb_frame.shape)]
+    else:
+        locations = _face_recognition.face_locations(
+            rgb_frame,
+            number_of_times_to_upsample=options['upsample'],
+            model=options['detector']
+        )
+    timings['detect'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encodings = _face_recognition.face_encodings(
+        rgb_frame,
+        known_face_locations=locations,
+        num_jitters=options['num_jitters'],
+        model=options['landmark_model']
+    ) if locations else []
+    timings['encode'] = time.perf_counter() - start
+
+    return {'encodings': encodings, 'timings': timings}
+
+# --- Sisi server (proses Flask) ---
+
+class FaceWorkerPool(BoundedProcessPool):
+    """
+    Process pool encoding wajah dengan antrean terbatas (utils/process_pool.py).
+    Setiap worker memuat model dlib sekali lewat _init_worker.
+    """
+
+    busy_error = FaceWorkerBusy
+    timeout_error = FaceWorkerTimeout
+    broken_error = FaceWorkerError
+    busy_message = "Server pengenalan wajah sedang sibuk, coba lagi sebentar."
+    timeout_message = "Proses pengenalan wajah melebihi batas waktu."
+    broken_message = "Worker pengenalan wajah berhenti tak terduga, coba lagi."
+
+    def __init__(self, workers=2, max_pending=8, queue_wait=2, job_timeout=15):
+        super().__init__(workers, max_pending, queue_wait, job_timeout, initializer=_init_worker)
+
+face_pool = FaceWorkerPool(
+    workers=Config.FACE_WORKERS,
+    max_pending=Config.FACE_QUEUE_SIZE,
+    queue_wait=Config.FACE_QUEUE_WAIT,
+    job_timeout=Config.FACE_JOB_TIMEOUT
+)
+atexit.register(face_pool.shutdown)
+
+def encode_options(face_box=None, group=False):
+    """
+    Opsi pre-processing/deteksi dari Config untuk satu job.
+    `group=True` untuk frame kamera kelas: resolusi dan upsample lebih tinggi agar wajah kecil terdeteksi.
+    """
+    return {
+        'max_edge': Config.FACE_GROUP_MAX_IMAGE_EDGE if group else Config.FACE_MAX_IMAGE_EDGE,
+        'detector': Config.FACE_DETECTOR_MODEL,
+        'upsample': Config.FACE_GROUP_DETECTOR_UPSAMPLE if group else Config.FACE_DETECTOR_UPSAMPLE,
+        'num_jitters': Config.FACE_NUM_JITTERS,
+        'landmark_model': Config.FACE_LANDMARK_MODEL,
+        'face_box': face_box,
+    }
+
+def encode_faces(image_bytes, face_box=None, group=False):
+    """
+    Encoding semua wajah pada gambar lewat worker pool (blocking sampai selesai).
+    Durasi tiap tahap dicatat ke utils.metrics dengan prefix 'face.'.
+    """
+    start = time.perf_counter()
+    result = face_pool.run(_encode_job, image_bytes, encode_options(face_box, group))
+    metrics.observe('face.total', time.perf_counter() - start)
+    for stage, seconds in result['timings'].items():
+        metrics.observe(f'face.{stage}', seconds)
+    return result['encodings']
+
+def encode_faces_many(jobs):
+    """
+    Encoding banyak gambar sekaligus: semua job dikirim ke pool dulu lalu hasilnya dikumpulkan,
+    sehingga seluruh worker bekerja paralel. `jobs` berisi (image_bytes, face_box).
+    Mengembalikan list seukuran `jobs`: encodings (list/None) atau FaceWorkerError untuk job
+    yang gagal/ditolak (job lain tetap diproses).
+    """
+    start = time.perf_counter()
+    futures = []
+    for image_bytes, face_box in jobs:
+        try:
+            futures.append(face_pool.submit(_encode_job, image_bytes, encode_options(face_box)))
+        except FaceWorkerError as err:
+            futures.append(err)
+
+    results = []
+    for future in futures:
+        if isinstance(future, FaceWorkerError):
+            results.append(future)
+            continue
+        try:
+            result = face_pool.result(future)
+        except FaceWorkerError as err:
+            results.append(err)
+            continue
+        for stage, seconds in result['timings'].items():
+            metrics.observe(f'face.{stage}', seconds)
+        results.append(result['encodings'])
+    metrics.observe('face.batch_total', time.perf_counter() - start)
+    return results
@@ -0,0 +1,64 @@
+# server/services/kehadiran_events.py
+
+import json
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from config import Config
+from utils.pubsub import PubSub
+
+# Event kehadiran per id_sesi untuk dashboard dosen (SSE /dosen/sesi/<id_sesi>/kehadiran/stream).
+# Jalur absensi menerbitkan delta setelah COMMIT; dashboard menerima roster sekali lalu delta saja.
+kehadiran_events = PubSub(maxsize=Config.SSE_QUEUE_SIZE)
+
+def publish_kehadiran(id_sesi, records):
+    """`records` berisi dict {nim, status, waktu_absen, metode, confidence_score} yang baru tercatat."""
+    if records:
+        kehadiran_events.publish(int(id_sesi), ('kehadiran', records))
+
+def publish_sesi_closed(id_sesi):
+    kehadiran_events.publish(int(id_sesi), ('sesi_selesai', {"id_sesi": int(id_sesi)}))
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Tipe {type(value).__name__} tidak bisa diubah ke JSON")
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=_json_default)}\n\n"
+
+def stream_kehadiran(id_sesi, load_roster, active=True):
+    """
+    Generator SSE: event `roster` (data penuh dari `load_roster()`), lalu `kehadiran` (delta),
+    komentar keepalive setiap Config.SSE_HEARTBEAT detik, dan `sesi_selesai` saat sesi ditutup.
+    Jika pelanggan tertinggal (antrean penuh), roster dikirim ulang.
+    Sesi yang sudah tidak aktif (`active=False`) hanya mengirim roster lalu `sesi_selesai`.
+    """
+    if not active:
+        yield _sse('roster', load_roster())
+        yield _sse('sesi_selesai', {"id_sesi": int(id_sesi)})
+        return
+
+    sub = kehadiran_events.subscribe(int(id_sesi))
+    try:
+        # Berlangganan dulu baru memuat roster, agar absensi di sela keduanya tidak terlewat
+        yield _sse('roster', load_roster())
+        deadline = time.monotonic() + Config.SSE_MAX_DURATION
+        while time.monotonic() < deadline:
+            item = sub.get(timeout=Config.SSE_HEARTBEAT)
+            if sub.overflowed:
+                sub.overflowed = False
+                yield _sse('roster', load_roster())
+                continue
+            if item is None:
+                yield ": keepalive\n\n"
+                continue
+            event, data = item
+            yield _sse(event, data)
+            if event == 'sesi_selesai':
+                return
+    finally:
+        kehadiran_events.unsubscribe(sub)
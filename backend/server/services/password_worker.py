@@ -0,0 +1,84 @@
+# server/services/password_worker.py
+
+import atexit
+
+import bcrypt
+from config import Config
+from utils.process_pool import BoundedProcessPool
+
+# bcrypt sengaja lambat (~250ms per hash pada cost 12). Untuk import massal, hashing
+# dibagi ke beberapa proses agar semua core terpakai, bukan satu per satu di thread request.
+# Verifikasi login memakai pool terpisah dengan antrean terbatas, agar lonjakan login pagi
+# ditolak cepat (HTTP 503) alih-alih menumpuk thread request yang menunggu bcrypt,
+# dan tidak tertahan di belakang import massal.
+
+class PasswordWorkerBusy(Exception):
+    """Antrean verifikasi password penuh atau terlalu lama; route memetakannya ke HTTP 503."""
+    pass
+
+def _hash_job(password, rounds):
+    """Dijalankan di proses worker: hash bcrypt satu password (str -> str)."""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _check_job(password, hashed):
+    """Dijalankan di proses worker: cocokkan password dengan hash bcrypt."""
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        return False # Hash rusak/bukan bcrypt
+
+def is_bcrypt_hash(value):
+    return isinstance(value, str) and value.startswith(('$2a$', '$2b$', '$2y$'))
+
+class PasswordWorkerPool(BoundedProcessPool):
+    """
+    Process pool bcrypt dengan antrean terbatas (utils/process_pool.py).
+    `hash_many()` untuk job batch tidak melewati batas antrean itu.
+    """
+
+    busy_error = PasswordWorkerBusy
+    timeout_error = PasswordWorkerBusy
+    broken_error = PasswordWorkerBusy
+    busy_message = "Server sedang sibuk, coba login lagi sebentar."
+    timeout_message = "Proses password melebihi batas waktu, coba lagi."
+    broken_message = "Worker password berhenti tak terduga, coba lagi."
+
+    def __init__(self, workers=2, max_pending=8, queue_wait=1, job_timeout=5):
+        super().__init__(workers, max_pending, queue_wait, job_timeout)
+
+    def hash_many(self, passwords, rounds=None):
+        """Hash banyak password secara paralel; urutan hasil sama dengan `passwords`."""
+        passwords = list(passwords)
+        if not passwords:
+            return []
+        rounds = rounds or Config.BCRYPT_ROUNDS
+        # chunksize mengurangi bolak-balik IPC tanpa membuat satu worker menanggung semuanya
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._get_executor().map(
+            _hash_job, passwords, [rounds] * len(passwords), chunksize=chunksize
+        ))
+
+password_pool = PasswordWorkerPool(workers=Config.PASSWORD_WORKERS)
+login_pool = PasswordWorkerPool(
+    workers=Config.LOGIN_WORKERS,
+    max_pending=Config.LOGIN_QUEUE_SIZE,
+    queue_wait=Config.LOGIN_QUEUE_WAIT,
+    job_timeout=Config.LOGIN_JOB_TIMEOUT
+)
+atexit.register(password_pool.shutdown)
+atexit.register(login_pool.shutdown)
+
+def hash_password(password):
+    """Hash satu password di thread pemanggil (jalur CRUD biasa)."""
+    return _hash_job(password, Config.BCRYPT_ROUNDS)
+
+def hash_passwords(passwords):
+    return password_pool.hash_many(passwords)
+
+def check_password(password, hashed):
+    """Verifikasi bcrypt di login_pool (blocking sampai selesai); PasswordWorkerBusy jika penuh."""
+    return login_pool.run(_check_job, password, hashed)
+
+def hash_password_for_login(password):
+    """Hash untuk jalur login (upgrade password lama) lewat login_pool dengan batas antrean yang sama."""
+    return login_pool.run(_hash_job, password, Config.BCRYPT_ROUNDS)
@@ -0,0 +1,151 @@
+# server/services/rekap_service.py
+
+from database.db import query_db, transaction, stream_query
+
+# Rekap kehadiran disimpan di tabel rekap_kehadiran_summary (per nim x id_kelas) dan diperbarui
+# di transaksi yang sama dengan INSERT absensi, sehingga /dosen/rekap tidak lagi menghitung ulang
+# agregat seluruh tabel absensi lewat view v_rekap_kehadiran.
+
+STATUS_COLUMNS = {
+    'hadir': 'total_hadir',
+    'izin': 'total_izin',
+    'sakit': 'total_sakit',
+    'alpha': 'total_alpha',
+}
+
+_UPSERT_QUERY = """
+    INSERT INTO rekap_kehadiran_summary (nim, id_kelas, total_hadir, total_izin, total_sakit, total_alpha, terakhir_hadir)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        total_hadir = total_hadir + VALUES(total_hadir),
+        total_izin = total_izin + VALUES(total_izin),
+        total_sakit = total_sakit + VALUES(total_sakit),
+        total_alpha = total_alpha + VALUES(total_alpha),
+        terakhir_hadir = GREATEST(COALESCE(terakhir_hadir, VALUES(terakhir_hadir)), COALESCE(VALUES(terakhir_hadir), terakhir_hadir))
+"""
+
+# Agregat sumber kebenaran (dipakai rebuild dan pengecekan konsistensi)
+_AGGREGATE_QUERY = """
+    SELECT a.nim, p.id_kelas,
+           SUM(a.status = 'hadir') AS total_hadir,
+           SUM(a.status = 'izin') AS total_izin,
+           SUM(a.status = 'sakit') AS total_sakit,
+           SUM(a.status = 'alpha') AS total_alpha,
+           MAX(CASE WHEN a.status = 'hadir' THEN a.waktu_absen END) AS terakhir_hadir
+    FROM absensi a
+    JOIN pertemuan p ON a.id_pertemuan = p.id_pertemuan
+    {where}
+    GROUP BY a.nim, p.id_kelas
+"""
+
+def record_absensi(tx, rows):
+    """
+    Menambahkan absensi baru ke rekap, di dalam transaksi `tx` yang menulis absensinya.
+    `rows` berisi (nim, id_kelas, status, waktu_absen); beberapa baris untuk nim+kelas yang sama
+    digabung dulu sehingga satu executemany cukup untuk satu batch.
+    """
+    deltas = {}
+    for nim, id_kelas, status, waktu_absen in rows:
+        column = STATUS_COLUMNS.get(status)
+        if column is None:
+            continue
+        delta = deltas.setdefault((nim, id_kelas), {'counts': dict.fromkeys(STATUS_COLUMNS.values(), 0), 'terakhir_hadir': None})
+        delta['counts'][column] += 1
+        if status == 'hadir' and (delta['terakhir_hadir'] is None or waktu_absen > delta['terakhir_hadir']):
+            delta['terakhir_hadir'] = waktu_absen
+
+    if deltas:
+        tx.executemany(_UPSERT_QUERY, [
+            (nim, id_kelas, d['counts']['total_hadir'], d['counts']['total_izin'],
+             d['counts']['total_sakit'], d['counts']['total_alpha'], d['terakhir_hadir'])
+            for (nim, id_kelas), d in deltas.items()
+        ])
+
+# Rekap seluruh mahasiswa satu kelas (mahasiswa tanpa absensi tetap muncul dengan angka 0)
+REKAP_KELAS_QUERY = """
+    SELECT m.nim, m.nama,
+           COALESCE(r.total_hadir, 0) AS total_hadir,
+           COALESCE(r.total_izin, 0) AS total_izin,
+           COALESCE(r.total_sakit, 0) AS total_sakit,
+           COALESCE(r.total_alpha, 0) AS total_alpha,
+           r.terakhir_hadir,
+           COALESCE(ROUND(100 * r.total_hadir / NULLIF(r.total_hadir + r.total_izin + r.total_sakit + r.total_alpha, 0), 2), 0)
+               AS persentase_kehadiran
+    FROM mahasiswa m
+    LEFT JOIN rekap_kehadiran_summary r ON r.nim = m.nim AND r.id_kelas = m.id_kelas
+    WHERE m.id_kelas = %s
+    ORDER BY m.nim
+"""
+
+def get_rekap_kelas(id_kelas):
+    return query_db(REKAP_KELAS_QUERY, (id_kelas,))
+
+def stream_rekap_kelas(id_kelas):
+    """Rekap kelas sebagai stream baris (export), lihat database.db.stream_query."""
+    return stream_query(REKAP_KELAS_QUERY, (id_kelas,))
+
+def rebuild_rekap(id_kelas=None):
+    """
+    Menghitung ulang rekap dari tabel absensi (seluruhnya, atau satu kelas) dalam satu transaksi.
+    Mengembalikan jumlah baris rekap yang ditulis.
+    """
+    where = "WHERE p.id_kelas = %s" if id_kelas is not None else ""
+    params = (id_kelas,) if id_kelas is not None else None
+    with transaction() as tx:
+        tx.execute("DELETE FROM rekap_kehadiran_summary " + ("WHERE id_kelas = %s" if id_kelas is not None else ""), params)
+        tx.execute(f"""
+            INSERT INTO rekap_kehadiran_summary (nim, id_kelas, total_hadir, total_izin, total_sakit, total_alpha, terakhir_hadir)
+            {_AGGREGATE_QUERY.format(where=where)}
+        """, params)
+        row = tx.query(
+            "SELECT COUNT(*) AS jumlah FROM rekap_kehadiran_summary " + ("WHERE id_kelas = %s" if id_kelas is not None else ""),
+            params, fetchone=True
+        )
+    return row['jumlah']
+
+def refresh_rekap(tx, keys):
+    """
+    Menghitung ulang rekap beberapa (nim, id_kelas) dari tabel absensi di dalam transaksi `tx`.
+    Dipakai saat INSERT batch tidak bisa memastikan baris mana yang benar-benar masuk.
+    """
+    keys = list(set(keys))
+    if not keys:
+        return
+    placeholders = ', '.join(['(%s, %s)'] * len(keys))
+    params = tuple(v for key in keys for v in key)
+    tx.execute(f"DELETE FROM rekap_kehadiran_summary WHERE (nim, id_kelas) IN ({placeholders})", params)
+    tx.execute(f"""
+        INSERT INTO rekap_kehadiran_summary (nim, id_kelas, total_hadir, total_izin, total_sakit, total_alpha, terakhir_hadir)
+        {_AGGREGATE_QUERY.format(where=f"WHERE (a.nim, p.id_kelas) IN ({placeholders})")}
+    """, params)
+
+def check_rekap(id_kelas=None):
+    """
+    Membandingkan rekap tersimpan dengan agregat dari tabel absensi.
+    Mengembalikan list selisih {nim, id_kelas, tersimpan, seharusnya} (kosong = konsisten),
+    atau None jika query gagal (error database tidak boleh terbaca sebagai konsisten).
+    """
+    where = "WHERE p.id_kelas = %s" if id_kelas is not None else ""
+    params = (id_kelas,) if id_kelas is not None else None
+    expected = query_db(_AGGREGATE_QUERY.format(where=where), params)
+    stored = query_db(
+        "SELECT * FROM rekap_kehadiran_summary" + (" WHERE id_kelas = %s" if id_kelas is not None else ""),
+        params
+    )
+    if expected is None or stored is None:
+        return None
+
+    fields = list(STATUS_COLUMNS.values()) + ['terakhir_hadir']
+    def counts(row):
+        return {f: (row[f] if f == 'terakhir_hadir' else int(row[f] or 0)) for f in fields} if row else None
+
+    stored_map = {(r['nim'], r['id_kelas']): counts(r) for r in stored}
+    expected_map = {(r['nim'], r['id_kelas']): counts(r) for r in expected}
+    selisih = []
+    for key in sorted(stored_map.keys() | expected_map.keys(), key=str):
+        if stored_map.get(key) != expected_map.get(key):
+            selisih.append({
+                "nim": key[0], "id_kelas": key[1],
+                "tersimpan": stored_map.get(key), "seharusnya": expected_map.get(key),
+            })
+    return selisih
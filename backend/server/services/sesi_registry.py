@@ -0,0 +1,146 @@
+# server/services/sesi_registry.py
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database.db import query_db
+from config import Config
+from utils.cache import LRUCache
+
+# Kolom v_sesi_aktif (dipakai klien: nama_matakuliah, nama_dosen, ...) ditambah kolom
+# sesi_absensi yang dibutuhkan validasi check-in. Kolom s.* sengaja setelah v.* agar
+# menimpa nilai NULL dari LEFT JOIN.
+_SESI_QUERY = """
+    SELECT v.*, s.id_sesi, s.id_pertemuan, s.nip_dosen, s.waktu_buka, s.durasi_menit,
+           s.lokasi_lat, s.lokasi_long, s.radius_meter, p.id_kelas
+    FROM sesi_absensi s
+    JOIN pertemuan p ON s.id_pertemuan = p.id_pertemuan
+    LEFT JOIN v_sesi_aktif v ON v.id_sesi = s.id_sesi
+    WHERE s.status_sesi = 'aktif'
+"""
+
+class SesiRegistry:
+    """
+    Registry in-memory sesi absensi yang sedang aktif, di-index per id_sesi dan per id_kelas.
+    Jalur check-in menjawab "apakah sesi ini buka dan di mana lokasinya" tanpa query MySQL.
+
+    - Dimuat penuh saat pertama dipakai, lalu dimuat ulang setiap Config.SESI_REGISTRY_REFRESH detik
+      (menangkap sesi yang dibuka/ditutup oleh proses server lain).
+    - Diperbarui langsung oleh open_sesi (refresh) dan jalur penutupan sesi (remove).
+    - Entri kadaluarsa sendiri pada waktu_buka + durasi_menit.
+    """
+
+    def __init__(self, refresh_interval=30):
+        self.refresh_interval = refresh_interval
+        self._by_id = {}
+        self._by_kelas = {}
+        self._loaded_at = None
+        self._lock = threading.RLock()
+        # id_sesi yang baru saja dicek dan tidak aktif, agar id tidak valid tidak terus ke DB
+        self._missing = LRUCache(maxsize=1024, ttl=5)
+
+    # --- Pemuatan ---
+
+    def _ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_interval:
+                self.load()
+
+    def load(self):
+        """Memuat ulang seluruh sesi aktif dari DB (satu query)."""
+        rows = query_db(_SESI_QUERY)
+        if rows is None:
+            return # DB error: pertahankan isi registry yang ada
+        with self._lock:
+            self._by_id = {}
+            self._by_kelas = {}
+            for row in rows:
+                self._put(row)
+            self._loaded_at = time.monotonic()
+
+    def _put(self, row):
+        entry = dict(row)
+        entry['waktu_tutup_seharusnya'] = entry['waktu_buka'] + timedelta(minutes=entry['durasi_menit'])
+        self._by_id[entry['id_sesi']] = entry
+        self._by_kelas.setdefault(entry['id_kelas'], set()).add(entry['id_sesi'])
+        return entry
+
+    def refresh(self, id_sesi):
+        """Memuat satu sesi dari DB (dipanggil setelah open_sesi). None jika tidak aktif."""
+        row = query_db(_SESI_QUERY + " AND s.id_sesi = %s", (id_sesi,), fetchone=True)
+        with self._lock:
+            if not row:
+                self._remove(id_sesi)
+                self._missing.set(id_sesi, True)
+                return None
+            self._missing.pop(id_sesi)
+            return self._put(row)
+
+    # --- Pembacaan ---
+
+    def get(self, id_sesi, include_expired=False):
+        """
+        Data sesi aktif berdasarkan id_sesi, atau None.
+        include_expired=True mengembalikan sesi yang melewati batas waktu tapi belum ditutup
+        oleh expiry scheduler, agar pemanggil bisa membedakan "berakhir" dari "tidak ada".
+        """
+        try:
+            id_sesi = int(id_sesi)
+        except (TypeError, ValueError):
+            return None
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._by_id.get(id_sesi)
+        if entry is None:
+            if self._missing.get(id_sesi):
+                return None
+            entry = self.refresh(id_sesi) # Mungkin dibuka oleh proses server lain
+            if entry is None:
+                return None
+        if not include_expired and datetime.now() > entry['waktu_tutup_seharusnya']:
+            return None
+        return entry
+
+    def by_kelas(self, id_kelas):
+        """Semua sesi aktif (belum lewat waktu) untuk satu kelas."""
+        self._ensure_loaded()
+        now = datetime.now()
+        with self._lock:
+            entries = [self._by_id[i] for i in self._by_kelas.get(id_kelas, ())]
+        return [e for e in entries if now <= e['waktu_tutup_seharusnya']]
+
+    # --- Penutupan ---
+
+    def _remove(self, id_sesi):
+        entry = self._by_id.pop(id_sesi, None)
+        if entry is not None:
+            sesi_kelas = self._by_kelas.get(entry['id_kelas'])
+            if sesi_kelas is not None:
+                sesi_kelas.discard(id_sesi)
+                if not sesi_kelas:
+                    del self._by_kelas[entry['id_kelas']]
+        return entry
+
+    def remove(self, id_sesi):
+        """Menghapus sesi dari registry saat ditutup."""
+        with self._lock:
+            self._missing.set(id_sesi, True)
+            return self._remove(id_sesi)
+
+sesi_registry = SesiRegistry(refresh_interval=Config.SESI_REGISTRY_REFRESH)
+
+# Kelas setiap mahasiswa (nim -> id_kelas) untuk mencari sesi aktif tanpa JOIN per request
+kelas_mahasiswa_cache = LRUCache(maxsize=Config.FACE_CACHE_SIZE, ttl=Config.SESI_REGISTRY_REFRESH * 10)
+
+def get_kelas_mahasiswa(nim):
+    id_kelas = kelas_mahasiswa_cache.get(nim)
+    if id_kelas is None:
+        row = query_db("SELECT id_kelas FROM mahasiswa WHERE nim = %s", (nim,), fetchone=True)
+        if not row or row['id_kelas'] is None:
+            return None
+        id_kelas = row['id_kelas']
+        kelas_mahasiswa_cache.set(nim, id_kelas)
+    return id_kelas
@@ -1,116 +1,223 @@
 # server/services/sesi_service.py
 
 import uuid
+import mysql.connector
 from datetime import datetime, timedelta
-from database.db import query_db, execute_db
+from database.db import query_db, transaction, stream_query
+from config import Config
+from services.face_service import build_class_index
+from services.sesi_registry import sesi_registry, get_kelas_mahasiswa, kelas_mahasiswa_cache
+from services.expiry_scheduler import expiry_scheduler, SESI, BARCODE
+from services.rekap_service import get_rekap_kelas
+from utils import rotating_code
+from utils.cache import LRUCache
+
+_MISSING = object()
 
 def open_sesi(id_pertemuan, nip_dosen, durasi_menit, lokasi_lat, lokasi_long, radius_meter):
-    # Cek apakah pertemuan sudah memiliki sesi aktif
+    # Cek sesi aktif + insert dalam satu transaksi (satu koneksi, satu COMMIT);
+    # error apa pun (termasuk pool koneksi habis) membatalkan keduanya
     check_query = """
         SELECT s.id_sesi FROM sesi_absensi s
         JOIN pertemuan p ON s.id_pertemuan = p.id_pertemuan
         WHERE p.id_pertemuan = %s AND s.status_sesi = 'aktif'
+        FOR UPDATE
     """
-    if query_db(check_query, (id_pertemuan,), fetchone=True):
-        return None, "Pertemuan ini sudah memiliki sesi aktif."
-
-    waktu_buka = datetime.now()
-    waktu_tutup = waktu_buka + timedelta(minutes=durasi_menit)
-    
     insert_query = """
         INSERT INTO sesi_absensi (id_pertemuan, nip_dosen, waktu_buka, waktu_tutup, durasi_menit, lokasi_lat, lokasi_long, radius_meter, status_sesi)
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'aktif')
     """
-    params = (id_pertemuan, nip_dosen, waktu_buka, waktu_tutup, durasi_menit, lokasi_lat, lokasi_long, radius_meter)
-    id_sesi = execute_db(insert_query, params) # Mengembalikan lastrowid
-    
+    try:
+        with transaction() as tx:
+            # Cek apakah pertemuan sudah memiliki sesi aktif
+            if tx.query(check_query, (id_pertemuan,), fetchone=True):
+                return None, "Pertemuan ini sudah memiliki sesi aktif."
+
+            waktu_buka = datetime.now()
+            waktu_tutup = waktu_buka + timedelta(minutes=durasi_menit)
+            params = (id_pertemuan, nip_dosen, waktu_buka, waktu_tutup, durasi_menit, lokasi_lat, lokasi_long, radius_meter)
+            id_sesi = tx.execute(insert_query, params) # Mengembalikan lastrowid
+    except mysql.connector.Error as err:
+        print(f"Database Error: {err}")
+        id_sesi = None
+
     if id_sesi:
         # Trigger tr_after_sesi_opened di SQL dump akan mengirim notifikasi
+        # Daftarkan ke registry sesi aktif dan susun matriks descriptor kelas ini
+        # (sekaligus mengisi cache 1:1) agar check-in pertama tidak perlu ke DB
+        sesi_registry.refresh(id_sesi)
+        build_class_index(id_sesi)
+        expiry_scheduler.schedule(SESI, id_sesi, waktu_tutup)
         return id_sesi, "Sesi absensi berhasil dibuka."
     else:
         return None, "Gagal membuka sesi absensi (Database Error)."
 
 def generate_barcode(id_sesi, nip_dosen, durasi_menit=10):
-    # Cek kepemilikan sesi
-    sesi_data = query_db("SELECT * FROM sesi_absensi WHERE id_sesi = %s AND nip_dosen = %s", (id_sesi, nip_dosen), fetchone=True)
-    if not sesi_data:
-        return None, "Sesi tidak ditemukan atau bukan milik dosen ini."
-        
-    # Buat kode barcode unik (misalnya 8 karakter pertama UUID)
-    kode_barcode = str(uuid.uuid4())[:8].upper()
-    waktu_kadaluarsa = datetime.now() + timedelta(minutes=durasi_menit)
-    
     insert_query = """
         INSERT INTO barcode (kode_barcode, id_sesi, nip_dosen, waktu_kadaluarsa, status)
         VALUES (%s, %s, %s, %s, 'aktif')
     """
-    if execute_db(insert_query, (kode_barcode, id_sesi, nip_dosen, waktu_kadaluarsa)):
+    try:
+        with transaction() as tx:
+            # Cek kepemilikan sesi
+            sesi_data = tx.query("SELECT id_sesi FROM sesi_absensi WHERE id_sesi = %s AND nip_dosen = %s", (id_sesi, nip_dosen), fetchone=True)
+            if not sesi_data:
+                return None, "Sesi tidak ditemukan atau bukan milik dosen ini."
+
+            # Buat kode barcode unik (misalnya 8 karakter pertama UUID)
+            kode_barcode = str(uuid.uuid4())[:8].upper()
+            waktu_kadaluarsa = datetime.now() + timedelta(minutes=durasi_menit)
+            id_barcode = tx.execute(insert_query, (kode_barcode, id_sesi, nip_dosen, waktu_kadaluarsa))
+    except mysql.connector.Error as err:
+        print(f"Database Error: {err}")
+        id_barcode = None
+
+    if id_barcode:
+        expiry_scheduler.schedule(BARCODE, id_barcode, waktu_kadaluarsa)
         return kode_barcode, "Barcode berhasil dibuat."
     else:
         return None, "Gagal menyimpan barcode ke database."
 
-def get_rekap_kehadiran(id_kelas):
-    # Mengambil data dari view v_rekap_kehadiran yang telah dibuat di SQL dump
-    # Filter mahasiswa berdasarkan kelas
-    rekap_query = """
-        SELECT m.nim, m.nama, rk.*
-        FROM mahasiswa m
-        JOIN kelas k ON m.id_kelas = k.id_kelas
-        LEFT JOIN v_rekap_kehadiran rk ON m.nim = rk.nim
-        WHERE k.id_kelas = %s
+def get_rotating_code(id_sesi, nip_dosen):
+    """
+    Kode QR berputar untuk layar dosen (tanpa INSERT ke tabel `barcode`).
+    Klien dosen cukup meminta ulang setiap `berlaku_detik`.
     """
-    rekap_data = query_db(rekap_query, (id_kelas,))
-    return rekap_data
+    sesi_data = sesi_registry.get(id_sesi)
+    if not sesi_data or str(sesi_data['nip_dosen']) != str(nip_dosen):
+        return None, "Sesi tidak ditemukan, sudah ditutup, atau bukan milik dosen ini."
 
-def get_sesi_kehadiran_realtime(id_sesi):
-    # Mengambil daftar mahasiswa di kelas tersebut, dan status absensinya (realtime)
-    query = """
-        SELECT m.nim, m.nama, a.status, a.waktu_absen, a.metode, a.confidence_score
-        FROM mahasiswa m
-        JOIN pertemuan p ON m.id_kelas = p.id_kelas
-        JOIN sesi_absensi s ON p.id_pertemuan = s.id_pertemuan
-        LEFT JOIN absensi a ON m.nim = a.nim AND a.id_sesi = s.id_sesi
-        WHERE s.id_sesi = %s
+    secret = rotating_code.session_secret(sesi_data['id_sesi'], sesi_data['waktu_buka'])
+    kode, sisa_detik = rotating_code.generate_code(sesi_data['id_sesi'], secret)
+    return {
+        "kode_barcode": kode,
+        "berlaku_detik": round(sisa_detik, 1),
+        "interval_detik": Config.QR_ROTATING_STEP,
+    }, "Kode QR berhasil dibuat."
+
+def verify_rotating_code(sesi_data, kode, at=None):
+    """
+    True jika `kode` adalah kode berputar yang sah untuk sesi ini (murni di memori).
+    `at` (datetime) memeriksa kode pada waktu lain, mis. waktu pengambilan absensi offline.
     """
-    kehadiran_data = query_db(query, (id_sesi,))
+    id_sesi, token = rotating_code.parse_code(kode)
+    if id_sesi != sesi_data['id_sesi']:
+        return False
+    secret = rotating_code.session_secret(sesi_data['id_sesi'], sesi_data['waktu_buka'])
+    return rotating_code.verify_token(secret, token, now=at.timestamp() if at else None)
+
+def get_rekap_kehadiran(id_kelas):
+    # Dibaca dari tabel rekap_kehadiran_summary yang diperbarui setiap absensi masuk
+    # (services/rekap_service.py), bukan view v_rekap_kehadiran yang menghitung ulang semuanya
+    return get_rekap_kelas(id_kelas)
+
+# Daftar mahasiswa di kelas sesi tersebut, dan status absensinya (realtime)
+KEHADIRAN_SESI_QUERY = """
+    SELECT m.nim, m.nama, a.status, a.waktu_absen, a.metode, a.confidence_score
+    FROM mahasiswa m
+    JOIN pertemuan p ON m.id_kelas = p.id_kelas
+    JOIN sesi_absensi s ON p.id_pertemuan = s.id_pertemuan
+    LEFT JOIN absensi a ON m.nim = a.nim AND a.id_sesi = s.id_sesi
+    WHERE s.id_sesi = %s
+"""
+
+def get_sesi_kehadiran_realtime(id_sesi):
+    kehadiran_data = query_db(KEHADIRAN_SESI_QUERY, (id_sesi,))
     return kehadiran_data
 
+def stream_sesi_kehadiran(id_sesi):
+    """Kehadiran sesi sebagai stream baris (export), lihat database.db.stream_query."""
+    return stream_query(KEHADIRAN_SESI_QUERY + " ORDER BY m.nim", (id_sesi,))
+
 def get_sesi_aktif_mahasiswa(nim):
-    # Mengambil sesi aktif dari view v_sesi_aktif, difilter berdasarkan kelas mahasiswa
-    query = """
-        SELECT v.* FROM v_sesi_aktif v
-        JOIN pertemuan p ON v.id_pertemuan = p.id_pertemuan
-        JOIN mahasiswa m ON p.id_kelas = m.id_kelas
-        WHERE m.nim = %s
+    # Mengambil sesi aktif kelas mahasiswa dari registry in-memory (isi kolom v_sesi_aktif)
+    id_kelas = get_kelas_mahasiswa(nim)
+    if id_kelas is None:
+        return []
+    return [
+        {k: v for k, v in sesi.items() if k != 'waktu_tutup_seharusnya'}
+        for sesi in sesi_registry.by_kelas(id_kelas)
+    ]
+
+# Barcode tersimpan yang sudah divalidasi: kode_barcode -> data sesi + roster kelas.
+# Satu kode dipindai puluhan mahasiswa dalam hitungan detik; hanya pemindaian pertama ke DB.
+barcode_cache = LRUCache(maxsize=1024, ttl=Config.BARCODE_CACHE_TTL)
+
+def lookup_barcode(kode_barcode):
     """
-    sesi_aktif = query_db(query, (nim,))
-    return sesi_aktif
+    Data barcode aktif (id_sesi, id_pertemuan, id_kelas, waktu_kadaluarsa, status_sesi, roster)
+    atau None jika kode tidak dikenal/tidak aktif.
+    Validitas barcode, status sesi, dan anggota kelas diambil dalam SATU query,
+    lalu disimpan di barcode_cache paling lama sampai barcode kadaluarsa.
+    """
+    entry = barcode_cache.get(kode_barcode, _MISSING)
+    if entry is not _MISSING:
+        return entry
 
-def verify_barcode_absensi(nim, kode_barcode):
-    # 1. Cek keberadaan, status, dan waktu kadaluarsa barcode
-    barcode_data = query_db("""
-        SELECT b.id_sesi, b.waktu_kadaluarsa, p.id_pertemuan, m.id_kelas
+    rows = query_db("""
+        SELECT b.id_sesi, b.waktu_kadaluarsa, s.status_sesi, s.id_pertemuan, p.id_kelas, m.nim
         FROM barcode b
         JOIN sesi_absensi s ON b.id_sesi = s.id_sesi
         JOIN pertemuan p ON s.id_pertemuan = p.id_pertemuan
-        JOIN mahasiswa m ON p.id_kelas = m.id_kelas
-        WHERE b.kode_barcode = %s AND m.nim = %s AND b.status = 'aktif'
-    """, (kode_barcode, nim), fetchone=True)
-    
-    if not barcode_data:
+        LEFT JOIN mahasiswa m ON m.id_kelas = p.id_kelas
+        WHERE b.kode_barcode = %s AND b.status = 'aktif'
+    """, (kode_barcode,))
+    if rows is None:
+        return None # DB error: jangan di-cache
+
+    if not rows:
+        barcode_cache.set(kode_barcode, None) # Kode salah juga di-cache sebentar
+        return None
+
+    first = rows[0]
+    entry = {
+        "id_sesi": first['id_sesi'],
+        "id_pertemuan": first['id_pertemuan'],
+        "id_kelas": first['id_kelas'],
+        "waktu_kadaluarsa": first['waktu_kadaluarsa'],
+        "status_sesi": first['status_sesi'],
+        "roster": frozenset(row['nim'] for row in rows if row['nim'] is not None),
+    }
+    sisa_detik = (entry['waktu_kadaluarsa'] - datetime.now()).total_seconds()
+    if sisa_detik > 0:
+        barcode_cache.set(kode_barcode, entry, ttl=min(Config.BARCODE_CACHE_TTL, sisa_detik))
+    for nim in entry['roster']:
+        kelas_mahasiswa_cache.set(nim, entry['id_kelas'])
+    return entry
+
+def verify_barcode_absensi(nim, kode_barcode):
+    if rotating_code.is_rotating_code(kode_barcode):
+        return _verify_rotating_absensi(nim, kode_barcode)
+
+    # 1. Barcode + sesi + roster kelas (satu query, atau dari cache)
+    barcode_data = lookup_barcode(kode_barcode)
+    if not barcode_data or nim not in barcode_data['roster']:
         return None, "Barcode tidak valid atau bukan untuk kelas Anda."
 
-    # 2. Cek kadaluarsa waktu barcode
+    # 2. Cek kadaluarsa waktu barcode (status 'kadaluarsa' di-set oleh expiry scheduler)
     if datetime.now() > barcode_data['waktu_kadaluarsa']:
-        execute_db("UPDATE barcode SET status = 'kadaluarsa' WHERE kode_barcode = %s", (kode_barcode,))
         return None, "Barcode sudah kadaluarsa berdasarkan waktu yang ditentukan dosen."
 
-    # 3. Cek apakah sesi utama masih aktif
-    sesi_aktif = query_db("SELECT status_sesi FROM sesi_absensi WHERE id_sesi = %s", (barcode_data['id_sesi'],), fetchone=True)
-    if sesi_aktif['status_sesi'] != 'aktif':
+    # 3. Cek apakah sesi utama masih aktif (status dari query + registry in-memory)
+    if barcode_data['status_sesi'] != 'aktif' or sesi_registry.get(barcode_data['id_sesi']) is None:
         return None, "Sesi absensi utama sudah ditutup."
 
     return {
         "id_sesi": barcode_data['id_sesi'],
         "id_pertemuan": barcode_data['id_pertemuan']
-    }, "Barcode berhasil diverifikasi."
\ No newline at end of file
+    }, "Barcode berhasil diverifikasi."
+
+def _verify_rotating_absensi(nim, kode):
+    # Kode berputar: sesi dari registry, kelas dari cache, HMAC dihitung ulang (tanpa query)
+    id_sesi, _ = rotating_code.parse_code(kode)
+    sesi_data = sesi_registry.get(id_sesi) if id_sesi is not None else None
+    if not sesi_data or get_kelas_mahasiswa(nim) != sesi_data['id_kelas']:
+        return None, "Barcode tidak valid atau bukan untuk kelas Anda."
+
+    if not verify_rotating_code(sesi_data, kode):
+        return None, "Kode QR sudah kadaluarsa, pindai ulang kode yang sedang tampil."
+
+    return {
+        "id_sesi": sesi_data['id_sesi'],
+        "id_pertemuan": sesi_data['id_pertemuan']
+    }, "Barcode berhasil diverifikasi."
@@ -0,0 +1,87 @@
+# server/utils/export.py
+
+import csv
+import io
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response, stream_with_context
+
+try:
+    import xlsxwriter # Opsional: export .xlsx hanya tersedia jika paket ini terpasang
+except ImportError:
+    xlsxwriter = None
+
+# Export tabel besar tanpa menampung seluruh hasil di memori.
+# `rows` adalah iterator dari database.db.stream_query: tuple nama kolom lalu tuple nilai.
+
+CSV_MIMETYPE = 'text/csv'
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def available_formats():
+    return ('csv', 'xlsx') if xlsxwriter is not None else ('csv',)
+
+def csv_stream(rows, flush_every=500):
+    """Menghasilkan potongan CSV (bytes UTF-8 dengan BOM agar terbaca benar di Excel)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % flush_every == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def _xlsx_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return None
+    return value
+
+def xlsx_stream(rows, sheet_name='Data', chunk_size=64 * 1024):
+    """
+    Menulis .xlsx dengan xlsxwriter mode constant_memory (baris langsung di-flush ke file
+    sementara, bukan ditahan di memori), lalu mengirim file hasilnya per potongan.
+    """
+    if xlsxwriter is None:
+        raise RuntimeError("Paket xlsxwriter tidak terpasang.")
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'tmpdir': tempfile.gettempdir()})
+        sheet = workbook.add_worksheet(sheet_name)
+        for r, row in enumerate(rows):
+            sheet.write_row(r, 0, [_xlsx_value(v) for v in row])
+        workbook.close()
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+def export_response(rows, fmt, filename, sheet_name='Data'):
+    """
+    Response Flask yang men-stream `rows` sebagai lampiran CSV/XLSX.
+    ValueError jika format tidak didukung (periksa sebelum query dijalankan).
+    """
+    if fmt not in available_formats():
+        raise ValueError(f"Format export harus salah satu dari: {', '.join(available_formats())}.")
+    if fmt == 'xlsx':
+        body, mimetype = xlsx_stream(rows, sheet_name), XLSX_MIMETYPE
+    else:
+        body, mimetype = csv_stream(rows), CSV_MIMETYPE
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}.{fmt}"',
+        'X-Accel-Buffering': 'no',
+    })
@@ -0,0 +1,50 @@
+# server/utils/face_codec.py
+
+import json
+import numpy as np
+
+# Format biner descriptor wajah (kolom face_descriptor, tipe BLOB):
+#
+#   b'FD' | versi (1 byte) | kode dtype (1 byte) | data float little-endian
+#
+# 128 dimensi -> 512 byte (float32) atau 1024 byte (float64) + 4 byte header,
+# dibanding ~2.5KB teks JSON. Baris lama berformat JSON tetap bisa dibaca.
+MAGIC = b'FD'
+VERSION = 1
+HEADER_SIZE = 4
+
+_DTYPE_CODES = {
+    'float32': 1,
+    'float64': 2,
+}
+_CODE_DTYPES = {
+    1: np.dtype('<f4'),
+    2: np.dtype('<f8'),
+}
+
+def encode_descriptor(descriptor, dtype='float32'):
+    """Mengubah descriptor (list/numpy array) menjadi bytes berformat biner."""
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"dtype descriptor tidak didukung: {dtype}")
+    code = _DTYPE_CODES[dtype]
+    data = np.asarray(descriptor, dtype=_CODE_DTYPES[code]).tobytes()
+    return MAGIC + bytes([VERSION, code]) + data
+
+def is_binary_descriptor(raw):
+    return isinstance(raw, (bytes, bytearray, memoryview)) and bytes(raw[:2]) == MAGIC
+
+def decode_descriptor(raw):
+    """
+    Mengubah nilai kolom face_descriptor menjadi numpy array.
+    Format biner di-decode tanpa salinan (np.frombuffer, hasilnya read-only);
+    format JSON lama (str atau bytes) di-parse seperti sebelumnya.
+    """
+    if is_binary_descriptor(raw):
+        version, code = raw[2], raw[3]
+        if version != VERSION or code not in _CODE_DTYPES:
+            raise ValueError(f"Header descriptor tidak dikenal (versi {version}, dtype {code}).")
+        return np.frombuffer(raw, dtype=_CODE_DTYPES[code], offset=HEADER_SIZE)
+
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        raw = bytes(raw).decode('utf-8')
+    return np.array(json.loads(raw), dtype=np.float64)
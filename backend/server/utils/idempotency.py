@@ -0,0 +1,52 @@
+# server/utils/idempotency.py
+
+import threading
+
+from utils.cache import LRUCache
+
+class IdempotencyCache:
+    """
+    Menyimpan hasil request berdasarkan kunci idempotensi dari klien (header Idempotency-Key).
+    Request ulang dengan kunci yang sama mengembalikan hasil pertama tanpa menjalankan ulang logika;
+    request kembar yang datang bersamaan menunggu request pertama selesai.
+    """
+
+    def __init__(self, maxsize=10000, ttl=600, wait_timeout=30):
+        self.wait_timeout = wait_timeout
+        self._results = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, fn, cache_if=None):
+        """
+        Menjalankan fn() sekali per `key` dan mengembalikan hasilnya.
+        `cache_if(hasil)` menentukan apakah hasil boleh disimpan (mis. bukan error sementara);
+        exception tidak pernah disimpan sehingga klien boleh mencoba lagi.
+        """
+        if key is None:
+            return fn()
+
+        while True:
+            with self._lock:
+                cached = self._results.get(key, _MISSING)
+                if cached is not _MISSING:
+                    return cached
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    break
+            # Request kembar sedang diproses: tunggu lalu baca hasilnya
+            if not event.wait(self.wait_timeout):
+                return fn()
+
+        try:
+            result = fn()
+            if cache_if is None or cache_if(result):
+                self._results.set(key, result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+_MISSING = object()
@@ -1,21 +1,70 @@
 # server/utils/jwt_auth.py
 
 from functools import wraps
+import hashlib
+import time
+import uuid
 import jwt
 import datetime
 from flask import request, jsonify
 from config import Config
+from utils.cache import LRUCache
+
+# Payload token yang sudah diverifikasi, key = SHA-256 token (token mentah tidak disimpan).
+# Entri tidak pernah hidup melewati `exp` token, jadi token kadaluarsa tetap ditolak.
+_verified_tokens = LRUCache(maxsize=Config.TOKEN_CACHE_SIZE, ttl=Config.TOKEN_CACHE_TTL)
 
 def generate_token(user_id, level):
-    """Menghasilkan token JWT."""
+    """Menghasilkan access token JWT (berlaku Config.JWT_ACCESS_TTL detik)."""
     payload = {
         'user_id': user_id,
         'level': level,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24), # Kadaluarsa 24 jam
+        'type': 'access',
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(seconds=Config.JWT_ACCESS_TTL),
+        'iat': datetime.datetime.utcnow()
+    }
+    return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm='HS256')
+
+def generate_refresh_token(username):
+    """
+    Refresh token untuk POST /auth/refresh (berlaku Config.JWT_REFRESH_TTL detik).
+    Hanya memuat username: level dan user_id diambil ulang dari record users saat refresh.
+    """
+    payload = {
+        'username': username,
+        'type': 'refresh',
+        'jti': uuid.uuid4().hex,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(seconds=Config.JWT_REFRESH_TTL),
         'iat': datetime.datetime.utcnow()
     }
     return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm='HS256')
 
+def decode_token(token, token_type='access'):
+    """
+    Verifikasi token dan kembalikan payload-nya. Melempar jwt.ExpiredSignatureError /
+    jwt.InvalidTokenError. Token dengan `type` berbeda (mis. refresh token dipakai sebagai
+    access token) ditolak; token lama tanpa `type` dianggap access token.
+    """
+    data = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=['HS256'])
+    if data.get('type', 'access') != token_type:
+        raise jwt.InvalidTokenError("Jenis token salah")
+    return data
+
+def verify_access_token(token):
+    """decode_token() dengan cache: token yang sama tidak diverifikasi ulang setiap request."""
+    key = hashlib.sha256(token.encode('utf-8')).digest()
+    data = _verified_tokens.get(key)
+    if data is not None:
+        if data['exp'] > time.time():
+            return dict(data)
+        _verified_tokens.pop(key)
+
+    data = decode_token(token)
+    sisa = data['exp'] - time.time()
+    if sisa > 0:
+        _verified_tokens.set(key, data, ttl=min(Config.TOKEN_CACHE_TTL, sisa))
+    return dict(data) # Salinan: route boleh mengubah request.user_data tanpa mengotori cache
+
 def jwt_required(f):
     """Decorator untuk melindungi rute API."""
     @wraps(f)
@@ -32,10 +81,10 @@ def jwt_required(f):
 
         if not token:
             return jsonify({'message': 'Token JWT tidak ada'}), 401
-        
+
         try:
-            # Decode token
-            data = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=['HS256'])
+            # Decode token (payload terverifikasi di-cache hingga exp)
+            data = verify_access_token(token)
             request.user_data = data # Simpan payload user ke objek request
         except jwt.ExpiredSignatureError:
             return jsonify({'message': 'Token kadaluarsa'}), 401
@@ -43,4 +92,22 @@ def jwt_required(f):
             return jsonify({'message': 'Token tidak valid'}), 401
 
         return f(*args, **kwargs)
-    return decorated
\ No newline at end of file
+    return decorated
+
+def role_required(*levels, message="Akses ditolak."):
+    """
+    jwt_required + cek level user dalam satu decorator:
+
+        @role_required('dosen', 'admin')
+        def handler(): ...
+    """
+    def decorator(f):
+        @jwt_required
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            # request.user_data disuntikkan oleh jwt_required
+            if request.user_data.get('level') not in levels:
+                return jsonify({"status": "error", "message": message}), 403
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
@@ -0,0 +1,50 @@
+# server/utils/metrics.py
+
+import threading
+import time
+from contextlib import contextmanager
+
+class Metrics:
+    """
+    Kumpulan metrik sederhana in-process: counter dan statistik durasi (detik).
+    Ditampilkan lewat endpoint admin /admin/metrics.
+    """
+
+    def __init__(self):
+        self._timings = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            stat = self._timings.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            stat['count'] += 1
+            stat['total'] += seconds
+            stat['max'] = max(stat['max'], seconds)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        """Salinan metrik saat ini; durasi dalam milidetik."""
+        with self._lock:
+            timings = {
+                name: {
+                    'count': stat['count'],
+                    'avg_ms': round(stat['total'] / stat['count'] * 1000, 2),
+                    'max_ms': round(stat['max'] * 1000, 2),
+                }
+                for name, stat in self._timings.items()
+            }
+            return {'timings': timings, 'counters': dict(self._counters)}
+
+metrics = Metrics()
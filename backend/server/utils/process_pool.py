@@ -0,0 +1,85 @@
+# server/utils/process_pool.py
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+class BoundedProcessPool:
+    """
+    Process pool (spawn) dengan antrean terbatas, dipakai untuk pekerjaan CPU-bound
+    (encoding wajah, bcrypt) agar tidak berjalan di thread request Flask.
+
+    Paling banyak `workers + max_pending` job boleh berjalan/mengantre; peminjam berikutnya
+    menunggu `queue_wait` detik lalu mendapat `busy_error`. Executor dibuat saat pertama dipakai
+    (setelah reloader Flask / fork server selesai).
+    Subclass mengatur kelas exception dan pesannya lewat atribut kelas.
+    """
+
+    busy_error = RuntimeError
+    timeout_error = RuntimeError
+    broken_error = RuntimeError
+    busy_message = "Server sedang sibuk, coba lagi sebentar."
+    timeout_message = "Proses melebihi batas waktu."
+    broken_message = "Worker berhenti tak terduga, coba lagi."
+
+    def __init__(self, workers=2, max_pending=8, queue_wait=2, job_timeout=15, initializer=None):
+        self.workers = workers
+        self.queue_wait = queue_wait
+        self.job_timeout = job_timeout
+        self.initializer = initializer
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=self.initializer
+                )
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def submit(self, fn, *args):
+        """Mengirim job ke worker dan mengembalikan Future."""
+        if not self._slots.acquire(timeout=self.queue_wait):
+            raise self.busy_error(self.busy_message)
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset_executor()
+            raise self.broken_error(self.broken_message)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def result(self, future, timeout=None):
+        """Menunggu hasil job dengan batas waktu per job."""
+        try:
+            return future.result(timeout=timeout or self.job_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise self.timeout_error(self.timeout_message)
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise self.broken_error(self.broken_message)
+
+    def run(self, fn, *args):
+        return self.result(self.submit(fn, *args))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,66 @@
+# server/utils/pubsub.py
+
+import threading
+from queue import Queue, Empty, Full
+
+class Subscription:
+    """Antrean event milik satu pelanggan (mis. satu koneksi SSE)."""
+
+    def __init__(self, topic, maxsize):
+        self.topic = topic
+        self.overflowed = False
+        self._queue = Queue(maxsize=maxsize)
+
+    def get(self, timeout=None):
+        """Event berikutnya, atau None jika tidak ada dalam `timeout` detik."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except Full:
+            # Pelanggan terlalu lambat: tandai agar ia memuat ulang data penuh, bukan memblokir penerbit
+            self.overflowed = True
+
+class PubSub:
+    """
+    Pub/sub in-process per topik (mis. id_sesi). Penerbit tidak pernah menunggu pelanggan;
+    pelanggan yang antreannya penuh ditandai `overflowed`.
+    Hanya menjangkau pelanggan di proses yang sama (satu proses server).
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic):
+        sub = Subscription(topic, self.maxsize)
+        with self._lock:
+            self._topics.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._topics.get(sub.topic)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._topics[sub.topic]
+
+    def publish(self, topic, event):
+        """Mengirim event ke semua pelanggan topik; mengembalikan jumlah pelanggan."""
+        with self._lock:
+            subs = list(self._topics.get(topic, ()))
+        for sub in subs:
+            sub._put(event)
+        return len(subs)
+
+    def subscriber_count(self, topic=None):
+        with self._lock:
+            if topic is not None:
+                return len(self._topics.get(topic, ()))
+            return sum(len(subs) for subs in self._topics.values())
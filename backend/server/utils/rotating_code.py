@@ -0,0 +1,60 @@
+# server/utils/rotating_code.py
+
+import base64
+import hashlib
+import hmac
+import struct
+import time
+
+from config import Config
+
+# Kode QR berputar (stateless), format: "<id_sesi>-<token>"
+#
+#   token = base32(HMAC-SHA256(rahasia_sesi, langkah_waktu))[:QR_ROTATING_CODE_LENGTH]
+#   langkah_waktu = unix_time // QR_ROTATING_STEP
+#
+# Rahasia sesi diturunkan dari SECRET_KEY + id_sesi + waktu_buka, jadi tidak ada
+# baris `barcode` per rotasi dan verifikasi cukup menghitung ulang HMAC di memori.
+# Kode lama (tabel `barcode`) berupa 8 karakter hex tanpa '-', sehingga kedua mode bisa dibedakan.
+SEPARATOR = '-'
+
+def session_secret(id_sesi, waktu_buka):
+    """Rahasia HMAC per sesi; berubah jika sesi dibuka ulang (waktu_buka berbeda)."""
+    message = f"qr:{id_sesi}:{waktu_buka.isoformat()}".encode('utf-8')
+    return hmac.new(Config.SECRET_KEY.encode('utf-8'), message, hashlib.sha256).digest()
+
+def _token(secret, counter):
+    digest = hmac.new(secret, struct.pack('>Q', counter), hashlib.sha256).digest()
+    return base64.b32encode(digest).decode('ascii')[:Config.QR_ROTATING_CODE_LENGTH]
+
+def current_step(now=None):
+    return int((time.time() if now is None else now) // Config.QR_ROTATING_STEP)
+
+def generate_code(id_sesi, secret, now=None):
+    """Kode untuk langkah waktu saat ini dan sisa detik masa berlakunya."""
+    now = time.time() if now is None else now
+    step = current_step(now)
+    sisa_detik = (step + 1) * Config.QR_ROTATING_STEP - now
+    return f"{id_sesi}{SEPARATOR}{_token(secret, step)}", sisa_detik
+
+def is_rotating_code(kode):
+    return isinstance(kode, str) and SEPARATOR in kode
+
+def parse_code(kode):
+    """Memisahkan "<id_sesi>-<token>" menjadi (id_sesi, token), atau (None, None) jika format salah."""
+    id_sesi, _, token = kode.strip().partition(SEPARATOR)
+    if not id_sesi.isdigit() or not token:
+        return None, None
+    return int(id_sesi), token.upper()
+
+def verify_token(secret, token, now=None):
+    """
+    True jika token cocok dengan langkah waktu saat ini atau tetangganya
+    (toleransi jam klien/jaringan: Config.QR_ROTATING_WINDOW langkah ke depan/belakang).
+    """
+    step = current_step(now)
+    window = Config.QR_ROTATING_WINDOW
+    return any(
+        hmac.compare_digest(_token(secret, step + offset), token)
+        for offset in range(-window, window + 1)
+    )
@@ -0,0 +1,43 @@
+# server/utils/signing.py
+
+import hashlib
+import hmac
+
+from config import Config
+
+# Tanda tangan item absensi offline (/absensi/submit/batch).
+#
+# Kunci sinkronisasi per user = HMAC(SECRET_KEY, "sync:<user_id>"), diberikan ke aplikasi lewat
+# GET /absensi/sync-key saat online. Aplikasi menandatangani setiap item saat diambil (offline):
+#
+#   signature = hex(HMAC-SHA256(kunci, pesan))
+#   pesan     = id_sesi | metode | lokasi_lat | lokasi_long | captured_at | verification_code | sha256(gambar)
+#
+# dengan '|' sebagai pemisah, string kosong untuk field yang tidak ada, dan kunci (string hex)
+# dipakai apa adanya sebagai bytes UTF-8. Server cukup menurunkan
+# ulang kunci dari SECRET_KEY, jadi tidak ada kunci per user yang perlu disimpan.
+
+def derive_sync_key(user_id):
+    return hmac.new(Config.SECRET_KEY.encode('utf-8'), f"sync:{user_id}".encode('utf-8'), hashlib.sha256).hexdigest()
+
+def image_digest(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest() if image_bytes else ''
+
+def canonical_message(item, image_bytes):
+    fields = (
+        item.get('id_sesi'), item.get('metode'), item.get('lokasi_lat'), item.get('lokasi_long'),
+        item.get('captured_at'), item.get('verification_code'), image_digest(image_bytes),
+    )
+    return '|'.join('' if v is None else str(v) for v in fields)
+
+def verify_item_signature(user_id, item, image_bytes):
+    """True jika `item['signature']` sah untuk user ini dan isi item (termasuk gambarnya)."""
+    signature = item.get('signature')
+    if not isinstance(signature, str):
+        return False
+    expected = hmac.new(
+        derive_sync_key(user_id).encode('utf-8'),
+        canonical_message(item, image_bytes).encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+    return hmac.compare_digest(expected, signature.lower())
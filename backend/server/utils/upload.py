@@ -0,0 +1,59 @@
+# server/utils/upload.py
+
+from config import Config
+
+class UploadTooLarge(ValueError):
+    """Gambar melebihi Config.MAX_IMAGE_UPLOAD_BYTES; route memetakannya ke HTTP 413."""
+    pass
+
+class InvalidImage(ValueError):
+    """Field gambar ada tetapi bukan gambar (mis. angka/list di JSON); route memetakannya ke HTTP 400."""
+    pass
+
+_CHUNK_SIZE = 64 * 1024
+
+def _read_limited(stream, limit):
+    """Membaca stream per potongan dan berhenti begitu melebihi batas (tanpa buffer payload penuh dulu)."""
+    chunks = []
+    size = 0
+    while True:
+        chunk = stream.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            raise UploadTooLarge(f"Ukuran gambar melebihi batas {limit // 1024} KB.")
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+def read_image_request(req, file_field='image', json_field='image_base64'):
+    """
+    Membaca field + gambar dari request dalam tiga format:
+    - multipart/form-data: field dari form, gambar dari file `image`;
+    - application/octet-stream atau image/*: body = bytes gambar, field dari query string;
+    - application/json (lama): field dari JSON, gambar base64 di `image_base64`.
+    Mengembalikan (fields, image) dengan image berupa bytes (biner) atau str (base64) atau None;
+    InvalidImage jika field gambar JSON bukan string.
+    """
+    limit = Config.MAX_IMAGE_UPLOAD_BYTES
+    mimetype = req.mimetype or ''
+
+    if mimetype == 'multipart/form-data':
+        fields = req.form.to_dict()
+        upload = req.files.get(file_field)
+        return fields, _read_limited(upload.stream, limit) if upload else None
+
+    if mimetype == 'application/octet-stream' or mimetype.startswith('image/'):
+        if req.content_length and req.content_length > limit:
+            raise UploadTooLarge(f"Ukuran gambar melebihi batas {limit // 1024} KB.")
+        return req.args.to_dict(), _read_limited(req.stream, limit) or None
+
+    fields = req.get_json(silent=True)
+    if not isinstance(fields, dict):
+        fields = {}
+    image = fields.get(json_field)
+    if image is not None and not isinstance(image, str):
+        raise InvalidImage("Format gambar tidak valid.")
+    if image and len(image) * 3 // 4 > limit:
+        raise UploadTooLarge(f"Ukuran gambar melebihi batas {limit // 1024} KB.")
+    return fields, image
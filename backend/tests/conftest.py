@@ -0,0 +1,33 @@
+# backend/tests/conftest.py
+
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+# Modul server meng-import `config`, `utils`, ... (server/) dan `database` (backend/)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (BACKEND_DIR, os.path.join(BACKEND_DIR, 'server')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from utils.jwt_auth import generate_token  # noqa: E402
+
+@pytest.fixture
+def make_client():
+    """Test client Flask yang hanya berisi blueprint yang diberikan (tanpa app.py)."""
+    def factory(*blueprints):
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        for blueprint in blueprints:
+            app.register_blueprint(blueprint)
+        return app.test_client()
+    return factory
+
+@pytest.fixture
+def auth_header():
+    """Header Authorization berisi access token untuk `user_id` dengan `level` tertentu."""
+    def factory(user_id, level):
+        return {'Authorization': f"Bearer {generate_token(user_id, level)}"}
+    return factory
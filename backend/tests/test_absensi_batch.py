@@ -0,0 +1,97 @@
+# backend/tests/test_absensi_batch.py
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import mysql.connector
+import pytest
+
+from services import absensi_service as module
+from services.absensi_service import absensi_service
+from routes.absensi_routes import absensi_bp
+
+NIM = '2201001'
+ID_KELAS = 7
+ID_PERTEMUAN = 42
+
+@pytest.fixture
+def batch_env(monkeypatch):
+    """
+    Semua dependensi submit_absensi_batch diganti: satu sesi terbuka untuk kelas mahasiswa,
+    belum ada absensi tercatat, dan gambar b'gagal' tidak lolos verifikasi wajah.
+    Baris yang di-INSERT dicatat di `inserted`.
+    """
+    now = datetime.now().replace(microsecond=0)
+    sesi = {
+        5: {'id_sesi': 5, 'id_pertemuan': ID_PERTEMUAN, 'id_kelas': ID_KELAS,
+            'waktu_buka': now - timedelta(minutes=10), 'waktu_tutup_seharusnya': now + timedelta(minutes=10),
+            'lokasi_lat': -6.2, 'lokasi_long': 106.8, 'radius_meter': 100},
+    }
+    env = {'inserted': [], 'now': now, 'db_error': False}
+
+    @contextmanager
+    def fake_transaction():
+        if env['db_error']:
+            raise mysql.connector.Error("Lost connection to MySQL server")
+
+        class Tx:
+            def executemany(self, query, rows):
+                env['inserted'].extend(rows)
+                return len(rows)
+        yield Tx()
+
+    def fake_verify_faces(nim, items):
+        return [(False, 0.2, "Wajah tidak cocok.") if image == b'gagal' else (True, 0.9, "Wajah cocok.")
+                for image, _ in items]
+
+    monkeypatch.setattr(module, 'verify_item_signature', lambda nim, item, image: True)
+    monkeypatch.setattr(module, 'image_to_bytes', lambda value: value.encode())
+    monkeypatch.setattr(module, '_load_sesi_windows', lambda ids: {i: sesi[i] for i in ids if i in sesi})
+    monkeypatch.setattr(module, 'get_kelas_mahasiswa', lambda nim: ID_KELAS)
+    monkeypatch.setattr(module, 'query_db', lambda query, args=(), fetchone=False: [])
+    monkeypatch.setattr(module, 'verify_faces', fake_verify_faces)
+    monkeypatch.setattr(module, 'log_face_scan', lambda *args: None)
+    monkeypatch.setattr(module, 'transaction', fake_transaction)
+    monkeypatch.setattr(module, '_record_rekap', lambda tx, inserted, rows: None)
+    monkeypatch.setattr(module, 'publish_kehadiran', lambda id_sesi, records: None)
+    return env
+
+def _item(env, image, client_id):
+    return {
+        'id_sesi': 5, 'metode': 'face_recognition', 'lokasi_lat': '-6.2', 'lokasi_long': '106.8',
+        'captured_at': env['now'].isoformat(), 'image_base64': image, 'client_id': client_id,
+    }
+
+def test_retry_after_failed_verification_is_recorded(batch_env):
+    items = [_item(batch_env, 'gagal', 'a'), _item(batch_env, 'wajah', 'b')]
+
+    hasil, _ = absensi_service.submit_absensi_batch(NIM, items)
+
+    assert [h['status'] for h in hasil] == ['ditolak', 'diterima']
+    assert len(batch_env['inserted']) == 1
+    assert batch_env['inserted'][0][:2] == (NIM, ID_PERTEMUAN)
+
+def test_only_first_verified_item_per_pertemuan_is_recorded(batch_env):
+    items = [_item(batch_env, 'wajah', 'a'), _item(batch_env, 'wajah', 'b')]
+
+    hasil, _ = absensi_service.submit_absensi_batch(NIM, items)
+
+    assert [h['status'] for h in hasil] == ['diterima', 'sudah_absen']
+    assert [h['client_id'] for h in hasil] == ['a', 'b']
+    assert len(batch_env['inserted']) == 1
+
+def test_database_error_is_a_server_error(batch_env, make_client, auth_header):
+    batch_env['db_error'] = True
+    client = make_client(absensi_bp)
+
+    response = client.post('/absensi/submit/batch', json={'items': [_item(batch_env, 'wajah', 'a')]},
+                           headers=auth_header(NIM, 'mahasiswa'))
+
+    assert response.status_code == 503
+
+def test_invalid_batch_is_a_client_error(batch_env, make_client, auth_header):
+    client = make_client(absensi_bp)
+
+    response = client.post('/absensi/submit/batch', json={'items': []}, headers=auth_header(NIM, 'mahasiswa'))
+
+    assert response.status_code == 400
@@ -0,0 +1,29 @@
+# backend/tests/test_auth_service.py
+
+import pytest
+
+from services import auth_service
+
+@pytest.fixture(autouse=True)
+def no_password_workers(monkeypatch):
+    """Verifikasi/hash bcrypt dan UPDATE upgrade plaintext tidak boleh tersentuh di test ini."""
+    def forbidden(*args):
+        raise AssertionError("tidak boleh dipanggil")
+    monkeypatch.setattr(auth_service, 'check_password', forbidden)
+    monkeypatch.setattr(auth_service, 'hash_password_for_login', forbidden)
+    monkeypatch.setattr(auth_service, 'execute_db', forbidden)
+
+def _user(password):
+    return {'id_user': 1, 'username': 'budi', 'password': password, 'level': 'mahasiswa'}
+
+@pytest.mark.parametrize('stored', [None, ''])
+@pytest.mark.parametrize('supplied', ['', 'rahasia'])
+def test_account_without_password_cannot_log_in(stored, supplied):
+    assert auth_service.verify_login(_user(stored), supplied) is False
+
+@pytest.mark.parametrize('stored', ['rahasia', '$2b$12$' + 'a' * 53])
+def test_empty_supplied_password_is_rejected(stored):
+    assert auth_service.verify_login(_user(stored), '') is False
+
+def test_wrong_plaintext_password_is_rejected():
+    assert auth_service.verify_login(_user('rahasia'), 'salah') is False
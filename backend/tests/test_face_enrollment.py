@@ -0,0 +1,32 @@
+# backend/tests/test_face_enrollment.py
+
+import zipfile
+
+import pytest
+
+from services.face_enrollment import open_photos
+
+def test_zip_archive_is_closed_after_block(tmp_path):
+    path = tmp_path / 'foto.zip'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('2201001.jpg', b'jpeg')
+        archive.writestr('catatan.txt', b'bukan foto')
+
+    with open_photos(str(path)) as photos:
+        assert [(user_id, name) for user_id, name, _ in photos] == [('2201001', '2201001.jpg')]
+        assert photos[0][2]() == b'jpeg'
+    with pytest.raises(ValueError):
+        photos[0][2]()  # Arsip sudah ditutup
+
+def test_directory_photos_are_read_on_demand(tmp_path):
+    (tmp_path / '198001.png').write_bytes(b'png')
+
+    with open_photos(str(tmp_path)) as photos:
+        assert [(user_id, loader()) for user_id, _, loader in photos] == [('198001', b'png')]
+
+def test_other_paths_are_rejected(tmp_path):
+    path = tmp_path / 'foto.txt'
+    path.write_text('bukan zip')
+    with pytest.raises(ValueError):
+        with open_photos(str(path)):
+            pass
@@ -0,0 +1,40 @@
+# backend/tests/test_face_routes.py
+
+import pytest
+
+from routes import face_routes
+from routes.face_routes import face_bp
+
+SESI = {12: {'id_sesi': 12, 'nip_dosen': '198001'}}
+
+@pytest.fixture
+def identify_calls(monkeypatch):
+    """Registry sesi palsu (sesi 12 milik dosen 198001); identify_face dicatat, tanpa encoding wajah."""
+    calls = []
+
+    def fake_identify_face(id_sesi, image, top_k=3, face_box=None):
+        calls.append(id_sesi)
+        return [{'nim': '2201001', 'distance': 0.3, 'confidence_score': 0.7, 'match': True}], "Wajah dikenali."
+
+    monkeypatch.setattr(face_routes.sesi_registry, 'get', lambda id_sesi, include_expired=False: SESI.get(id_sesi))
+    monkeypatch.setattr(face_routes, 'identify_face', fake_identify_face)
+    return calls
+
+def _identify(client, headers, id_sesi):
+    return client.post('/face/identify', json={'id_sesi': id_sesi, 'image_base64': 'aGFp'}, headers=headers)
+
+def test_dosen_can_identify_in_own_session(make_client, auth_header, identify_calls):
+    response = _identify(make_client(face_bp), auth_header('198001', 'dosen'), 12)
+    assert response.status_code == 200
+    assert identify_calls == [12]
+
+@pytest.mark.parametrize('id_sesi', [12, 99])
+def test_dosen_cannot_identify_in_other_session(make_client, auth_header, identify_calls, id_sesi):
+    response = _identify(make_client(face_bp), auth_header('198002', 'dosen'), id_sesi)
+    assert response.status_code == 403
+    assert identify_calls == []
+
+def test_admin_can_identify_in_any_session(make_client, auth_header, identify_calls):
+    response = _identify(make_client(face_bp), auth_header(1, 'admin'), 12)
+    assert response.status_code == 200
+    assert identify_calls == [12]
@@ -0,0 +1,46 @@
+# backend/tests/test_listing.py
+
+import pytest
+
+from database import listing
+
+SCHEMAS = {
+    'users': [('id_user', 'int', 'PRI'), ('username', 'varchar', ''), ('password', 'varchar', ''),
+              ('level', 'enum', '')],
+    'mahasiswa': [('nim', 'varchar', 'PRI'), ('nama', 'varchar', ''), ('face_descriptor', 'text', '')],
+    'dosen': [('nip', 'varchar', 'PRI'), ('nama', 'varchar', ''), ('face_descriptor', 'text', '')],
+}
+
+@pytest.fixture
+def data_queries(monkeypatch):
+    """query_db palsu: skema dari SCHEMAS, query data dicatat dan mengembalikan satu baris."""
+    queries = []
+
+    def fake_query_db(query, args=(), fetchone=False):
+        if 'information_schema.columns' in query:
+            return [{'name': n, 'type': t, 'col_key': k} for n, t, k in SCHEMAS[args[0]]]
+        queries.append(query)
+        return []
+
+    monkeypatch.setattr(listing, 'query_db', fake_query_db)
+    listing._schema_cache.clear()
+    yield queries
+    listing._schema_cache.clear()
+
+# hidden_columns sama dengan yang dipasang create_crud_endpoint di routes/admin_routes.py
+@pytest.mark.parametrize('table, hidden, column', [
+    ('users', ('password',), 'password'),
+    ('mahasiswa', ('face_descriptor',), 'face_descriptor'),
+    ('dosen', ('face_descriptor',), 'face_descriptor'),
+])
+@pytest.mark.parametrize('sort', ['{}', '-{}'])
+def test_sort_on_hidden_column_is_rejected(data_queries, table, hidden, column, sort):
+    with pytest.raises(ValueError):
+        listing.list_rows(table, {'sort': sort.format(column), 'limit': '1'}, hidden=hidden)
+    assert data_queries == []
+
+def test_sort_on_visible_column_is_accepted(data_queries):
+    result = listing.list_rows('users', {'sort': 'username', 'limit': '1'}, hidden=('password',))
+    assert result == {'rows': [], 'next_cursor': None}
+    assert len(data_queries) == 1
+    assert 'password' not in data_queries[0]
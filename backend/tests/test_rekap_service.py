@@ -0,0 +1,11 @@
+# backend/tests/test_rekap_service.py
+
+from services import rekap_service
+
+def test_check_rekap_reports_database_error(monkeypatch):
+    monkeypatch.setattr(rekap_service, 'query_db', lambda query, params=None, fetchone=False: None)
+    assert rekap_service.check_rekap() is None
+
+def test_check_rekap_empty_tables_are_consistent(monkeypatch):
+    monkeypatch.setattr(rekap_service, 'query_db', lambda query, params=None, fetchone=False: [])
+    assert rekap_service.check_rekap() == []
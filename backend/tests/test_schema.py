@@ -0,0 +1,57 @@
+# backend/tests/test_schema.py
+
+import pytest
+
+from database import schema
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """
+    Database palsu: semua index/tabel sudah ada, kolom face_descriptor masih TEXT sampai
+    ALTER-nya dijalankan. Setiap DDL dicatat di `log`.
+    """
+    state = {'types': {'mahasiswa': 'text', 'dosen': 'text'}, 'log': []}
+
+    def fake_query_db(query, args=(), fetchone=False):
+        if 'information_schema.columns' in query:
+            return {'tipe': state['types'][args[0]]}
+        return {'ada': 1}
+
+    def fake_execute_db(query, args=()):
+        for table in state['types']:
+            if f"ALTER TABLE {table} MODIFY face_descriptor BLOB" in query:
+                state['types'][table] = 'blob'
+                state['log'].append(('alter', table))
+        return True
+
+    monkeypatch.setattr(schema, 'query_db', fake_query_db)
+    monkeypatch.setattr(schema, 'execute_db', fake_execute_db)
+    return state
+
+def test_descriptor_migration_runs_per_table_after_its_alter(fake_db):
+    def migrate(table):
+        # Kolom tabel yang dikonversi harus sudah BLOB
+        assert fake_db['types'][table] == 'blob'
+        fake_db['log'].append(('migrate', table))
+        return {table: 0}
+
+    hasil = schema.upgrade_schema(after_hooks={'migrate_face_descriptors': migrate})
+
+    assert fake_db['log'] == [('alter', 'mahasiswa'), ('migrate', 'mahasiswa'),
+                              ('alter', 'dosen'), ('migrate', 'dosen')]
+    assert ('mahasiswa.face_descriptor BLOB', 'diterapkan', {'mahasiswa': 0}) in hasil
+    assert ('dosen.face_descriptor BLOB', 'diterapkan', {'dosen': 0}) in hasil
+
+def test_failing_hook_is_reported_and_later_upgrades_still_run(fake_db):
+    error = RuntimeError("Incorrect string value")
+
+    def migrate(table):
+        if table == 'mahasiswa':
+            raise error
+        return {table: 0}
+
+    hasil = schema.upgrade_schema(after_hooks={'migrate_face_descriptors': migrate})
+
+    assert ('mahasiswa.face_descriptor BLOB', 'gagal', error) in hasil
+    assert ('dosen.face_descriptor BLOB', 'diterapkan', {'dosen': 0}) in hasil
+    assert ('alter', 'dosen') in fake_db['log']